@@ -0,0 +1,214 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(CURRENT_DIR))
+
+from config import GEOM_PARAMS
+from memory_usage import peak_rss_mb
+
+# --- БЕНЧМАРК ЕТАПІВ ПО СІТЦІ ПАРАМЕТРІВ ---
+#
+# Кожен випадок (бекенд, SQUARE_SIZE_M, SECTOR_RADIUS_M) виконується в окремому процесі (spawn),
+# тож пік RSS клієнта (ru_maxrss) належить лише йому; пік кожного етапу - окремо (лічильник скидається
+# між етапами, memory_usage.reset_peak_rss). Для кожного етапу записуються час, кількість рядків та розмір
+# результату: таблиці й індекси в PostGIS або файли локального пайплайна. Локальні випадки пишуть
+# у тимчасовий каталог, а не в output/local, тож справжні результати користувача не перезаписуються.
+# Результати - JSON та CSV в output/benchmarks; порівняння з baseline.json за (бекенд, розміри, етап).
+
+OUTPUT_DIR = CURRENT_DIR / "output" / "benchmarks"
+BASELINE_FILE = OUTPUT_DIR / "baseline.json"
+
+BENCH_SIZES_M = [10000, 5000, 2000, 1000]
+BENCH_RADII_M = [GEOM_PARAMS['SECTOR_RADIUS_M']]
+BACKENDS = ['local', 'local-strtree', 'postgis']
+REGRESSION_THRESHOLD = 0.10
+
+CSV_FIELDS = [
+    'backend', 'size_m', 'radius_m', 'stage', 'status', 'seconds', 'rows', 'bytes', 'index_bytes', 'peak_rss_mb'
+]
+
+SQL_TABLE_STATS = """
+SELECT
+    (SELECT count(*) FROM {table}),
+    pg_relation_size('{table}'),
+    pg_indexes_size('{table}')
+"""
+
+
+def create_output_path(filename):
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    return OUTPUT_DIR / filename
+
+
+def postgis_stage_stats(report):
+    import run_sql
+
+    outputs = {stage['name']: stage.get('outputs', []) for stage in run_sql.build_stages()}
+    engine = run_sql.create_db_engine(pool_size=1)
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        for record in report:
+            record.update({'rows': 0, 'bytes': 0, 'index_bytes': 0})
+            # Виходи-функції ('name(type, ...)') не мають розміру таблиці.
+            for table in (output for output in outputs[record['stage']] if '(' not in output):
+                cursor.execute(SQL_TABLE_STATS.format(table=table))
+                rows, table_bytes, index_bytes = cursor.fetchone()
+                record['rows'] += rows
+                record['bytes'] += table_bytes
+                record['index_bytes'] += index_bytes
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_case(backend, size, radius, force=True):
+    report = []
+    start = time.time()
+    if backend == 'postgis':
+        import run_sql
+
+        params = dict(GEOM_PARAMS, SQUARE_SIZE_M=size, SECTOR_RADIUS_M=radius)
+        completed = run_sql.run_analysis_pipeline(force=force, params=params, report=report)
+        total_seconds = time.time() - start
+        if report:
+            postgis_stage_stats(report)
+    else:
+        import local_pipeline
+
+        engine = 'strtree' if backend == 'local-strtree' else 'stencil'
+        with tempfile.TemporaryDirectory(prefix=f"bench_{backend}_{size}_") as output_dir:
+            completed = local_pipeline.run_local_pipeline(
+                size=size, radius=radius, engine=engine, report=report, output_dir=Path(output_dir)
+            )
+        total_seconds = time.time() - start
+    stage_peaks = [record['peak_rss_mb'] for record in report if record.get('peak_rss_mb') is not None]
+    return {
+        'backend': backend,
+        'size_m': size,
+        'radius_m': radius,
+        'completed': bool(completed),
+        'total_seconds': total_seconds,
+        'peak_rss_mb': max(stage_peaks + [peak_rss_mb() or 0.0]) if stage_peaks else peak_rss_mb(),
+        'stages': report
+    }
+
+
+def run_isolated(backend, size, radius, force=True):
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_case, backend, size, radius, force).result()
+
+
+def flatten(results):
+    rows = []
+    for case in results:
+        for record in case['stages']:
+            rows.append({
+                'backend': case['backend'],
+                'size_m': case['size_m'],
+                'radius_m': case['radius_m'],
+                'stage': record['stage'],
+                'status': record['status'],
+                'seconds': round(record['seconds'], 3),
+                'rows': record.get('rows'),
+                'bytes': record.get('bytes'),
+                'index_bytes': record.get('index_bytes'),
+                'peak_rss_mb': record.get('peak_rss_mb')
+            })
+    return rows
+
+
+def write_results(results, run_name):
+    json_path = create_output_path(f"{run_name}.json")
+    json_path.write_text(json.dumps(results, indent=2))
+    csv_path = create_output_path(f"{run_name}.csv")
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(flatten(results))
+    return json_path, csv_path
+
+
+def summary_lines(results):
+    lines = [f"{'backend':<14}{'size_m':>8}{'radius_m':>10}{'total_s':>10}{'rss_mb':>9}{'cells':>10}{'hits':>12}"]
+    for case in results:
+        rows = {record['stage']: record.get('rows') for record in case['stages']}
+        hits = rows.get('intersections', rows.get('sectors_intersections'))
+        rss = f"{case['peak_rss_mb']:.0f}" if case['peak_rss_mb'] is not None else '-'
+        lines.append(
+            f"{case['backend']:<14}{case['size_m']:>8}{case['radius_m']:>10}{case['total_seconds']:>10.2f}"
+            f"{rss:>9}{str(rows.get('grid', '-')):>10}{str(hits if hits is not None else '-'):>12}"
+        )
+    return lines
+
+
+def compare_lines(results, baseline, threshold=REGRESSION_THRESHOLD):
+    def key(row):
+        return row['backend'], row['size_m'], row['radius_m'], row['stage']
+
+    base = {key(row): row for row in flatten(baseline)}
+    lines = [f"{'backend':<14}{'size_m':>8}{'radius_m':>10}  {'stage':<22}{'base_s':>9}{'now_s':>9}{'ratio':>8}  rows"]
+    for row in flatten(results):
+        old = base.get(key(row))
+        if old is None or row['status'] == 'skipped' or old['status'] == 'skipped':
+            continue
+        ratio = row['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        flag = '  REGRESSION' if ratio > 1 + threshold else ''
+        rows_note = 'same' if row['rows'] == old['rows'] else f"{old['rows']} -> {row['rows']}"
+        lines.append(
+            f"{row['backend']:<14}{row['size_m']:>8}{row['radius_m']:>10}  {row['stage']:<22}"
+            f"{old['seconds']:>9.2f}{row['seconds']:>9.2f}{ratio:>8.2f}  {rows_note}{flag}"
+        )
+    return lines
+
+
+def run_benchmark(backends=BACKENDS, sizes=BENCH_SIZES_M, radii=BENCH_RADII_M, force=True,
+                  baseline_file=BASELINE_FILE, save_baseline=False):
+    run_name = time.strftime('bench_%Y%m%d_%H%M%S')
+    results = []
+    for backend in backends:
+        for size in sizes:
+            for radius in radii:
+                print(f"\n=== {backend}: SQUARE_SIZE_M={size}, SECTOR_RADIUS_M={radius} ===")
+                results.append(run_isolated(backend, size, radius, force))
+
+    json_path, csv_path = write_results(results, run_name)
+    print("\n" + "\n".join(summary_lines(results)))
+    print(f"\nResults saved: {os.path.abspath(json_path)}, {os.path.abspath(csv_path)}")
+
+    if Path(baseline_file).exists():
+        lines = compare_lines(results, json.loads(Path(baseline_file).read_text()))
+        report_path = create_output_path(f"{run_name}_compare.txt")
+        report_path.write_text("\n".join(lines) + "\n")
+        print(f"\nComparison with {os.path.basename(baseline_file)}:\n" + "\n".join(lines))
+    if save_baseline:
+        Path(baseline_file).parent.mkdir(parents=True, exist_ok=True)
+        Path(baseline_file).write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved: {os.path.abspath(baseline_file)}")
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages across grid sizes and sector radii.")
+    parser.add_argument('--backends', nargs='+', default=BACKENDS, choices=BACKENDS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=BENCH_SIZES_M)
+    parser.add_argument('--radii', nargs='+', type=int, default=BENCH_RADII_M)
+    parser.add_argument('--resume', action='store_true', help="PostGIS: skip up-to-date stages instead of forcing")
+    parser.add_argument('--baseline', default=str(BASELINE_FILE))
+    parser.add_argument('--save-baseline', action='store_true')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_benchmark(args.backends, args.sizes, args.radii, not args.resume, args.baseline, args.save_baseline)
@@ -0,0 +1,219 @@
+from pathlib import Path
+import json
+import numpy as np
+import os
+import shapely
+import sys
+import time
+
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(CURRENT_DIR))
+
+from local_pipeline import (
+    AZIMUTHS, FILE_PATH, OUTPUT_DIR, SECTOR_MODE, SECTOR_RADIUS, build_border, create_output_path, dataset_exists,
+    write_geometry
+)
+import lattice
+import sector_csr
+import sector_stencil
+
+# --- ІНКРЕМЕНТНЕ ОНОВЛЕННЯ ПРИ ЗМІНІ КОРДОНУ ---
+#
+# Нова версія GeoJSON порівнюється зі збереженим очищеним кордоном (output/local/ukraine_clean_border.geojson).
+# Змінена область - симетрична різниця старого й нового кордону. Належність комірки до сітки залежить лише
+# від того, чи перетинає її кордон, тож перевіряються тільки комірки, що торкаються зміненої області
+# (з запасом в одну комірку). Сектор залежить лише від положення вершини, тому пари між вершинами,
+# що лишилися, не змінюються: пари з видаленими вершинами відкидаються, а нові пари (джерело або ціль -
+# нова вершина) рахуються стенсилем лише у вікні ореолу радіуса навколо нових вершин.
+# id вершин стабільні: вершини, що лишилися, зберігають свої id, нові отримують max(id) + 1, ... у порядку
+# (vertex_j, vertex_i), id видалених вершин зникають. Масиви у файлах і далі впорядковані за (vertex_j,
+# vertex_i), тож після оновлення id вже не дорівнюють позиції + 1 - зв'язок лише через стовпці id.
+
+def load_local_results(output_dir=OUTPUT_DIR):
+    border = shapely.from_geojson((output_dir / "ukraine_clean_border.geojson").read_text())
+    with np.load(output_dir / "ukraine_grid.npz") as grid:
+        size = float(grid['size'])
+        cell_keys = lattice.lattice_cell_keys(grid['i'], grid['j'])
+    with np.load(output_dir / "grid_vertices.npz") as vertices:
+        vertex_keys = lattice.lattice_cell_keys(vertices['vertex_i'], vertices['vertex_j'])
+        vertex_id = vertices['id']
+    with np.load(output_dir / "all_sectors.npz") as sectors:
+        rings = sectors['rings']
+    with np.load(output_dir / "sector_intersections_full.npz") as data:
+        hits = {key: data[key] for key in data.files}
+    return border, size, cell_keys, vertex_keys, vertex_id, rings, hits
+
+
+def changed_region(old_border, new_border):
+    # Полігональна частина симетричної різниці в EPSG:3857 або None, якщо кордон не змінився
+    # (для однакових кордонів різниця дає лише вироджені залишки нульової площі).
+    if shapely.equals(old_border, new_border):
+        return None
+    parts = shapely.get_parts(shapely.symmetric_difference(old_border, new_border))
+    parts = parts[shapely.get_type_id(parts) == shapely.GeometryType.POLYGON]
+    if len(parts) == 0:
+        return None
+    return lattice.border_to_mercator(shapely.multipolygons(parts))
+
+
+def dilate_keys(keys, reach):
+    # Усі ключі решітки в квадраті (2 * reach + 1)^2 навколо заданих.
+    key_i, key_j = lattice.key_cells(keys)
+    offsets = np.arange(-reach, reach + 1)
+    di, dj = np.meshgrid(offsets, offsets)
+    return lattice.sorted_unique(
+        lattice.lattice_cell_keys((key_i[:, None] + di.ravel()).ravel(), (key_j[:, None] + dj.ravel()).ravel())
+    )
+
+
+def contains_keys(sorted_keys, keys):
+    position = np.minimum(np.searchsorted(sorted_keys, keys), max(len(sorted_keys) - 1, 0))
+    return sorted_keys[position] == keys if len(sorted_keys) else np.zeros(len(keys), dtype=bool)
+
+
+def update_cells(cell_keys, border_3857, region_3857, size):
+    # Нова сітка: комірки поза зміненою областю без змін, кандидати - точний тест intersects
+    # (те саме, що rasterize_cells: внутрішні комірки перетинає кордон, зовнішні - ні).
+    candidates = dilate_keys(lattice.lattice_cell_keys(*lattice.rasterize_cells(region_3857, size)), 1)
+    shapely.prepare(border_3857)
+    keep = shapely.intersects(border_3857, lattice.cell_polygons(*lattice.key_cells(candidates), size))
+    was = contains_keys(cell_keys, candidates)
+    unchanged = cell_keys[~contains_keys(candidates, cell_keys)]
+    return (
+        np.sort(np.concatenate([unchanged, candidates[keep]])),
+        int((keep & ~was).sum()), int((~keep & was).sum())
+    )
+
+
+def new_intersections(vertex_i, vertex_j, lon, lat, rings, added, size, radius):
+    # Пари (сектор, вершина), де джерело або ціль - нова вершина. Джерела - вершини в межах ореолу
+    # від нових, цілі - вікно подвійного ореолу.
+    empty = np.zeros(0, dtype=np.int64)
+    if not added.any():
+        return empty, empty, 0
+    keys = lattice.lattice_cell_keys(vertex_i, vertex_j)
+    added_keys = keys[added]
+    halo = lattice.sector_halo(radius, size, float(np.abs(lat).max()))
+    window = np.flatnonzero(contains_keys(dilate_keys(added_keys, 2 * halo), keys))
+    source_mask = contains_keys(dilate_keys(added_keys, halo), keys[window])
+
+    n_az = len(AZIMUTHS)
+    window_rings = rings.reshape(len(vertex_i), n_az, *rings.shape[1:])[window].reshape(-1, *rings.shape[1:])
+    sector_idx, vertex_idx = sector_stencil.stencil_intersections(
+        vertex_i[window], vertex_j[window], lon[window], lat[window], size, radius, rings=window_rings,
+        source_mask=source_mask
+    )
+    source = window[sector_idx // n_az]
+    target = window[vertex_idx]
+    fresh = added[source] | added[target]
+    return source[fresh] * n_az + sector_idx[fresh] % n_az, target[fresh], len(window)
+
+
+def run_border_update(file_path=FILE_PATH, radius=SECTOR_RADIUS, mode=SECTOR_MODE):
+    if not dataset_exists(file_path):
+        return
+    if not (OUTPUT_DIR / "sector_intersections_full.npz").exists():
+        print(f"Error: no previous results in {os.path.abspath(OUTPUT_DIR)}, run local_pipeline.py first.")
+        return
+
+    print("Starting incremental border update...")
+    start_time = time.time()
+    old_border, size, cell_keys, vertex_keys, old_id, old_rings, old_hits = load_local_results(OUTPUT_DIR)
+    raw_union, clean_border, (center_lon, center_lat) = build_border(file_path)
+    region = changed_region(old_border, clean_border)
+    if region is None:
+        print("   Border unchanged, nothing to update.")
+        return {'cells_added': 0, 'cells_removed': 0, 'vertices_added': 0, 'vertices_removed': 0}
+    print(f"   1. Changed region: {shapely.area(region) / 1e6:.2f} km2 (EPSG:3857), {time.time() - start_time:.2f} s")
+
+    stage_start = time.time()
+    new_cell_keys, cells_added, cells_removed = update_cells(
+        cell_keys, lattice.border_to_mercator(clean_border), region, size
+    )
+    cell_i, cell_j = lattice.key_cells(new_cell_keys)
+    vertex_i, vertex_j, vertex_cells = lattice.unique_vertices(cell_i, cell_j)
+    lon, lat = lattice.vertex_lonlat(vertex_i, vertex_j, size)
+    new_keys = lattice.lattice_cell_keys(vertex_i, vertex_j)
+    # Стара позиція -> нова; старий id -> нова позиція (-1 - вершину видалено).
+    old_position = np.searchsorted(new_keys, vertex_keys)
+    kept = contains_keys(new_keys, vertex_keys)
+    added = np.ones(len(vertex_i), dtype=bool)
+    added[old_position[kept]] = False
+    vertex_id = np.empty(len(vertex_i), dtype=old_id.dtype)
+    vertex_id[old_position[kept]] = old_id[kept]
+    vertex_id[added] = old_id.max(initial=0) + np.arange(1, int(added.sum()) + 1)
+    id_position = np.full(int(old_id.max(initial=0)) + 1, -1)
+    id_position[old_id[kept]] = old_position[kept]
+    print(f"   2. Grid: +{cells_added} / -{cells_removed} cells, vertices: +{int(added.sum())} / "
+          f"-{int((~kept).sum())}, {time.time() - stage_start:.2f} s")
+
+    stage_start = time.time()
+    n_az = len(AZIMUTHS)
+    ring_shape = old_rings.shape[1:]
+    rings = np.empty((len(vertex_i), n_az) + ring_shape)
+    rings[old_position[kept]] = old_rings.reshape(len(vertex_keys), n_az, *ring_shape)[kept]
+    if added.any():
+        rings[added] = lattice.sector_rings(lon[added], lat[added], radius, mode=mode).reshape(-1, n_az, *ring_shape)
+    rings = rings.reshape(-1, *ring_shape)
+
+    # Збережені пари між вершинами, що лишилися, плюс нові пари біля зміни.
+    source = id_position[old_hits['sector_source_vertex_id']]
+    target = id_position[old_hits['intersecting_vertex_id']]
+    keep = (source >= 0) & (target >= 0)
+    az_index = np.argmax(old_hits['azimuth'][keep, None] == AZIMUTHS, axis=1)
+    fresh_sector, fresh_vertex, window_size = new_intersections(
+        vertex_i, vertex_j, lon, lat, rings, added, size, radius
+    )
+    sector_idx = np.concatenate([source[keep] * n_az + az_index, fresh_sector])
+    vertex_idx = np.concatenate([target[keep], fresh_vertex])
+    order = np.lexsort((vertex_idx, sector_idx))
+    sector_idx, vertex_idx = sector_idx[order], vertex_idx[order]
+    print(f"   3. Intersections: {int((~keep).sum())} removed, {len(fresh_sector)} added "
+          f"(window {window_size} vertices), {time.time() - stage_start:.2f} s")
+
+    stage_start = time.time()
+    write_geometry(raw_union, "ukraine_raw_union_safe.geojson")
+    write_geometry(clean_border, "ukraine_clean_border.geojson")
+    create_output_path("ukraine_center.json").write_text(
+        json.dumps({'center_lon': center_lon, 'center_lat': center_lat})
+    )
+    np.savez(create_output_path("ukraine_grid.npz"), i=cell_i, j=cell_j, size=size)
+    np.savez(
+        create_output_path("grid_vertices.npz"),
+        id=vertex_id, vertex_i=vertex_i, vertex_j=vertex_j, lon=lon, lat=lat,
+        cell_vertex_ids=vertex_id[vertex_cells]
+    )
+    np.savez(
+        create_output_path("all_sectors.npz"),
+        vertex_id=np.repeat(vertex_id, n_az), azimuth=np.tile(AZIMUTHS, len(vertex_id)), rings=rings
+    )
+    np.savez(
+        create_output_path("sector_intersections_full.npz"),
+        sector_source_vertex_id=vertex_id[sector_idx // n_az],
+        azimuth=AZIMUTHS[sector_idx % n_az],
+        intersecting_vertex_id=vertex_id[vertex_idx]
+    )
+    sector_csr.save_csr(
+        create_output_path("sector_targets_csr.npz"),
+        sector_csr.build_csr(
+            np.repeat(vertex_id, n_az), np.tile(AZIMUTHS, len(vertex_id)), sector_idx, vertex_id[vertex_idx]
+        )
+    )
+    np.savez(
+        create_output_path("vertex_coverage.npz"),
+        vertex_id=vertex_id, azimuth=AZIMUTHS,
+        sectors=sector_csr.vertex_coverage(sector_idx, vertex_idx, len(vertex_id), n_az)
+    )
+    print(f"   4. Results written: {time.time() - stage_start:.2f} s")
+
+    print(f"\nBorder update completed in {time.time() - start_time:.2f} seconds: {len(cell_i)} cells, "
+          f"{len(vertex_i)} vertices, {len(sector_idx)} intersections.")
+    print(f"Results saved: {os.path.abspath(OUTPUT_DIR)}")
+    return {
+        'cells_added': cells_added, 'cells_removed': cells_removed,
+        'vertices_added': int(added.sum()), 'vertices_removed': int((~kept).sum())
+    }
+
+
+if __name__ == "__main__":
+    run_border_update(sys.argv[1] if len(sys.argv) > 1 else FILE_PATH)
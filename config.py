@@ -11,13 +11,48 @@ TABLE_NAMES = {
     'CENTER': 'ukraine_center',              
     'RAW_UNION_SAFE': 'ukraine_raw_union_safe', 
     'CLEAN_BORDER': 'ukraine_clean_border',  
+    'BORDER_ARTIFACTS': 'border_artifacts',
+    'BORDER_LOD': 'ukraine_border_lod',
     'GRID': 'ukraine_grid',                  
+    'GRID_QUADTREE': 'ukraine_grid_quadtree',
     'VERTICES': 'grid_vertices',             
-    'SECTORS': 'all_sectors'   
+    'VERTEX_CELLS': 'grid_vertex_cells',     
+    'SECTORS': 'all_sectors',
+    'INTERSECTIONS': 'sector_intersections_full',
+    'SECTOR_TARGETS': 'sector_targets',
+    'VERTEX_COVERAGE': 'vertex_coverage',
+    'STAGES': 'pipeline_stages'
 }              
 
 GEOM_PARAMS = {
     'SQUARE_SIZE_M': 2000,
+    'GRID_MODE': 'uniform',
+    'GRID_CLIP': 'scanline',
+    'QUADTREE_LEVELS': 4,
     'SECTOR_RADIUS_M': 5000,
-    'CLEANUP_BUFFER_DEG': 0.001
-}
\ No newline at end of file
+    'SECTOR_AZIMUTHS': [0, 120, 240],
+    'SECTOR_WIDTH_DEG': 60,
+    'SECTOR_ARC_POINTS': 16,
+    'SECTOR_GEODESIC_MODE': 'geodesic',
+    'UNION_PRECISION_DEG': 1e-7,
+    'CLEANUP_BUFFER_DEG': 0.001,
+    'CLEANUP_SUBDIVIDE_VERTICES': 256,
+    'BORDER_LOD_TOLERANCES_DEG': [0.0005, 0.002, 0.008, 0.03]
+}
+
+PIPELINE_PARAMS = {
+    'INTERSECTION_WORKERS': 4,
+    'TILE_SIZE_CELLS': 64,
+    'STRIP_SIZE_CELLS': 128,
+    'OBLAST_WORKERS': 4,
+    'SECTOR_BUILDER': 'python',
+    'MATERIALIZE_INTERSECTIONS': True
+}
+
+# Сценарії розміщення антен для sector_scenarios.py: заміни SECTOR_* з GEOM_PARAMS.
+SECTOR_SCENARIOS = [
+    {'NAME': 'base', 'SECTOR_RADIUS_M': 5000, 'SECTOR_AZIMUTHS': [0, 120, 240], 'SECTOR_WIDTH_DEG': 60},
+    {'NAME': 'tri_90', 'SECTOR_RADIUS_M': 5000, 'SECTOR_AZIMUTHS': [0, 120, 240], 'SECTOR_WIDTH_DEG': 90},
+    {'NAME': 'quad_65', 'SECTOR_RADIUS_M': 4000, 'SECTOR_AZIMUTHS': [45, 135, 225, 315], 'SECTOR_WIDTH_DEG': 65},
+    {'NAME': 'long_range', 'SECTOR_RADIUS_M': 8000, 'SECTOR_AZIMUTHS': [60, 180, 300], 'SECTOR_WIDTH_DEG': 33}
+]
@@ -0,0 +1,146 @@
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import shapely
+import sys
+
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(CURRENT_DIR))
+
+from config import GEOM_PARAMS, TABLE_NAMES
+import lattice
+import sector_stencil
+
+# --- ПОКРИТТЯ СЕКТОРІВ НА ВИМОГУ ---
+#
+# Відповіді "які вершини покриває сектор (v, азимут)" і "які сектори покривають вершину X"
+# рахуються з координат решітки grid_vertices без all_sectors та sector_intersections_full.
+# Сектор будується як ST_Sector_Fixed, кандидати - вершини решітки в його bbox (пряме питання)
+# або джерела в межах радіуса (зворотне), остаточна перевірка - intersects як ST_Intersects.
+# Останні CACHE_SIZE відповідей кожного типу зберігаються в LRU-кеші.
+
+LOCAL_DIR = CURRENT_DIR / "output" / "local"
+CACHE_SIZE = 4096
+INDEX_DTYPE = np.int32
+
+SQL_LATTICE = f"SELECT id, vertex_i, vertex_j FROM {TABLE_NAMES['VERTICES']}"
+
+
+class CoverageQuery:
+
+    def __init__(self, vertex_id, vertex_i, vertex_j, size, radius=GEOM_PARAMS['SECTOR_RADIUS_M'],
+                 azimuths=lattice.SECTOR_AZIMUTHS, width=lattice.SECTOR_WIDTH_DEG,
+                 num_points=lattice.SECTOR_ARC_POINTS, cache_size=CACHE_SIZE):
+        vertex_id = np.asarray(vertex_id, dtype=np.int64)
+        vertex_i = np.asarray(vertex_i, dtype=np.int64)
+        vertex_j = np.asarray(vertex_j, dtype=np.int64)
+        keys = lattice.lattice_cell_keys(vertex_i, vertex_j)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.vertex_i = vertex_i[order]
+        self.vertex_j = vertex_j[order]
+        self.vertex_id = vertex_id[order]
+        self.id_order = np.argsort(self.vertex_id, kind='stable')
+        self.size = size
+        self.radius = radius
+        self.azimuths = list(azimuths)
+        self.width = width
+        self.num_points = num_points
+        self.sector_coverage = lru_cache(maxsize=cache_size)(self.compute_sector_coverage)
+        self.covering_sectors = lru_cache(maxsize=cache_size)(self.compute_covering_sectors)
+
+    @classmethod
+    def from_npz(cls, path=LOCAL_DIR / "grid_vertices.npz", grid_path=LOCAL_DIR / "ukraine_grid.npz", **kwargs):
+        with np.load(grid_path) as grid:
+            size = float(grid['size'])
+        with np.load(path) as data:
+            return cls(data['id'], data['vertex_i'], data['vertex_j'], size, **kwargs)
+
+    @classmethod
+    def from_db(cls, conn, size=GEOM_PARAMS['SQUARE_SIZE_M'], **kwargs):
+        cursor = conn.cursor()
+        cursor.execute(SQL_LATTICE)
+        rows = np.asarray(cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+        conn.commit()
+        return cls(rows[:, 0], rows[:, 1], rows[:, 2], size, **kwargs)
+
+    def vertex_index(self, vertex_id):
+        pos = np.searchsorted(self.vertex_id, vertex_id, sorter=self.id_order)
+        if pos < len(self.id_order) and self.vertex_id[self.id_order[pos]] == vertex_id:
+            return self.id_order[pos]
+        return -1
+
+    def sector_rings(self, idx, azimuths):
+        lon, lat = lattice.vertex_lonlat(self.vertex_i[idx], self.vertex_j[idx], self.size)
+        return lattice.sector_rings(np.atleast_1d(lon), np.atleast_1d(lat), self.radius, azimuths,
+                                    self.width, self.num_points)
+
+    def compute_sector_coverage(self, vertex_id, azimuth):
+        # Відсортовані id вершин, які перетинає сектор (vertex_id, azimuth).
+        idx = self.vertex_index(vertex_id)
+        if idx < 0:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        ring = self.sector_rings(np.array([idx]), [azimuth])[0]
+
+        # Обидві координати EPSG:3857 монотонні за lon/lat окремо, тож bbox кільця в 3857
+        # обмежує і ребра полігона між точками дуги.
+        x, y = lattice.TO_MERCATOR.transform(ring[:, 0], ring[:, 1])
+        cand_i, cand_j = np.meshgrid(
+            np.arange(int(np.floor(x.min() / self.size)), int(np.ceil(x.max() / self.size)) + 1),
+            np.arange(int(np.floor(y.min() / self.size)), int(np.ceil(y.max() / self.size)) + 1)
+        )
+        found = sector_stencil.lookup_vertices(self.keys, cand_i.ravel(), cand_j.ravel())
+        found = found[found >= 0]
+
+        polygon = shapely.polygons(ring)
+        shapely.prepare(polygon)
+        lon, lat = lattice.vertex_lonlat(self.vertex_i[found], self.vertex_j[found], self.size)
+        hits = self.vertex_id[found[shapely.intersects_xy(polygon, lon, lat)]]
+        result = np.sort(hits).astype(INDEX_DTYPE)
+        result.flags.writeable = False
+        return result
+
+    def compute_covering_sectors(self, vertex_id):
+        # Сектори (vertex_id, azimuth), що покривають вершину, впорядковані як у sector_csr.
+        idx = self.vertex_index(vertex_id)
+        if idx < 0:
+            return np.zeros((0, 2), dtype=INDEX_DTYPE)
+        target_i, target_j = self.vertex_i[idx], self.vertex_j[idx]
+        target_lon, target_lat = lattice.vertex_lonlat(target_i, target_j, self.size)
+
+        di, dj = sector_stencil.stencil_offsets(self.size, self.radius, target_lat)
+        sources = sector_stencil.lookup_vertices(self.keys, target_i + di, target_j + dj)
+        sources = sources[sources >= 0]
+
+        polygons = shapely.polygons(self.sector_rings(sources, self.azimuths))
+        hits = np.flatnonzero(shapely.intersects_xy(polygons, target_lon, target_lat))
+        result = np.column_stack([
+            self.vertex_id[sources[hits // len(self.azimuths)]],
+            np.asarray(self.azimuths)[hits % len(self.azimuths)]
+        ]).astype(INDEX_DTYPE)
+        result = result[np.lexsort((result[:, 1], result[:, 0]))]
+        result.flags.writeable = False
+        return result
+
+    def sector_coverage_batch(self, vertex_ids, azimuths):
+        return [self.sector_coverage(int(v), int(a)) for v, a in zip(vertex_ids, azimuths)]
+
+    def covering_sectors_batch(self, vertex_ids):
+        return [self.covering_sectors(int(v)) for v in vertex_ids]
+
+    def cache_info(self):
+        return {
+            'sector_coverage': self.sector_coverage.cache_info(),
+            'covering_sectors': self.covering_sectors.cache_info()
+        }
+
+
+if __name__ == "__main__":
+    query = CoverageQuery.from_npz()
+    vertex_id = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        targets = query.sector_coverage(vertex_id, int(sys.argv[2]))
+        print(f"Sector ({vertex_id}, {sys.argv[2]}): {len(targets)} vertices\n{targets.tolist()}")
+    else:
+        sectors = query.covering_sectors(vertex_id)
+        print(f"Vertex {vertex_id}: covered by {len(sectors)} sectors\n{sectors.tolist()}")
@@ -0,0 +1,227 @@
+import numpy as np
+import shapely
+from pyproj import Geod, Transformer
+
+from config import GEOM_PARAMS
+
+# --- ГЕОМЕТРІЯ РЕШІТКИ (EPSG:3857) ТА СЕКТОРІВ (WGS84) ---
+#
+# Масивні (NumPy + Shapely 2) відповідники SQL-кроків з run_sql.py.
+# Комірка (i, j) повторює ST_SquareGrid: квадрат [i*size, (i+1)*size] x [j*size, (j+1)*size].
+# Вершина (vertex_i, vertex_j) - кут решітки з координатами (vertex_i*size, vertex_j*size).
+
+SECTOR_AZIMUTHS = GEOM_PARAMS['SECTOR_AZIMUTHS']
+SECTOR_WIDTH_DEG = GEOM_PARAMS['SECTOR_WIDTH_DEG']
+SECTOR_ARC_POINTS = GEOM_PARAMS['SECTOR_ARC_POINTS']
+
+GEOD = Geod(ellps='WGS84')
+TO_MERCATOR = Transformer.from_crs(4326, 3857, always_xy=True)
+TO_LONLAT = Transformer.from_crs(3857, 4326, always_xy=True)
+
+INTERSECTION_CHUNK = 200_000
+
+
+def border_to_mercator(border):
+    return shapely.transform(border, lambda xy: np.column_stack(TO_MERCATOR.transform(xy[:, 0], xy[:, 1])))
+
+
+def grid_extent_cells(border_3857, size):
+    minx, miny, maxx, maxy = shapely.bounds(border_3857)
+    i_range = np.arange(np.floor(minx / size), np.floor(maxx / size) + 1, dtype=np.int64)
+    j_range = np.arange(np.floor(miny / size), np.floor(maxy / size) + 1, dtype=np.int64)
+    cell_i, cell_j = np.meshgrid(i_range, j_range)
+    return cell_i.ravel(), cell_j.ravel()
+
+
+def cell_polygons(cell_i, cell_j, size):
+    return shapely.box(cell_i * size, cell_j * size, (cell_i + 1) * size, (cell_j + 1) * size)
+
+
+def clip_cells(cell_i, cell_j, size, border_3857):
+    shapely.prepare(border_3857)
+    keep = shapely.intersects(border_3857, cell_polygons(cell_i, cell_j, size))
+    return cell_i[keep], cell_j[keep]
+
+
+def border_segments(border_3857):
+    # Усі ребра зовнішніх та внутрішніх кілець як (x1, y1, x2, y2).
+    rings = shapely.get_rings(shapely.get_parts(border_3857))
+    coords, ring_index = shapely.get_coordinates(rings, return_index=True)
+    same_ring = ring_index[:-1] == ring_index[1:]
+    return coords[:-1][same_ring], coords[1:][same_ring]
+
+
+def scanline_cells(start, end, size):
+    # Заливка парністю перетинів: комірки, центр яких усередині полігона.
+    # Ребро перетинає рядок j, якщо центр рядка (j + 0.5) * size лежить у [min(y1, y2), max(y1, y2)).
+    y_lo = np.minimum(start[:, 1], end[:, 1])
+    y_hi = np.maximum(start[:, 1], end[:, 1])
+    j_lo = np.ceil(y_lo / size - 0.5).astype(np.int64)
+    j_hi = np.ceil(y_hi / size - 0.5).astype(np.int64) - 1
+    rows = np.maximum(j_hi - j_lo + 1, 0)
+
+    edge = np.repeat(np.arange(len(start)), rows)
+    row_j = j_lo[edge] + np.arange(len(edge)) - np.repeat(np.cumsum(rows) - rows, rows)
+    y_c = (row_j + 0.5) * size
+    x1, y1, x2, y2 = start[edge, 0], start[edge, 1], end[edge, 0], end[edge, 1]
+    x_c = x1 + (y_c - y1) * (x2 - x1) / (y2 - y1)
+
+    order = np.lexsort([x_c, row_j])
+    row_j, x_c = row_j[order], x_c[order]
+    x_in, x_out, span_j = x_c[0::2], x_c[1::2], row_j[0::2]
+
+    i_lo = np.ceil(x_in / size - 0.5).astype(np.int64)
+    i_hi = np.floor(x_out / size - 0.5).astype(np.int64)
+    counts = np.maximum(i_hi - i_lo + 1, 0)
+    cell_i = np.repeat(i_lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return cell_i, np.repeat(span_j, counts)
+
+
+def band_cells(start, end, size):
+    # Комірки смуги вздовж межі: точки ребер з кроком size / 4 та сусідство 3x3 навколо них,
+    # тож до смуги потрапляє кожна комірка, яку перетинає межа (навіть кутом).
+    step = size / 4.0
+    lengths = np.hypot(end[:, 0] - start[:, 0], end[:, 1] - start[:, 1])
+    samples = np.ceil(lengths / step).astype(np.int64) + 1
+    edge = np.repeat(np.arange(len(start)), samples)
+    t = (np.arange(len(edge)) - np.repeat(np.cumsum(samples) - samples, samples)) / np.repeat(samples - 1, samples)
+    x = start[edge, 0] + t * (end[edge, 0] - start[edge, 0])
+    y = start[edge, 1] + t * (end[edge, 1] - start[edge, 1])
+
+    core = sorted_unique(lattice_cell_keys(np.floor(x / size).astype(np.int64), np.floor(y / size).astype(np.int64)))
+    core_i, core_j = key_cells(core)
+    offsets = np.array([-1, 0, 1])
+    band_i = (core_i[:, None, None] + offsets[None, None, :] + 0 * offsets[None, :, None]).ravel()
+    band_j = (core_j[:, None, None] + offsets[None, :, None] + 0 * offsets[None, None, :]).ravel()
+    return key_cells(sorted_unique(lattice_cell_keys(band_i, band_j)))
+
+
+def lattice_cell_keys(cell_i, cell_j):
+    # Ключ (j, i) -> int64; сортування ключів дає порядок рядків (j, потім i) як у grid_extent_cells.
+    return (np.asarray(cell_j, dtype=np.int64) << 32) + (np.asarray(cell_i, dtype=np.int64) + 2**31)
+
+
+def key_cells(keys):
+    return (keys & 0xFFFFFFFF) - 2**31, keys >> 32
+
+
+def sorted_unique(keys):
+    # np.sort + відсів повторів: на int64-ключах помітно швидше за np.unique.
+    keys = np.sort(keys)
+    return keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if len(keys) else keys
+
+
+def rasterize_cells(border_3857, size):
+    # Відсікання сітки за довжиною межі: внутрішні комірки - сканлінією, точний тест
+    # (підготовлений полігон) лише для смуги комірок уздовж межі.
+    start, end = border_segments(border_3857)
+    inside = sorted_unique(lattice_cell_keys(*scanline_cells(start, end, size)))
+    band_i, band_j = band_cells(start, end, size)
+    shapely.prepare(border_3857)
+    band_keep = shapely.intersects(border_3857, cell_polygons(band_i, band_j, size))
+    band = lattice_cell_keys(band_i, band_j)
+
+    position = np.minimum(np.searchsorted(band, inside), len(band) - 1)
+    in_band = band[position] == inside
+    return key_cells(np.sort(np.concatenate([inside[~in_band], band[band_keep]])))
+
+
+def unique_vertices(cell_i, cell_j):
+    # Кожен кут решітки рівно один раз, у порядку (vertex_j, vertex_i) як ORDER BY у SQL.
+    corner_i = (cell_i[:, None] + np.array([0, 1, 0, 1])).ravel()
+    corner_j = (cell_j[:, None] + np.array([0, 0, 1, 1])).ravel()
+    corner_keys = lattice_cell_keys(corner_i, corner_j)
+    keys = sorted_unique(corner_keys)
+    vertex_i, vertex_j = key_cells(keys)
+    vertex_cells = np.searchsorted(keys, corner_keys).reshape(-1, 4)
+    return vertex_i, vertex_j, vertex_cells
+
+
+def vertex_lonlat(vertex_i, vertex_j, size):
+    return TO_LONLAT.transform(vertex_i * float(size), vertex_j * float(size))
+
+
+def arc_offsets(lat_rows, radius, bearings, mode='geodesic'):
+    # Точки дуги для джерел на довготі 0 і широтах lat_rows: (зсув довготи, широта), форма
+    # (рядок, азимут точки). На еліпсоїді обертання вони не залежать від довготи джерела.
+    lat_b = np.repeat(np.asarray(lat_rows, dtype=float), bearings.size)
+    bearing_b = np.tile(bearings, len(lat_rows))
+    if mode == 'planar':
+        # Формули середньої широти: радіуси кривини меридіана (M) і першого вертикалу (N) та азимут
+        # беруться в середній точці відрізка (азимут повертається на збіжність меридіанів
+        # dlon * sin(phi) / 2). Без повороту азимуту точка дуги з азимутом 90 лягала б точно на
+        # паралель джерела, і сектор торкався б усіх вершин його рядка.
+        phi_start = np.radians(lat_b)
+        bearing_rad = np.radians(bearing_b)
+        phi, dlam = phi_start, np.zeros_like(phi_start)
+        for _ in range(3):
+            sin_phi = np.sin(phi)
+            w = np.sqrt(1 - GEOD.es * sin_phi ** 2)
+            meridian, normal = GEOD.a * (1 - GEOD.es) / w ** 3, GEOD.a / w
+            bearing_mid = bearing_rad + dlam * sin_phi / 2
+            dphi = radius * np.cos(bearing_mid) / meridian
+            dlam = radius * np.sin(bearing_mid) / (normal * np.cos(phi))
+            phi = phi_start + dphi / 2
+        arc_lon = np.degrees(dlam)
+        arc_lat = lat_b + np.degrees(dphi)
+    else:
+        arc_lon, arc_lat, _ = GEOD.fwd(np.zeros(lat_b.size), lat_b, bearing_b, np.full(lat_b.size, float(radius)))
+    return arc_lon.reshape(len(lat_rows), -1), arc_lat.reshape(len(lat_rows), -1)
+
+
+def arc_bearings(azimuths, width, num_points):
+    steps = np.arange(num_points + 1) / num_points
+    return ((np.asarray(azimuths, dtype=float)[:, None] - width / 2) + width * steps[None, :]).ravel()
+
+
+def sector_rings(lon, lat, radius, azimuths=SECTOR_AZIMUTHS, width=SECTOR_WIDTH_DEG,
+                 num_points=SECTOR_ARC_POINTS, mode='geodesic'):
+    # Кільця секторів (джерело x азимут), як ST_Sector_Fixed: центр, num_points+1 точок дуги, центр.
+    # Вершини одного рядка решітки мають однакову широту, тож пряма геодезична задача
+    # розв'язується один раз на рядок, а точки дуги лише зсуваються по довготі.
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    n_src, n_az, n_arc = lon.size, len(azimuths), num_points + 1
+    lat_rows, row_index = np.unique(lat, return_inverse=True)
+    arc_lon, arc_lat = arc_offsets(lat_rows, radius, arc_bearings(azimuths, width, num_points), mode)
+
+    rings = np.empty((n_src, n_az, n_arc + 2, 2))
+    rings[:, :, 0, 0] = rings[:, :, -1, 0] = lon[:, None]
+    rings[:, :, 0, 1] = rings[:, :, -1, 1] = lat[:, None]
+    rings[:, :, 1:-1, 0] = (lon[:, None] + arc_lon[row_index]).reshape(n_src, n_az, n_arc)
+    rings[:, :, 1:-1, 1] = arc_lat[row_index].reshape(n_src, n_az, n_arc)
+    return rings.reshape(n_src * n_az, n_arc + 2, 2)
+
+
+def sector_halo(radius, size, max_lat):
+    # Найбільший зсув решітки (у кроках по i або j), на який сягає сектор радіуса radius від
+    # вершини на широті до max_lat: вікно цілей навколо джерел розширюється на стільки рядків і стовпців.
+    return int(np.ceil(radius / np.cos(np.radians(abs(max_lat))) / size)) + 1
+
+
+def planar_error_m(lat, radius, azimuths=SECTOR_AZIMUTHS, width=SECTOR_WIDTH_DEG, num_points=SECTOR_ARC_POINTS):
+    # Максимальне відхилення (м) точок дуги режиму 'planar' від геодезичних по всіх широтах lat.
+    lat_rows = np.unique(np.asarray(lat, dtype=float))
+    bearings = arc_bearings(azimuths, width, num_points)
+    exact_lon, exact_lat = arc_offsets(lat_rows, radius, bearings)
+    fast_lon, fast_lat = arc_offsets(lat_rows, radius, bearings, mode='planar')
+    _, _, error = GEOD.inv(exact_lon.ravel(), exact_lat.ravel(), fast_lon.ravel(), fast_lat.ravel())
+    return float(np.max(error))
+
+
+def sector_polygons(rings):
+    return shapely.polygons(rings)
+
+
+def sector_vertex_intersections(sectors, vertex_points, chunk=INTERSECTION_CHUNK):
+    # Пари (індекс сектора, індекс вершини) через STRtree по точках вершин.
+    tree = shapely.STRtree(vertex_points)
+    sector_idx, vertex_idx = [], []
+    for start in range(0, len(sectors), chunk):
+        hits = tree.query(sectors[start:start + chunk], predicate='intersects')
+        sector_idx.append(hits[0] + start)
+        vertex_idx.append(hits[1])
+    sector_idx = np.concatenate(sector_idx)
+    vertex_idx = np.concatenate(vertex_idx)
+    order = np.lexsort((vertex_idx, sector_idx))
+    return sector_idx[order], vertex_idx[order]
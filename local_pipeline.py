@@ -0,0 +1,201 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+from pathlib import Path
+import json
+import os
+import sys
+import time
+
+# --- КОНФІГУРАЦІЯ ТА ШЛЯХІ ---
+
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(CURRENT_DIR))
+
+from config import GEOM_PARAMS
+from memory_usage import peak_rss_mb, reset_peak_rss
+import lattice
+import sector_csr
+import sector_stencil
+
+FILE_PATH = CURRENT_DIR / "dataset" / "ukraine_border.geojson"
+OUTPUT_DIR = CURRENT_DIR / "output" / "local"
+GRID_SIZE = GEOM_PARAMS['SQUARE_SIZE_M']
+SECTOR_RADIUS = GEOM_PARAMS['SECTOR_RADIUS_M']
+CLEANUP_BUFFER = GEOM_PARAMS['CLEANUP_BUFFER_DEG']
+UNION_PRECISION = GEOM_PARAMS['UNION_PRECISION_DEG']
+SECTOR_MODE = GEOM_PARAMS['SECTOR_GEODESIC_MODE']
+AZIMUTHS = np.asarray(lattice.SECTOR_AZIMUTHS)
+
+# 'scanline' - заливка рядками + точний тест лише смуги вздовж межі, 'intersects' - тест кожної комірки охоплення.
+GRID_CLIP = GEOM_PARAMS['GRID_CLIP']
+
+# 'stencil' - аналітичні зсуви решітки (sector_stencil.py), 'strtree' - полігональний тест через STRtree.
+INTERSECTION_ENGINE = 'stencil'
+
+
+def create_output_path(filename, output_dir=None):
+    output_dir = output_dir or OUTPUT_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+    return output_dir / filename
+
+
+def dataset_exists(file_path):
+    if Path(file_path).exists():
+        return True
+    print(f"Error: GeoJSON file {os.path.basename(file_path)} not found in 'dataset/' directory.")
+    return False
+
+
+def write_geometry(geom, filename, output_dir=None):
+    path = create_output_path(filename, output_dir)
+    path.write_text(shapely.to_geojson(geom))
+    return path
+
+
+# --- ЕТАПИ (ВІДПОВІДАЮТЬ ЧАСТИНАМ SQL_COMMANDS У run_sql.py) ---
+
+def build_border(file_path):
+    gdf = gpd.read_file(file_path)
+    raw_union = shapely.union_all(shapely.set_precision(shapely.make_valid(gdf.geometry.values), UNION_PRECISION))
+
+    center = shapely.centroid(raw_union)
+
+    cleaned = shapely.buffer(
+        shapely.buffer(raw_union, CLEANUP_BUFFER, cap_style='flat', join_style='mitre'),
+        -CLEANUP_BUFFER,
+        cap_style='flat',
+        join_style='mitre'
+    )
+    parts = shapely.get_parts(cleaned)
+    clean_border = parts[np.argmax(shapely.area(parts))]
+
+    return raw_union, clean_border, (center.x, center.y)
+
+
+def build_grid(clean_border, size, clip=GRID_CLIP):
+    border_3857 = lattice.border_to_mercator(clean_border)
+    if clip == 'scanline':
+        return lattice.rasterize_cells(border_3857, size)
+    cell_i, cell_j = lattice.grid_extent_cells(border_3857, size)
+    return lattice.clip_cells(cell_i, cell_j, size, border_3857)
+
+
+def build_vertices(cell_i, cell_j, size):
+    vertex_i, vertex_j, vertex_cells = lattice.unique_vertices(cell_i, cell_j)
+    lon, lat = lattice.vertex_lonlat(vertex_i, vertex_j, size)
+    return vertex_i, vertex_j, vertex_cells, lon, lat
+
+
+def build_intersections(vertex_i, vertex_j, lon, lat, size, radius, engine=INTERSECTION_ENGINE, mode=SECTOR_MODE):
+    rings = lattice.sector_rings(lon, lat, radius, mode=mode)
+    if mode == 'planar':
+        print(f"   Planar mode max arc point error vs geodesic: {lattice.planar_error_m(lat, radius):.3f} m")
+    if engine == 'stencil':
+        sector_idx, vertex_idx = sector_stencil.stencil_intersections(
+            vertex_i, vertex_j, lon, lat, size, radius, rings=rings
+        )
+    else:
+        sectors = lattice.sector_polygons(rings)
+        sector_idx, vertex_idx = lattice.sector_vertex_intersections(sectors, shapely.points(lon, lat))
+    return rings, sector_idx, vertex_idx
+
+
+def record_stage(report, stage, seconds, rows, filenames, output_dir):
+    # Пік RSS етапу: лічильник скидається після кожного запису (memory_usage.reset_peak_rss).
+    if report is not None:
+        report.append({
+            'stage': stage, 'status': 'done', 'seconds': seconds, 'rows': rows,
+            'bytes': sum(os.path.getsize(output_dir / filename) for filename in filenames),
+            'peak_rss_mb': peak_rss_mb()
+        })
+        reset_peak_rss()
+
+
+# --- EXECUTION FUNCTION ---
+
+def run_local_pipeline(file_path=FILE_PATH, size=GRID_SIZE, radius=SECTOR_RADIUS, engine=INTERSECTION_ENGINE,
+                       report=None, output_dir=None):
+    # report (список) отримує запис {'stage', 'status', 'seconds', 'rows', 'bytes', 'peak_rss_mb'}
+    # для кожного етапу; output_dir - інший каталог результатів замість OUTPUT_DIR (бенчмарк, тести).
+
+    if not dataset_exists(file_path):
+        return
+    output_dir = output_dir or OUTPUT_DIR
+    if report is not None:
+        reset_peak_rss()
+
+    print("Starting in-process analysis pipeline (NumPy + Shapely)...")
+    start_time = time.time()
+    timings = {}
+
+    stage_start = time.time()
+    raw_union, clean_border, (center_lon, center_lat) = build_border(file_path)
+    write_geometry(raw_union, "ukraine_raw_union_safe.geojson", output_dir)
+    write_geometry(clean_border, "ukraine_clean_border.geojson", output_dir)
+    create_output_path("ukraine_center.json", output_dir).write_text(
+        json.dumps({'center_lon': center_lon, 'center_lat': center_lat})
+    )
+    timings['border'] = time.time() - stage_start
+    print(f"   1. Border union and cleanup: {timings['border']:.2f} s")
+    record_stage(report, 'border', timings['border'], len(shapely.get_parts(clean_border)), [
+        "ukraine_raw_union_safe.geojson", "ukraine_clean_border.geojson", "ukraine_center.json"
+    ], output_dir)
+
+    stage_start = time.time()
+    cell_i, cell_j = build_grid(clean_border, size)
+    np.savez(create_output_path("ukraine_grid.npz", output_dir), i=cell_i, j=cell_j, size=size)
+    timings['grid'] = time.time() - stage_start
+    print(f"   2. Grid {size} m: {len(cell_i)} cells, {timings['grid']:.2f} s")
+    record_stage(report, 'grid', timings['grid'], len(cell_i), ["ukraine_grid.npz"], output_dir)
+
+    stage_start = time.time()
+    vertex_i, vertex_j, vertex_cells, lon, lat = build_vertices(cell_i, cell_j, size)
+    vertex_id = np.arange(1, len(vertex_i) + 1)
+    np.savez(
+        create_output_path("grid_vertices.npz", output_dir),
+        id=vertex_id, vertex_i=vertex_i, vertex_j=vertex_j, lon=lon, lat=lat,
+        cell_vertex_ids=vertex_id[vertex_cells]
+    )
+    timings['vertices'] = time.time() - stage_start
+    print(f"   3. Unique vertices: {len(vertex_i)}, {timings['vertices']:.2f} s")
+    record_stage(report, 'vertices', timings['vertices'], len(vertex_i), ["grid_vertices.npz"], output_dir)
+
+    stage_start = time.time()
+    rings, sector_idx, vertex_idx = build_intersections(vertex_i, vertex_j, lon, lat, size, radius, engine)
+    n_az = len(AZIMUTHS)
+    np.savez(
+        create_output_path("all_sectors.npz", output_dir),
+        vertex_id=np.repeat(vertex_id, n_az), azimuth=np.tile(AZIMUTHS, len(vertex_id)), rings=rings
+    )
+    np.savez(
+        create_output_path("sector_intersections_full.npz", output_dir),
+        sector_source_vertex_id=vertex_id[sector_idx // n_az],
+        azimuth=AZIMUTHS[sector_idx % n_az],
+        intersecting_vertex_id=vertex_id[vertex_idx]
+    )
+    sector_csr.save_csr(
+        create_output_path("sector_targets_csr.npz", output_dir),
+        sector_csr.build_csr(
+            np.repeat(vertex_id, n_az), np.tile(AZIMUTHS, len(vertex_id)), sector_idx, vertex_id[vertex_idx]
+        )
+    )
+    np.savez(
+        create_output_path("vertex_coverage.npz", output_dir),
+        vertex_id=vertex_id, azimuth=AZIMUTHS,
+        sectors=sector_csr.vertex_coverage(sector_idx, vertex_idx, len(vertex_id), n_az)
+    )
+    timings['sectors_intersections'] = time.time() - stage_start
+    print(f"   4. Sectors: {len(rings)}, intersections: {len(sector_idx)}, "
+          f"{timings['sectors_intersections']:.2f} s")
+    record_stage(report, 'sectors_intersections', timings['sectors_intersections'], len(sector_idx), [
+        "all_sectors.npz", "sector_intersections_full.npz", "sector_targets_csr.npz", "vertex_coverage.npz"
+    ], output_dir)
+
+    print(f"\nAnalysis completed successfully in {time.time() - start_time:.2f} seconds.")
+    print(f"Results saved: {os.path.abspath(output_dir)}")
+    return timings
+
+
+if __name__ == "__main__":
+    run_local_pipeline()
@@ -0,0 +1,33 @@
+from pathlib import Path
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# --- ПІКОВА ПАМ'ЯТЬ ПРОЦЕСУ ---
+#
+# Спільне для бенчмарку й пайплайнів: пікова резидентна пам'ять (RSS) поточного процесу в МБ,
+# None там, де модуля resource немає (Windows).
+
+CLEAR_REFS = Path('/proc/self/clear_refs')
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # На Linux ru_maxrss у кілобайтах, на macOS - у байтах.
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def reset_peak_rss():
+    # Linux: запис '5' у /proc/self/clear_refs скидає пік RSS (VmHWM і ru_maxrss), тож наступний
+    # peak_rss_mb - пік лише з цього моменту (пік етапу). Де скидання недоступне, пік лишається
+    # накопиченим з початку процесу; повертає, чи вдалося скинути.
+    try:
+        CLEAR_REFS.write_text('5')
+    except OSError:
+        return False
+    return True
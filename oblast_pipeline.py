@@ -0,0 +1,244 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import geopandas as gpd
+import numpy as np
+import os
+import shapely
+import sys
+import time
+
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(CURRENT_DIR))
+
+from config import PIPELINE_PARAMS
+from local_pipeline import (
+    AZIMUTHS, FILE_PATH, GRID_SIZE, SECTOR_RADIUS, UNION_PRECISION, build_border, create_output_path, dataset_exists
+)
+import lattice
+import sector_stencil
+
+# --- ОБРОБКА ПО ОБЛАСТЯХ У ПУЛІ ПРОЦЕСІВ ---
+#
+# Кожна фіча GeoJSON (область, код iso3166-2) обробляється окремим процесом.
+# Сітка: растеризація області, обрізаної очищеним кордоном, з часткою площі кожної комірки
+# (внутрішні комірки - 1, смуга вздовж межі - точна площа перетину). Спільні комірки сусідніх
+# областей дедуплікуються: власник - область з найбільшою часткою, при рівності - менша за площею
+# (Київ усередині Київської області). Щілини між фічами (очищений кордон мінус об'єднання фіч)
+# растеризуються окремо, їхні комірки віддаються найближчій області - повторної растеризації
+# країни немає. Вершини будуються в пулі з власних комірок кожної області; спільна вершина
+# належить області найменшої за (j, i) комірки, кутом якої вона є; id вершин - як у повному запуску.
+# Перетини: сектори від вершин області, цілі - усі вершини в bbox області з ореолом радіуса.
+# Результат: спільна решітка output/oblasts/lattice.npz і окремий файл на область, тож
+# повторний запуск чи запит по області зачіпає лише її дані.
+
+OUTPUT_DIR = CURRENT_DIR / "output" / "oblasts"
+OBLAST_WORKERS = PIPELINE_PARAMS['OBLAST_WORKERS']
+CODE_FIELD = 'iso3166-2'
+NAME_FIELD = 'name:ua'
+
+
+def load_oblasts(file_path, clean_border):
+    # Області в EPSG:3857, обрізані очищеним кордоном (як і повна сітка).
+    gdf = gpd.read_file(file_path)
+    geoms = shapely.set_precision(shapely.make_valid(gdf.geometry.values), UNION_PRECISION)
+    geoms = shapely.intersection(geoms, clean_border)
+    return gdf[CODE_FIELD].tolist(), gdf[NAME_FIELD].tolist(), lattice.border_to_mercator(geoms)
+
+
+def oblast_cells(task):
+    # Комірки області з часткою площі, яку область у них займає.
+    index, oblast_wkb, size = task
+    oblast = shapely.from_wkb(oblast_wkb)
+    polygons = shapely.get_parts(oblast)
+    polygons = polygons[shapely.get_type_id(polygons) == shapely.GeometryType.POLYGON]
+    if len(polygons) == 0:
+        return index, np.zeros(0, dtype=np.int64), np.zeros(0)
+    oblast = shapely.multipolygons(polygons)
+    cell_i, cell_j = lattice.rasterize_cells(oblast, size)
+    keys = lattice.lattice_cell_keys(cell_i, cell_j)
+
+    band = lattice.lattice_cell_keys(*lattice.band_cells(*lattice.border_segments(oblast), size))
+    position = np.minimum(np.searchsorted(band, keys), len(band) - 1)
+    on_edge = band[position] == keys
+    fraction = np.ones(len(keys))
+    edge_cells = lattice.cell_polygons(cell_i[on_edge], cell_j[on_edge], size)
+    fraction[on_edge] = shapely.area(shapely.intersection(oblast, edge_cells)) / float(size) ** 2
+    return index, keys, fraction
+
+
+def assign_cells(results, oblast_area):
+    # Дедуплікація спільних комірок: власник - область з найбільшою часткою, при рівності - менша.
+    keys = np.concatenate([keys for _, keys, _ in results])
+    total = len(keys)
+    fraction = np.concatenate([fraction for _, _, fraction in results])
+    owner = np.concatenate([np.full(len(keys), index, dtype=np.int16) for index, keys, _ in results])
+    order = np.lexsort((oblast_area[owner], -np.round(fraction, 9), keys))
+    keys, owner = keys[order], owner[order]
+    first = np.concatenate([[True], keys[1:] != keys[:-1]])
+    return keys[first], owner[first], total - int(first.sum())
+
+
+def gap_cells(raw_union, clean_border, owned_keys, oblasts_3857, size):
+    # Щілини між фічами: комірки частини очищеного кордону поза всіма областями, що не дісталися
+    # жодній області, віддаються найближчій.
+    parts = shapely.get_parts(shapely.difference(clean_border, raw_union))
+    parts = parts[shapely.get_type_id(parts) == shapely.GeometryType.POLYGON]
+    if len(parts) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int16)
+    gap = lattice.border_to_mercator(shapely.multipolygons(parts))
+    keys = lattice.lattice_cell_keys(*lattice.rasterize_cells(gap, size))
+    position = np.minimum(np.searchsorted(owned_keys, keys), len(owned_keys) - 1)
+    keys = keys[owned_keys[position] != keys]
+    if len(keys) == 0:
+        return keys, np.zeros(0, dtype=np.int16)
+    gap_polygons = lattice.cell_polygons(*lattice.key_cells(keys), size)
+    distance = np.stack([shapely.distance(oblast, gap_polygons) for oblast in oblasts_3857])
+    return keys, np.argmin(distance, axis=0).astype(np.int16)
+
+
+def oblast_vertices(task):
+    # Вершини власних комірок області і для кожної - найменша за (j, i) інцидентна комірка області.
+    index, cell_keys = task
+    vertex_i, vertex_j, vertex_cells = lattice.unique_vertices(*lattice.key_cells(cell_keys))
+    first_cell = np.full(len(vertex_i), np.iinfo(np.int64).max)
+    np.minimum.at(first_cell, vertex_cells.ravel(), np.repeat(cell_keys, 4))
+    return index, lattice.lattice_cell_keys(vertex_i, vertex_j), first_cell
+
+
+def merge_vertices(results):
+    # Спільна вершина сусідніх областей належить області з найменшою інцидентною коміркою,
+    # як і в повному запуску; id - ранг у порядку (vertex_j, vertex_i).
+    keys = np.concatenate([keys for _, keys, _ in results])
+    first_cell = np.concatenate([first_cell for _, _, first_cell in results])
+    owner = np.concatenate([np.full(len(keys), index, dtype=np.int16) for index, keys, _ in results])
+    order = np.lexsort((first_cell, keys))
+    keys, owner = keys[order], owner[order]
+    first = np.concatenate([[True], keys[1:] != keys[:-1]])
+    return keys[first], owner[first]
+
+
+def oblast_intersections(task):
+    index, vertex_i, vertex_j, lon, lat, source_mask, size, radius = task
+    sector_idx, vertex_idx = sector_stencil.stencil_intersections(
+        vertex_i, vertex_j, lon, lat, size, radius, source_mask=source_mask
+    )
+    return index, sector_idx, vertex_idx
+
+
+def intersection_tasks(indices, lattice_data, size, radius, halo):
+    vertex_i, vertex_j = lattice_data['vertex_i'], lattice_data['vertex_j']
+    for index in indices:
+        own = lattice_data['vertex_oblast'] == index
+        if not own.any():
+            continue
+        window = (
+            (vertex_i >= vertex_i[own].min() - halo) & (vertex_i <= vertex_i[own].max() + halo)
+            & (vertex_j >= vertex_j[own].min() - halo) & (vertex_j <= vertex_j[own].max() + halo)
+        )
+        positions = np.flatnonzero(window)
+        yield positions, (
+            index, vertex_i[window], vertex_j[window], lattice_data['lon'][window], lattice_data['lat'][window],
+            own[window], size, radius
+        )
+
+
+def build_lattice(file_path, size, workers):
+    raw_union, clean_border, _ = build_border(file_path)
+    codes, names, oblasts_3857 = load_oblasts(file_path, clean_border)
+    tasks = [(index, shapely.to_wkb(oblast), size) for index, oblast in enumerate(oblasts_3857)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        cell_keys, cell_oblast, shared = assign_cells(
+            list(pool.map(oblast_cells, tasks)), shapely.area(oblasts_3857)
+        )
+        gap_keys, gap_oblast = gap_cells(raw_union, clean_border, cell_keys, oblasts_3857, size)
+        cell_keys = np.concatenate([cell_keys, gap_keys])
+        cell_oblast = np.concatenate([cell_oblast, gap_oblast])
+        order = np.argsort(cell_keys)
+        cell_keys, cell_oblast = cell_keys[order], cell_oblast[order]
+
+        vertex_tasks = [(index, cell_keys[cell_oblast == index]) for index in range(len(codes))]
+        vertex_keys, vertex_oblast = merge_vertices(list(pool.map(oblast_vertices, vertex_tasks)))
+
+    cell_i, cell_j = lattice.key_cells(cell_keys)
+    vertex_i, vertex_j = lattice.key_cells(vertex_keys)
+    lon, lat = lattice.vertex_lonlat(vertex_i, vertex_j, size)
+    print(f"   Grid: {len(cell_i)} cells ({shared} shared cells deduplicated, {len(gap_keys)} gap cells), "
+          f"{len(vertex_i)} vertices")
+    return {
+        'codes': np.asarray(codes), 'names': np.asarray(names), 'size': size,
+        'cell_i': cell_i, 'cell_j': cell_j, 'cell_oblast': cell_oblast,
+        'vertex_id': np.arange(1, len(vertex_i) + 1), 'vertex_i': vertex_i, 'vertex_j': vertex_j,
+        'lon': lon, 'lat': lat, 'vertex_oblast': vertex_oblast
+    }
+
+
+def load_lattice(path=OUTPUT_DIR / "lattice.npz"):
+    with np.load(path) as data:
+        lattice_data = {key: data[key] for key in data.files}
+    lattice_data['size'] = float(lattice_data['size'])
+    return lattice_data
+
+
+def run_oblast_pipeline(codes=None, file_path=FILE_PATH, size=GRID_SIZE, radius=SECTOR_RADIUS,
+                        workers=OBLAST_WORKERS):
+    # codes=None - повна побудова; список кодів - перерахунок перетинів лише цих областей
+    # на збереженій решітці lattice.npz.
+
+    if not dataset_exists(file_path):
+        return
+
+    print(f"Starting per-oblast pipeline ({workers} workers)...")
+    start_time = time.time()
+    lattice_path = OUTPUT_DIR / "lattice.npz"
+    rebuild = codes is None or not lattice_path.exists()
+    if rebuild:
+        lattice_data = build_lattice(file_path, size, workers)
+        np.savez(create_output_path("lattice.npz", OUTPUT_DIR), **lattice_data)
+    else:
+        lattice_data = load_lattice(lattice_path)
+        size = lattice_data['size']
+    known = lattice_data['codes'].tolist()
+    unknown = [code for code in codes or [] if code not in known]
+    if unknown:
+        print(f"Error: unknown oblast codes: {', '.join(unknown)}. Known codes: {', '.join(known)}")
+        return
+    indices = range(len(known)) if rebuild else [known.index(code) for code in codes]
+    print(f"   Lattice ready: {time.time() - start_time:.2f} s")
+
+    max_lat = float(lattice_data['lat'].max())
+    halo = lattice.sector_halo(radius, size, max_lat)
+    windows = {}
+    tasks = []
+    for positions, task in intersection_tasks(indices, lattice_data, size, radius, halo):
+        windows[task[0]] = positions
+        tasks.append(task)
+
+    vertex_id = lattice_data['vertex_id']
+    n_az = len(AZIMUTHS)
+    total_hits = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for index, sector_idx, vertex_idx in pool.map(oblast_intersections, tasks):
+            window_id = vertex_id[windows[index]]
+            code = lattice_data['codes'][index]
+            own_cells = lattice_data['cell_oblast'] == index
+            np.savez(
+                create_output_path(f"{code}.npz", OUTPUT_DIR),
+                code=code, name=lattice_data['names'][index],
+                cell_i=lattice_data['cell_i'][own_cells], cell_j=lattice_data['cell_j'][own_cells],
+                vertex_id=vertex_id[lattice_data['vertex_oblast'] == index],
+                sector_source_vertex_id=window_id[sector_idx // n_az],
+                azimuth=AZIMUTHS[sector_idx % n_az],
+                intersecting_vertex_id=window_id[vertex_idx]
+            )
+            total_hits += len(sector_idx)
+            print(f"   {code} {lattice_data['names'][index]}: {int(own_cells.sum())} cells, "
+                  f"{len(sector_idx)} intersections")
+
+    print(f"\nPer-oblast analysis completed in {time.time() - start_time:.2f} seconds: "
+          f"{len(tasks)} oblasts, {total_hits} intersections, halo {halo} cells.")
+    print(f"Results saved: {os.path.abspath(OUTPUT_DIR)}")
+    return total_hits
+
+
+if __name__ == "__main__":
+    run_oblast_pipeline(sys.argv[1:] or None)
@@ -0,0 +1,145 @@
+from pathlib import Path
+from pyproj import CRS
+import pyarrow as pa
+import pyarrow.parquet as pq
+import json
+import os
+import sys
+import time
+
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(CURRENT_DIR))
+
+from config import TABLE_NAMES
+from run_sql import create_db_engine
+
+# --- ПОТОКОВИЙ ЕКСПОРТ ТАБЛИЦЬ У GEOPARQUET ---
+#
+# Таблиця читається іменованим (серверним) курсором порціями по BATCH_ROWS рядків; кожна порція
+# одразу записується окремою row group. У пам'яті одночасно лише одна порція, тож пік пам'яті
+# не залежить від розміру сітки. Геометрія - WKB (GeoParquet 1.0), поруч - id решітки.
+
+OUTPUT_DIR = CURRENT_DIR / "output" / "parquet"
+BATCH_ROWS = 100_000
+COMPRESSION = 'zstd'
+GEOPARQUET_VERSION = '1.0.0'
+
+# Таблиця -> геометрія (SRID, типи), атрибути з типами Arrow та порядок рядків (локальність row groups).
+EXPORT_TABLES = {
+    'border': {
+        'table': TABLE_NAMES['CLEAN_BORDER'],
+        'geom': 'geom',
+        'srid': 4326,
+        'geometry_types': ['Polygon', 'MultiPolygon'],
+        'columns': []
+    },
+    'grid': {
+        'table': TABLE_NAMES['GRID'],
+        'geom': 'geom',
+        'srid': 3857,
+        'geometry_types': ['Polygon'],
+        'columns': [('i', pa.int32()), ('j', pa.int32())],
+        'order': 'j, i'
+    },
+    'vertices': {
+        'table': TABLE_NAMES['VERTICES'],
+        'geom': 'vertex_point',
+        'srid': 4326,
+        'geometry_types': ['Point'],
+        'columns': [('id', pa.int32()), ('vertex_i', pa.int32()), ('vertex_j', pa.int32())],
+        'order': 'id'
+    },
+    'sectors': {
+        'table': TABLE_NAMES['SECTORS'],
+        'geom': 'sector_geom',
+        'srid': 4326,
+        'geometry_types': ['Polygon'],
+        'columns': [('vertex_id', pa.int32()), ('azimuth', pa.int16())],
+        'order': 'vertex_id, azimuth'
+    },
+    'vertex_coverage': {
+        'table': TABLE_NAMES['VERTEX_COVERAGE'],
+        'columns': [('vertex_id', pa.int32()), ('azimuth', pa.int16()), ('sectors', pa.int32())],
+        'order': 'vertex_id, azimuth'
+    },
+    'intersections': {
+        'table': TABLE_NAMES['INTERSECTIONS'],
+        'columns': [
+            ('sector_source_vertex_id', pa.int32()),
+            ('azimuth', pa.int16()),
+            ('intersecting_vertex_id', pa.int32())
+        ]
+    }
+}
+
+
+def create_output_path(filename):
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    return OUTPUT_DIR / filename
+
+
+def export_sql(spec):
+    columns = [name for name, _ in spec['columns']]
+    if 'geom' in spec:
+        columns.append(f"ST_AsBinary({spec['geom']}) AS geometry")
+    order = f" ORDER BY {spec['order']}" if 'order' in spec else ''
+    return f"SELECT {', '.join(columns)} FROM {spec['table']}{order}"
+
+
+def export_schema(spec):
+    fields = [pa.field(name, arrow_type) for name, arrow_type in spec['columns']]
+    if 'geom' not in spec:
+        return pa.schema(fields)
+
+    column_meta = {'encoding': 'WKB', 'geometry_types': spec['geometry_types']}
+    if spec['srid'] != 4326:
+        # Без 'crs' GeoParquet вважає OGC:CRS84 (довгота/широта), що відповідає EPSG:4326 у PostGIS.
+        column_meta['crs'] = CRS.from_epsg(spec['srid']).to_json_dict()
+    geo = {'version': GEOPARQUET_VERSION, 'primary_column': 'geometry', 'columns': {'geometry': column_meta}}
+    fields.append(pa.field('geometry', pa.binary()))
+    return pa.schema(fields, metadata={'geo': json.dumps(geo)})
+
+
+def export_table(conn, spec, path, batch_rows=BATCH_ROWS):
+    # Повертає кількість записаних рядків.
+    schema = export_schema(spec)
+    cursor = conn.cursor(name=f"export_{spec['table']}")
+    cursor.itersize = batch_rows
+    cursor.execute(export_sql(spec))
+
+    rows_written = 0
+    with pq.ParquetWriter(path, schema, compression=COMPRESSION) as writer:
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            arrays = [
+                pa.array([bytes(value) for value in column] if field.name == 'geometry' else column, type=field.type)
+                for field, column in zip(schema, columns)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            rows_written += len(rows)
+    cursor.close()
+    conn.commit()
+    return rows_written
+
+
+def export_geoparquet(names=tuple(EXPORT_TABLES), batch_rows=BATCH_ROWS):
+    engine = create_db_engine()
+    conn = engine.raw_connection()
+    try:
+        for name in names:
+            spec = EXPORT_TABLES[name]
+            start = time.time()
+            path = create_output_path(f"{spec['table']}.parquet")
+            rows = export_table(conn, spec, path, batch_rows)
+            print(f"   {spec['table']}: {rows} rows, {os.path.getsize(path) / 1e6:.1f} MB, "
+                  f"{time.time() - start:.2f} s")
+    finally:
+        conn.close()
+    print(f"GeoParquet files saved: {os.path.abspath(OUTPUT_DIR)}")
+
+
+if __name__ == "__main__":
+    export_geoparquet(sys.argv[1:] or tuple(EXPORT_TABLES))
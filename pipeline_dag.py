@@ -0,0 +1,142 @@
+from pathlib import Path
+import hashlib
+import json
+import sys
+import time
+
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(CURRENT_DIR))
+
+from config import TABLE_NAMES
+from memory_usage import peak_rss_mb, reset_peak_rss
+
+# --- ІНКРЕМЕНТАЛЬНИЙ ЗАПУСК ЕТАПІВ ---
+#
+# Кожен етап описується словником:
+#   'name'     - назва етапу,
+#   'upstream' - етапи, від яких він залежить,
+#   'params'   - ключі GEOM_PARAMS, що впливають на результат,
+#   'files'    - вхідні файли (хеш вмісту),
+#   'outputs'  - таблиці, які створює етап (або сигнатури функцій 'name(type, ...)'),
+#   'sql'      - функція params -> текст SQL (входить у відбиток),
+#   'run'      - функція (engine, conn, params), що виконує етап.
+# Відбиток етапу = хеш його входів та відбитків попередніх етапів. Етап пропускається, якщо
+# збережений відбиток збігається, статус 'done' і всі вихідні таблиці існують.
+
+STATE_TABLE = TABLE_NAMES['STAGES']
+
+SQL_STATE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+    stage TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+SQL_SAVE_STATE = f"""
+INSERT INTO {STATE_TABLE} (stage, fingerprint, status, updated_at)
+VALUES (%s, %s, %s, now())
+ON CONFLICT (stage) DO UPDATE
+SET fingerprint = EXCLUDED.fingerprint, status = EXCLUDED.status, updated_at = EXCLUDED.updated_at
+"""
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_fingerprint(stage, params, upstream_fingerprints):
+    payload = {
+        'stage': stage['name'],
+        'params': {key: params[key] for key in stage.get('params', [])},
+        'files': [file_hash(path) for path in stage.get('files', [])],
+        'upstream': [upstream_fingerprints[name] for name in stage.get('upstream', [])],
+        'sql': stage['sql'](params) if 'sql' in stage else None
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def stage_fingerprints(stages, params):
+    fingerprints = {}
+    for stage in stages:
+        fingerprints[stage['name']] = stage_fingerprint(stage, params, fingerprints)
+    return fingerprints
+
+
+def load_state(cursor):
+    cursor.execute(SQL_STATE_TABLE)
+    cursor.execute(f"SELECT stage, fingerprint, status FROM {STATE_TABLE}")
+    return {stage: (fingerprint, status) for stage, fingerprint, status in cursor.fetchall()}
+
+
+def save_state(cursor, stage_name, fingerprint, status):
+    cursor.execute(SQL_SAVE_STATE, (stage_name, fingerprint, status))
+
+
+def outputs_exist(cursor, outputs):
+    for output in outputs:
+        lookup = 'to_regprocedure' if '(' in output else 'to_regclass'
+        cursor.execute(f"SELECT {lookup}(%s)", (output,))
+        if cursor.fetchone()[0] is None:
+            return False
+    return True
+
+
+def run_stages(engine, stages, params, force=False, report=None):
+    # Повертає True, якщо всі етапи виконані або актуальні.
+    # report (список) отримує запис {'stage', 'status', 'seconds'} для кожного етапу, для виконаних -
+    # ще пік RSS клієнта під час етапу ('peak_rss_mb').
+    fingerprints = stage_fingerprints(stages, params)
+
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        state = load_state(cursor)
+        conn.commit()
+
+        for index, stage in enumerate(stages, start=1):
+            name = stage['name']
+            fingerprint = fingerprints[name]
+
+            up_to_date = (
+                state.get(name) == (fingerprint, 'done')
+                and outputs_exist(cursor, stage.get('outputs', []))
+            )
+            if up_to_date and not force:
+                print(f"{index}. Stage '{name}': up to date, skipped.")
+                if report is not None:
+                    report.append({'stage': name, 'status': 'skipped', 'seconds': 0.0})
+                continue
+
+            print(f"{index}. Stage '{name}'...")
+            stage_start = time.time()
+            if report is not None:
+                reset_peak_rss()
+            save_state(cursor, name, fingerprint, 'running')
+            conn.commit()
+            try:
+                stage['run'](engine, conn, params)
+                save_state(cursor, name, fingerprint, 'done')
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                save_state(cursor, name, fingerprint, 'failed')
+                conn.commit()
+                print(f"   Critical Error: stage '{name}' failed, next run resumes from it. Error: {e}")
+                if report is not None:
+                    report.append({'stage': name, 'status': 'failed', 'seconds': time.time() - stage_start})
+                return False
+            print(f"   Stage '{name}' completed in {time.time() - stage_start:.2f} seconds.")
+            if report is not None:
+                report.append({
+                    'stage': name, 'status': 'done', 'seconds': time.time() - stage_start,
+                    'peak_rss_mb': peak_rss_mb()
+                })
+        return True
+    finally:
+        conn.close()
@@ -1,7 +1,10 @@
-import geopandas as gpd
 from sqlalchemy import create_engine
-from sqlalchemy.exc import ProgrammingError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
+import hashlib
+import json
+import math
 import os
 import sys
 import time
@@ -11,224 +14,973 @@ import time
 CURRENT_DIR = Path(__file__).resolve().parent
 sys.path.append(str(CURRENT_DIR))
 
-from config import DB_CONFIG, TABLE_NAMES, GEOM_PARAMS
+from config import DB_CONFIG, TABLE_NAMES, GEOM_PARAMS, PIPELINE_PARAMS
+from pipeline_dag import file_hash, run_stages
+from sector_copy import upload_sectors
+from streaming_import import import_geojson_copy
+import sql_trace
+
+FILE_PATH = CURRENT_DIR / "dataset" / "ukraine_border.geojson"
+INTERSECTION_WORKERS = PIPELINE_PARAMS['INTERSECTION_WORKERS']
+TILE_SIZE = PIPELINE_PARAMS['TILE_SIZE_CELLS']
+SECTOR_BUILDER = PIPELINE_PARAMS['SECTOR_BUILDER']
+MATERIALIZE_INTERSECTIONS = PIPELINE_PARAMS['MATERIALIZE_INTERSECTIONS']
+
+
+def sql_azimuths(params):
+    return ', '.join(str(azimuth) for azimuth in params['SECTOR_AZIMUTHS'])
 
-FILE_PATH = CURRENT_DIR / "dataset" / "ukraine_border.geojson" 
-GRID_SIZE = GEOM_PARAMS['SQUARE_SIZE_M']
-SECTOR_RADIUS = GEOM_PARAMS['SECTOR_RADIUS_M']
-CLEANUP_BUFFER = GEOM_PARAMS['CLEANUP_BUFFER_DEG']
 
 # --- SQL БЛОК A: ФУНКЦІЯ (ПОВИННА ВИКОНУВАТИСЯ ОДНИМ ЗАПИТОМ) ---
 
-SQL_FUNCTION = f"""
+# ST_Sector_Fixed - для разових запитів і SQL-функцій покриття. Підзапит ARRAY(SELECT ...) над
+# generate_series не дає планувальнику вбудувати функцію в запит, тож кожен виклик - окремий виклик
+# функції на рядок. Масова побудова all_sectors її не використовує (див. sql_sectors).
+def sql_sector_function(params):
+    return f"""
+DROP FUNCTION IF EXISTS ST_Sector_Fixed(GEOMETRY, NUMERIC, NUMERIC, NUMERIC);
+
 CREATE OR REPLACE FUNCTION ST_Sector_Fixed(
-    center GEOMETRY, 
-    radius NUMERIC, 
-    azimuth_center NUMERIC, 
-    angle_width NUMERIC
+    center GEOMETRY,
+    radius NUMERIC,
+    azimuth_center NUMERIC,
+    angle_width NUMERIC,
+    num_points INTEGER DEFAULT {params['SECTOR_ARC_POINTS']}
 )
 RETURNS GEOMETRY AS $$
-DECLARE
-    angle_start NUMERIC := azimuth_center - angle_width / 2;
-    angle_end NUMERIC := azimuth_center + angle_width / 2;
-    num_points INTEGER := 16; 
-    points GEOMETRY[];
-    i INTEGER;
-BEGIN
-    points := ARRAY[center]; 
-    FOR i IN 0..num_points LOOP
-        points := array_append(points, 
-            ST_Project(
-                center::geography, 
-                radius, 
-                radians(angle_start + (angle_end - angle_start) * i / num_points)
+    SELECT ST_SetSRID(ST_MakePolygon(ST_MakeLine(
+        ARRAY[center]
+        || ARRAY(
+            SELECT ST_Project(
+                center::geography,
+                radius,
+                radians(azimuth_center - angle_width / 2 + angle_width * k / num_points)
             )::geometry
-        );
-    END LOOP;
-    points := array_append(points, center);
-    RETURN ST_SetSRID(ST_MakePolygon(ST_MakeLine(points)), ST_SRID(center));
-END;
-$$ LANGUAGE plpgsql;
+            FROM generate_series(0, num_points) AS k
+            ORDER BY k
+        )
+        || ARRAY[center]
+    )), ST_SRID(center))
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
 """
 
-# --- SQL БЛОК B: ОСНОВНІ КОМАНДИ (РОЗДІЛЯЮТЬСЯ КРАПКОЮ З КОМОЮ) ---
 
-SQL_COMMANDS = f"""
+# --- SQL БЛОК B: ЕТАПИ (КОМАНДИ РОЗДІЛЯЮТЬСЯ КРАПКОЮ З КОМОЮ) ---
+
+# I. BORDER CLEANUP AND GEOMETRY BASE
+def sql_border(params):
+    # Одне об'єднання областей (після прив'язки до сітки точності) використовується і для центру,
+    # і для очищення. Позитивний буфер рахується по частинах ST_Subdivide і зливається каскадним
+    # ST_Union; негативний буфер - один раз по вже злитому результату.
+    precision = params['UNION_PRECISION_DEG']
+    cleanup_buffer = params['CLEANUP_BUFFER_DEG']
+    max_vertices = params['CLEANUP_SUBDIVIDE_VERTICES']
+    return f"""
 DROP TABLE IF EXISTS {TABLE_NAMES['CENTER']} CASCADE;
 DROP TABLE IF EXISTS {TABLE_NAMES['RAW_UNION_SAFE']} CASCADE;
 DROP TABLE IF EXISTS {TABLE_NAMES['CLEAN_BORDER']} CASCADE;
-DROP TABLE IF EXISTS {TABLE_NAMES['GRID']} CASCADE;
-DROP TABLE IF EXISTS {TABLE_NAMES['VERTICES']} CASCADE;
-DROP TABLE IF EXISTS {TABLE_NAMES['SECTORS']} CASCADE;
-DROP TABLE IF EXISTS sector_intersections_full CASCADE;
-DROP TABLE IF EXISTS sector_intersections_half CASCADE;
-DROP TABLE IF EXISTS buffer_step CASCADE;
-
 
--- I. BORDER CLEANUP AND GEOMETRY BASE
 CREATE TABLE {TABLE_NAMES['RAW_UNION_SAFE']} AS
-SELECT ST_Union(ST_MakeValid(geometry)) AS geom
+SELECT ST_Union(ST_ReducePrecision(ST_MakeValid(geometry), {precision})) AS geom
 FROM {TABLE_NAMES['BORDER']};
 
 CREATE TABLE {TABLE_NAMES['CENTER']} AS
-SELECT 
-    ST_X(ST_Centroid(ST_Union(ST_MakeValid(geom)))) AS center_lon,
-    ST_Y(ST_Centroid(ST_Union(ST_MakeValid(geom)))) AS center_lat
-FROM {TABLE_NAMES['RAW_UNION_SAFE']};
-
-CREATE TABLE buffer_step AS
-SELECT 
-    ST_Buffer(
-        ST_Buffer(geom, {CLEANUP_BUFFER}, 'join=mitre endcap=flat'), 
-        -{CLEANUP_BUFFER}, 
-        'join=mitre endcap=flat'
-    ) AS cleaned_geom
-FROM {TABLE_NAMES['RAW_UNION_SAFE']};
+SELECT ST_X(c.geom) AS center_lon, ST_Y(c.geom) AS center_lat
+FROM (SELECT ST_Centroid(geom) AS geom FROM {TABLE_NAMES['RAW_UNION_SAFE']}) AS c;
 
 CREATE TABLE {TABLE_NAMES['CLEAN_BORDER']} AS
-WITH FinalDump AS (
-    SELECT (ST_Dump(cleaned_geom)).geom AS geom
-    FROM buffer_step
+WITH Pieces AS (
+    SELECT ST_Subdivide(geom, {max_vertices}) AS geom
+    FROM {TABLE_NAMES['RAW_UNION_SAFE']}
+),
+Dilated AS (
+    SELECT ST_Union(ST_Buffer(geom, {cleanup_buffer}, 'join=mitre endcap=flat')) AS geom
+    FROM Pieces
+),
+Cleaned AS (
+    SELECT ST_ReducePrecision(ST_Buffer(geom, -{cleanup_buffer}, 'join=mitre endcap=flat'), {precision}) AS geom
+    FROM Dilated
+),
+FinalDump AS (
+    SELECT (ST_Dump(geom)).geom AS geom
+    FROM Cleaned
 )
-SELECT geom 
+SELECT geom
 FROM FinalDump
-ORDER BY ST_Area(geom) DESC 
+ORDER BY ST_Area(geom) DESC
 LIMIT 1;
 
-DROP TABLE buffer_step;
+CREATE INDEX idx_clean_border_geom ON {TABLE_NAMES['CLEAN_BORDER']} USING GIST (geom);
+"""
+
+
+# Очищений кордон зберігається як версійований артефакт з ключем (хеш датасету, параметри, SQL):
+# повторний запуск на тих самих даних відновлює таблиці з артефакту без об'єднання та буферів.
+SQL_BORDER_ARTIFACTS = f"""
+CREATE TABLE IF NOT EXISTS {TABLE_NAMES['BORDER_ARTIFACTS']} (
+    artifact_key TEXT PRIMARY KEY,
+    dataset_hash TEXT NOT NULL,
+    params JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    center_lon DOUBLE PRECISION,
+    center_lat DOUBLE PRECISION,
+    raw_geom GEOMETRY(Geometry, 4326),
+    clean_geom GEOMETRY(Geometry, 4326)
+)
+"""
+
+SQL_SAVE_BORDER_ARTIFACT = f"""
+INSERT INTO {TABLE_NAMES['BORDER_ARTIFACTS']}
+    (artifact_key, dataset_hash, params, center_lon, center_lat, raw_geom, clean_geom)
+SELECT %(key)s, %(dataset_hash)s, %(params)s::jsonb, ce.center_lon, ce.center_lat, r.geom, c.geom
+FROM {TABLE_NAMES['RAW_UNION_SAFE']} r, {TABLE_NAMES['CLEAN_BORDER']} c, {TABLE_NAMES['CENTER']} ce
+ON CONFLICT (artifact_key) DO NOTHING
+"""
+
+SQL_RESTORE_BORDER_ARTIFACT = f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['CENTER']} CASCADE;
+DROP TABLE IF EXISTS {TABLE_NAMES['RAW_UNION_SAFE']} CASCADE;
+DROP TABLE IF EXISTS {TABLE_NAMES['CLEAN_BORDER']} CASCADE;
+
+CREATE TABLE {TABLE_NAMES['RAW_UNION_SAFE']} AS
+SELECT raw_geom AS geom FROM {TABLE_NAMES['BORDER_ARTIFACTS']} WHERE artifact_key = %(key)s;
+
+CREATE TABLE {TABLE_NAMES['CENTER']} AS
+SELECT center_lon, center_lat FROM {TABLE_NAMES['BORDER_ARTIFACTS']} WHERE artifact_key = %(key)s;
+
+CREATE TABLE {TABLE_NAMES['CLEAN_BORDER']} AS
+SELECT clean_geom AS geom FROM {TABLE_NAMES['BORDER_ARTIFACTS']} WHERE artifact_key = %(key)s;
+
+CREATE INDEX idx_clean_border_geom ON {TABLE_NAMES['CLEAN_BORDER']} USING GIST (geom);
+"""
+
+BORDER_PARAMS = ['UNION_PRECISION_DEG', 'CLEANUP_BUFFER_DEG', 'CLEANUP_SUBDIVIDE_VERTICES']
+
+
+def sql_border_lod(params):
+    tolerances = ', '.join(str(tolerance) for tolerance in params['BORDER_LOD_TOLERANCES_DEG'])
+    return f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['BORDER_LOD']} CASCADE;
+
+CREATE TABLE {TABLE_NAMES['BORDER_LOD']} AS
+WITH Tolerances AS (
+    SELECT t.tolerance::float8 AS tolerance, t.level - 1 AS level
+    FROM unnest(ARRAY[0, {tolerances}]) WITH ORDINALITY AS t(tolerance, level)
+)
+SELECT 'clean' AS source, t.level, t.tolerance, ST_SimplifyPreserveTopology(b.geom, t.tolerance) AS geom
+FROM {TABLE_NAMES['CLEAN_BORDER']} b
+CROSS JOIN Tolerances t
+UNION ALL
+SELECT 'raw' AS source, t.level, t.tolerance, ST_SimplifyPreserveTopology(r.geom, t.tolerance) AS geom
+FROM {TABLE_NAMES['RAW_UNION_SAFE']} r
+CROSS JOIN Tolerances t;
+
+CREATE INDEX idx_border_lod_source ON {TABLE_NAMES['BORDER_LOD']} USING BTREE (source, tolerance);
+"""
+
+
+# II. GRID AND VERTICES CREATION
+# Повна сітка видаляється в обох режимах: у режимі quadtree вона не зберігається.
+SQL_DROP_GRID = f"DROP TABLE IF EXISTS {TABLE_NAMES['GRID']} CASCADE"
+
+
+def sql_grid_scanline(params):
+    # Відсікання за довжиною межі (як lattice.rasterize_cells): внутрішні комірки - заливкою рядків
+    # за парністю перетинів з ребрами межі, точний ST_Intersects (підготовлений кордон) - лише для
+    # смуги 3x3 навколо точок межі, згущених до кроку grid_size / 4.
+    grid_size = params['SQUARE_SIZE_M']
+    return f"""
+CREATE TABLE {TABLE_NAMES['GRID']} AS
+WITH Border AS (
+    SELECT ST_Transform(geom, 3857) AS geom
+    FROM {TABLE_NAMES['CLEAN_BORDER']}
+),
+Segments AS (
+    SELECT
+        ST_X(ST_StartPoint(s.geom)) AS x1,
+        ST_Y(ST_StartPoint(s.geom)) AS y1,
+        ST_X(ST_EndPoint(s.geom)) AS x2,
+        ST_Y(ST_EndPoint(s.geom)) AS y2
+    FROM Border b
+    CROSS JOIN LATERAL ST_DumpSegments(b.geom) AS s
+),
+Crossings AS (
+    SELECT
+        r.j,
+        sg.x1 + ((r.j + 0.5) * {grid_size} - sg.y1) * (sg.x2 - sg.x1) / (sg.y2 - sg.y1) AS x
+    FROM Segments sg
+    CROSS JOIN LATERAL generate_series(
+        ceil(least(sg.y1, sg.y2) / {grid_size} - 0.5)::int,
+        ceil(greatest(sg.y1, sg.y2) / {grid_size} - 0.5)::int - 1
+    ) AS r(j)
+),
+Spans AS (
+    SELECT j, x AS x_in, lead(x) OVER w AS x_out, row_number() OVER w AS k
+    FROM Crossings
+    WINDOW w AS (PARTITION BY j ORDER BY x)
+),
+Inside AS (
+    SELECT c.i, s.j
+    FROM Spans s
+    CROSS JOIN LATERAL generate_series(
+        ceil(s.x_in / {grid_size} - 0.5)::int,
+        floor(s.x_out / {grid_size} - 0.5)::int
+    ) AS c(i)
+    WHERE s.k % 2 = 1
+),
+Band AS (
+    SELECT DISTINCT
+        floor(ST_X(p.geom) / {grid_size})::int + d.di AS i,
+        floor(ST_Y(p.geom) / {grid_size})::int + d.dj AS j
+    FROM Border b
+    CROSS JOIN LATERAL ST_DumpPoints(ST_Segmentize(b.geom, {grid_size / 4})) AS p
+    CROSS JOIN (VALUES (-1, -1), (0, -1), (1, -1), (-1, 0), (0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)) AS d(di, dj)
+),
+Cells AS (
+    SELECT i, j FROM Inside
+    EXCEPT
+    SELECT i, j FROM Band
+    UNION ALL
+    SELECT bd.i, bd.j
+    FROM Band bd
+    CROSS JOIN Border b
+    WHERE ST_Intersects(
+        b.geom,
+        ST_MakeEnvelope(bd.i * {grid_size}, bd.j * {grid_size}, (bd.i + 1) * {grid_size}, (bd.j + 1) * {grid_size}, 3857)
+    )
+)
+SELECT
+    ST_MakeEnvelope(i * {grid_size}, j * {grid_size}, (i + 1) * {grid_size}, (j + 1) * {grid_size}, 3857) AS geom,
+    i,
+    j
+FROM Cells
+ORDER BY j, i;
+
+CREATE INDEX idx_ukraine_grid_geom ON {TABLE_NAMES['GRID']} USING GIST (geom);
+"""
+
 
--- II. GRID AND VERTICES CREATION
+def sql_grid_uniform(params):
+    grid_size = params['SQUARE_SIZE_M']
+    if params.get('GRID_CLIP', 'intersects') == 'scanline':
+        return sql_grid_scanline(params)
+    return f"""
 CREATE TABLE {TABLE_NAMES['GRID']} AS
 SELECT
-    (ST_SquareGrid({GRID_SIZE}, ST_SetSRID(ST_Extent(ST_Transform(geom, 3857)), 3857))).*
+    (ST_SquareGrid({grid_size}, ST_SetSRID(ST_Extent(ST_Transform(geom, 3857)), 3857))).*
 FROM {TABLE_NAMES['CLEAN_BORDER']};
 
 DELETE FROM {TABLE_NAMES['GRID']}
 WHERE NOT ST_Intersects(geom, (
-    SELECT ST_Transform(geom, 3857) 
+    SELECT ST_Transform(geom, 3857)
     FROM {TABLE_NAMES['CLEAN_BORDER']}
 ));
 
-CREATE TABLE {TABLE_NAMES['VERTICES']} AS
-WITH DumpedPoints AS (
-    SELECT 
-        ug.i AS i_grid_id, 
-        ug.j AS j_grid_id,
-        (ug.i || '_' || ug.j) AS grid_cell_name, 
-        (ST_DumpPoints(ug.geom)).geom AS vertex_point_3857
+CREATE INDEX idx_ukraine_grid_geom ON {TABLE_NAMES['GRID']} USING GIST (geom);
+"""
+
+
+def sql_grid_quadtree(params):
+    # Квадродерево від коренів розміром SQUARE_SIZE_M * 2^levels. Комірка (level, i, j) має розмір
+    # SQUARE_SIZE_M * 2^(levels - level); діти - (level + 1, 2i + di, 2j + dj). Ділиться лише комірка,
+    # що перетинає межу; комірка всередині кордону лишається листом свого рівня. На рівні levels
+    # (i, j) збігаються з ST_SquareGrid(SQUARE_SIZE_M), тож розгортання листів дає ту саму сітку.
+    # Зберігаються лише листи (їх кількість росте з довжиною межі); дрібні комірки розгортаються
+    # на вимогу: quadtree_expand - один лист, quadtree_cells - усі комірки в bbox (EPSG:3857) через
+    # GIST-індекс листів. Вершини рахуються з листів арифметично (sql_vertices).
+    grid_size = params['SQUARE_SIZE_M']
+    levels = params['QUADTREE_LEVELS']
+    return f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['GRID_QUADTREE']} CASCADE;
+
+CREATE TABLE {TABLE_NAMES['GRID_QUADTREE']} AS
+WITH RECURSIVE Border AS (
+    SELECT ST_Transform(geom, 3857) AS geom
+    FROM {TABLE_NAMES['CLEAN_BORDER']}
+),
+Roots AS (
+    SELECT (ST_SquareGrid({grid_size * 2 ** levels}, ST_SetSRID(ST_Extent(geom), 3857))).*
+    FROM Border
+),
+Tree AS (
+    SELECT 0 AS level, r.i, r.j, r.geom, ST_Contains(b.geom, r.geom) AS inside
+    FROM Roots r
+    CROSS JOIN Border b
+    WHERE ST_Intersects(r.geom, b.geom)
+    UNION ALL
+    SELECT t.level + 1, c.i, c.j, c.geom, ST_Contains(b.geom, c.geom)
+    FROM Tree t
+    CROSS JOIN Border b
+    CROSS JOIN LATERAL (
+        SELECT
+            ch.i,
+            ch.j,
+            ST_MakeEnvelope(
+                ch.i * ch.size, ch.j * ch.size, (ch.i + 1) * ch.size, (ch.j + 1) * ch.size, 3857
+            ) AS geom
+        FROM (
+            SELECT
+                t.i * 2 + d.di AS i,
+                t.j * 2 + d.dj AS j,
+                {grid_size}::float8 * (1 << ({levels} - t.level - 1)) AS size
+            FROM (VALUES (0, 0), (1, 0), (0, 1), (1, 1)) AS d(di, dj)
+        ) AS ch
+    ) AS c
+    WHERE NOT t.inside
+      AND t.level < {levels}
+      AND ST_Intersects(c.geom, b.geom)
+)
+SELECT level, i, j, {grid_size} * (1 << ({levels} - level)) AS size_m, inside, geom
+FROM Tree
+WHERE inside OR level = {levels};
+
+CREATE UNIQUE INDEX idx_grid_quadtree_cell ON {TABLE_NAMES['GRID_QUADTREE']} USING BTREE (level, i, j);
+CREATE INDEX idx_grid_quadtree_geom ON {TABLE_NAMES['GRID_QUADTREE']} USING GIST (geom);
+
+CREATE OR REPLACE FUNCTION quadtree_expand(cell_level integer, cell_i integer, cell_j integer)
+RETURNS TABLE(geom geometry, i integer, j integer) AS $$
+    SELECT
+        ST_MakeEnvelope(fi * {grid_size}, fj * {grid_size}, (fi + 1) * {grid_size}, (fj + 1) * {grid_size}, 3857),
+        fi,
+        fj
+    FROM generate_series(0, (1 << ({levels} - cell_level)) - 1) AS dj
+    CROSS JOIN generate_series(0, (1 << ({levels} - cell_level)) - 1) AS di
+    CROSS JOIN LATERAL (
+        SELECT
+            (cell_i << ({levels} - cell_level)) + di AS fi,
+            (cell_j << ({levels} - cell_level)) + dj AS fj
+    ) AS f
+    ORDER BY fj, fi
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION quadtree_cells(bbox geometry)
+RETURNS TABLE(geom geometry, i integer, j integer) AS $$
+    SELECT f.geom, f.i, f.j
+    FROM {TABLE_NAMES['GRID_QUADTREE']} q
+    CROSS JOIN LATERAL quadtree_expand(q.level, q.i, q.j) AS f
+    WHERE q.geom && bbox
+      AND f.geom && bbox
+    ORDER BY f.j, f.i
+$$ LANGUAGE sql STABLE PARALLEL SAFE;
+"""
+
+
+def sql_grid(params):
+    if params.get('GRID_MODE', 'uniform') == 'quadtree':
+        return sql_grid_quadtree(params)
+    return sql_grid_uniform(params)
+
+
+def create_grid(engine, conn, params):
+    cursor = conn.cursor()
+    sql_trace.execute(cursor, SQL_DROP_GRID)
+    execute_statements(cursor, sql_grid(params))
+
+
+def sql_lattice_source(params):
+    # Комірки (i, j) і кути решітки (vertex_i, vertex_j) для етапу вершин. У режимі quadtree - з листів
+    # без розгортання сітки: лист рівня level - квадрат 2^(levels - level) дрібних комірок, його кути
+    # й вершини (для внутрішніх листів - уся решітка листа) рахуються generate_series по зсувах.
+    if params.get('GRID_MODE', 'uniform') != 'quadtree':
+        cells = f"SELECT i, j FROM {TABLE_NAMES['GRID']}"
+        corners = f"""SELECT DISTINCT
+        ug.i + c.di AS vertex_i,
+        ug.j + c.dj AS vertex_j
     FROM {TABLE_NAMES['GRID']} ug
+    CROSS JOIN (VALUES (0, 0), (1, 0), (0, 1), (1, 1)) AS c(di, dj)"""
+        return cells, corners
+
+    levels = params['QUADTREE_LEVELS']
+    leaves = f"""FROM {TABLE_NAMES['GRID_QUADTREE']} q
+    CROSS JOIN LATERAL (SELECT {levels} - q.level AS shift) AS s"""
+    cells = f"""SELECT (q.i << s.shift) + di AS i, (q.j << s.shift) + dj AS j
+    {leaves}
+    CROSS JOIN LATERAL generate_series(0, (1 << s.shift) - 1) AS di
+    CROSS JOIN LATERAL generate_series(0, (1 << s.shift) - 1) AS dj"""
+    corners = f"""SELECT DISTINCT
+        (q.i << s.shift) + di AS vertex_i,
+        (q.j << s.shift) + dj AS vertex_j
+    {leaves}
+    CROSS JOIN LATERAL generate_series(0, 1 << s.shift) AS di
+    CROSS JOIN LATERAL generate_series(0, 1 << s.shift) AS dj"""
+    return cells, corners
+
+
+def sql_vertices(params):
+    grid_size = params['SQUARE_SIZE_M']
+    cells, corners = sql_lattice_source(params)
+    return f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['VERTICES']} CASCADE;
+DROP TABLE IF EXISTS {TABLE_NAMES['VERTEX_CELLS']} CASCADE;
+
+CREATE TABLE {TABLE_NAMES['VERTICES']} AS
+WITH LatticeCorners AS (
+    {corners}
+),
+CornerPoints AS (
+    SELECT
+        lc.vertex_i,
+        lc.vertex_j,
+        ST_SetSRID(ST_MakePoint(lc.vertex_i * {grid_size}, lc.vertex_j * {grid_size}), 3857) AS vertex_point_3857
+    FROM LatticeCorners lc
 )
 SELECT
-    dp.grid_cell_name, 
-    dp.vertex_point_3857,
-    ST_Transform(dp.vertex_point_3857, 4326) AS vertex_point 
-FROM DumpedPoints dp;
+    cp.vertex_i,
+    cp.vertex_j,
+    cp.vertex_point_3857,
+    ST_Transform(cp.vertex_point_3857, 4326) AS vertex_point
+FROM CornerPoints cp
+ORDER BY cp.vertex_j, cp.vertex_i;
 
 ALTER TABLE {TABLE_NAMES['VERTICES']}
 ADD COLUMN id SERIAL PRIMARY KEY;
 
--- Indexing
-CREATE INDEX idx_clean_border_geom ON {TABLE_NAMES['CLEAN_BORDER']} USING GIST (geom);
-CREATE INDEX idx_ukraine_grid_geom ON {TABLE_NAMES['GRID']} USING GIST (geom);
+CREATE UNIQUE INDEX idx_vertices_lattice ON {TABLE_NAMES['VERTICES']} USING BTREE (vertex_i, vertex_j);
+
+CREATE TABLE {TABLE_NAMES['VERTEX_CELLS']} AS
+SELECT
+    v.id AS vertex_id,
+    ug.i AS cell_i,
+    ug.j AS cell_j,
+    (ug.i || '_' || ug.j) AS grid_cell_name
+FROM ({cells}) ug
+CROSS JOIN (VALUES (0, 0), (1, 0), (0, 1), (1, 1)) AS c(di, dj)
+JOIN {TABLE_NAMES['VERTICES']} v
+ON v.vertex_i = ug.i + c.di AND v.vertex_j = ug.j + c.dj;
+
 CREATE INDEX idx_vertices_geom ON {TABLE_NAMES['VERTICES']} USING GIST (vertex_point);
+CREATE INDEX idx_vertex_cells_vertex_id ON {TABLE_NAMES['VERTEX_CELLS']} USING BTREE (vertex_id);
+"""
+
 
+# III. SECTOR CREATION
+def sql_sectors(params):
+    arc_points = params['SECTOR_ARC_POINTS']
+    sector_width = params['SECTOR_WIDTH_DEG']
+    return f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['SECTORS']} CASCADE;
 
--- III. SECTOR CREATION
 CREATE TABLE {TABLE_NAMES['SECTORS']} AS
 WITH SectorData AS (
     SELECT
         id AS vertex_id,
-        vertex_point AS center_point_4326, 
+        vertex_point AS center_point_4326,
+        vertex_point::geography AS center_geog,
         azimuth
     FROM {TABLE_NAMES['VERTICES']},
-    unnest(ARRAY[0, 120, 240]) AS azimuth
+    unnest(ARRAY[{sql_azimuths(params)}]) AS azimuth
+),
+RingPoints AS (
+    SELECT
+        sd.vertex_id,
+        sd.azimuth,
+        k,
+        CASE WHEN k BETWEEN 0 AND {arc_points} THEN
+            ST_Project(
+                sd.center_geog,
+                {params['SECTOR_RADIUS_M']},
+                radians(sd.azimuth - {sector_width} / 2.0 + {sector_width} * k / {arc_points}.0)
+            )::geometry
+        ELSE sd.center_point_4326 END AS ring_point
+    FROM SectorData sd
+    CROSS JOIN generate_series(-1, {arc_points} + 1) AS k
 )
 SELECT
-    sd.vertex_id,
-    sd.azimuth,
-    ST_Sector_Fixed(
-        sd.center_point_4326, 
-        {SECTOR_RADIUS}, 
-        sd.azimuth,        
-        60                  
-    ) AS sector_geom
-FROM SectorData sd;
+    rp.vertex_id,
+    rp.azimuth,
+    ST_SetSRID(ST_MakePolygon(ST_MakeLine(rp.ring_point ORDER BY rp.k)), 4326) AS sector_geom
+FROM RingPoints rp
+GROUP BY rp.vertex_id, rp.azimuth;
+"""
+
 
+SQL_SECTORS_INDEX = f"""
 CREATE INDEX idx_all_sectors_geom ON {TABLE_NAMES['SECTORS']} USING GIST (sector_geom);
+CREATE INDEX idx_all_sectors_vertex_id ON {TABLE_NAMES['SECTORS']} USING BTREE (vertex_id);
+"""
+
+
+def sql_sector_stage(params):
+    return sql_sector_function(params) + sql_sectors(params) + SQL_SECTORS_INDEX
+
+
+# --- SQL БЛОК C: АНАЛІЗ ПЕРЕТИНІВ (ПОСЛІДОВНО АБО ПО ТАЙЛАХ) ---
+
+# IV. FULL INTERSECTION ANALYSIS
+def sql_intersections(params):
+    return f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['INTERSECTIONS']} CASCADE;
+DROP TABLE IF EXISTS sector_intersections_half CASCADE;
 
--- IV. FULL INTERSECTION ANALYSIS
-CREATE TABLE sector_intersections_full AS
+CREATE TABLE {TABLE_NAMES['INTERSECTIONS']} AS
 SELECT
-    s.vertex_id AS sector_source_vertex_id, 
-    s.azimuth,                               
-    v.id AS intersecting_vertex_id         
-FROM {TABLE_NAMES['SECTORS']} s 
-JOIN {TABLE_NAMES['VERTICES']} v 
+    s.vertex_id AS sector_source_vertex_id,
+    s.azimuth,
+    v.id AS intersecting_vertex_id
+FROM {TABLE_NAMES['SECTORS']} s
+JOIN {TABLE_NAMES['VERTICES']} v
 ON ST_Intersects(s.sector_geom, v.vertex_point);
+"""
+
+
+SQL_INTERSECTIONS_INDEX = f"""
+CREATE INDEX idx_intersections_full_source_id ON {TABLE_NAMES['INTERSECTIONS']} USING BTREE (sector_source_vertex_id);
+"""
+
+SQL_INTERSECTIONS_TABLE = f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['INTERSECTIONS']} CASCADE;
+DROP TABLE IF EXISTS sector_intersections_half CASCADE;
+
+CREATE TABLE {TABLE_NAMES['INTERSECTIONS']} (
+    sector_source_vertex_id INTEGER,
+    azimuth INTEGER,
+    intersecting_vertex_id INTEGER
+);
+"""
+
+SQL_TILES = f"""
+SELECT DISTINCT
+    floor(vertex_i / {TILE_SIZE}.0)::int AS tile_i,
+    floor(vertex_j / {TILE_SIZE}.0)::int AS tile_j
+FROM {TABLE_NAMES['VERTICES']}
+ORDER BY tile_j, tile_i;
+"""
+
+SQL_HALO_SCALE = f"""
+SELECT 1.0 / cos(radians(max(abs(ST_Y(vertex_point))))) FROM {TABLE_NAMES['VERTICES']};
+"""
+
+# Джерела секторів розбиті на тайли без перекриття, тому кожен рядок результату вставляється рівно
+# одним тайлом. Ореол (halo) лише звужує пошук цільових вершин до околу тайлу.
+SQL_TILE_INTERSECTIONS = f"""
+INSERT INTO {TABLE_NAMES['INTERSECTIONS']} (sector_source_vertex_id, azimuth, intersecting_vertex_id)
+SELECT
+    s.vertex_id,
+    s.azimuth,
+    v.id
+FROM {TABLE_NAMES['VERTICES']} src
+JOIN {TABLE_NAMES['SECTORS']} s ON s.vertex_id = src.id
+JOIN {TABLE_NAMES['VERTICES']} v ON ST_Intersects(s.sector_geom, v.vertex_point)
+WHERE src.vertex_i BETWEEN %(i_min)s AND %(i_max)s
+  AND src.vertex_j BETWEEN %(j_min)s AND %(j_max)s
+  AND v.vertex_i BETWEEN %(i_min)s - %(halo)s AND %(i_max)s + %(halo)s
+  AND v.vertex_j BETWEEN %(j_min)s - %(halo)s AND %(j_max)s + %(halo)s
+"""
+
+
+# --- EXECUTION HELPERS ---
+
+def execute_statements(cursor, sql, params=None):
+    statements = [stmt.strip() for stmt in sql.split(';') if stmt.strip()]
+    for i, stmt in enumerate(statements):
+        stmt_start = time.time()
+        rows = sql_trace.execute(cursor, stmt, params)
+        print(f"   Executed query {i+1}/{len(statements)}: {sql_trace.statement_label(stmt)} "
+              f"({rows} rows, {time.time() - stmt_start:.2f} s)")
+
+
+def run_sql_stage(sql_builder, engine, conn, params):
+    execute_statements(conn.cursor(), sql_builder(params))
+
+
+def create_border(engine, conn, params):
+    border_params = {key: params[key] for key in BORDER_PARAMS}
+    dataset_hash = file_hash(FILE_PATH)
+    key = hashlib.sha256(
+        json.dumps([dataset_hash, border_params, sql_border(params)], sort_keys=True).encode()
+    ).hexdigest()
+
+    cursor = conn.cursor()
+    cursor.execute(SQL_BORDER_ARTIFACTS)
+    cursor.execute(f"SELECT created_at FROM {TABLE_NAMES['BORDER_ARTIFACTS']} WHERE artifact_key = %s", (key,))
+    artifact = cursor.fetchone()
+    if artifact is not None:
+        print(f"   Border artifact {key[:12]} (created {artifact[0]:%Y-%m-%d %H:%M}) restored.")
+        execute_statements(cursor, SQL_RESTORE_BORDER_ARTIFACT, {'key': key})
+        return
+
+    execute_statements(cursor, sql_border(params))
+    sql_trace.execute(cursor, SQL_SAVE_BORDER_ARTIFACT, {
+        'key': key, 'dataset_hash': dataset_hash, 'params': json.dumps(border_params)
+    })
+    print(f"   Border artifact {key[:12]} saved.")
+
+
+def import_border(engine, conn, params):
+    print(f"   Importing GeoJSON ({os.path.basename(FILE_PATH)}) to PostGIS via COPY...")
+    count = import_geojson_copy(conn, FILE_PATH, TABLE_NAMES['BORDER'])
+    print(f"   Import successful: {count} features.")
+
+
+def create_sectors(engine, conn, params):
+    # SECTOR_BUILDER 'python': кільця в NumPy і binary COPY (sector_copy.py), 'sql': ST_Project у БД
+    # (лише геодезичні сектори).
+    builder = params['SECTOR_BUILDER']
+    if builder == 'sql' and params['SECTOR_GEODESIC_MODE'] != 'geodesic':
+        raise ValueError(
+            f"SECTOR_GEODESIC_MODE '{params['SECTOR_GEODESIC_MODE']}' requires SECTOR_BUILDER 'python'"
+        )
+    cursor = conn.cursor()
+    sql_trace.execute(cursor, sql_sector_function(params))
+    if builder == 'python':
+        upload_start = time.time()
+        count, max_error = upload_sectors(conn, params)
+        print(f"   Sectors built in Python ({params['SECTOR_GEODESIC_MODE']}) and copied: {count} rows, "
+              f"{time.time() - upload_start:.2f} s")
+        if max_error is not None:
+            print(f"   Planar mode max arc point error vs geodesic: {max_error:.3f} m")
+        execute_statements(cursor, SQL_SECTORS_INDEX)
+    else:
+        execute_statements(cursor, sql_sectors(params) + SQL_SECTORS_INDEX)
+
+
+# --- TILED PARALLEL INTERSECTIONS ---
+
+def run_tile(engine, tile_sql, tile, halo, index, total):
+    tile_i, tile_j = tile
+    params = {
+        'i_min': tile_i * TILE_SIZE,
+        'i_max': (tile_i + 1) * TILE_SIZE - 1,
+        'j_min': tile_j * TILE_SIZE,
+        'j_max': (tile_j + 1) * TILE_SIZE - 1,
+        'halo': halo
+    }
+    tile_start = time.time()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        rows = sql_trace.execute(cursor, tile_sql, params)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"   Tile {index}/{total} ({tile_i}, {tile_j}): {rows} rows in {time.time() - tile_start:.2f} s")
+    return rows
+
+
+def run_tiled(engine, params, table_sql, tile_sql, title, workers=INTERSECTION_WORKERS):
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        execute_statements(cursor, table_sql)
+        cursor.execute(SQL_TILES)
+        tiles = cursor.fetchall()
+        cursor.execute(SQL_HALO_SCALE)
+        halo_scale = float(cursor.fetchone()[0])
+        conn.commit()
+    finally:
+        conn.close()
 
-CREATE INDEX idx_intersections_full_source_id ON sector_intersections_full USING BTREE (sector_source_vertex_id);
+    halo = math.ceil(params['SECTOR_RADIUS_M'] * halo_scale / params['SQUARE_SIZE_M']) + 1
+    print(f"   {title}: {len(tiles)} tiles of {TILE_SIZE}x{TILE_SIZE} cells, "
+          f"halo {halo} cells, {workers} workers")
+    total_rows = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(run_tile, engine, tile_sql, tile, halo, index + 1, len(tiles))
+            for index, tile in enumerate(tiles)
+        ]
+        for future in as_completed(futures):
+            total_rows += future.result()
+    print(f"   {title} merged: {total_rows} rows")
+
+
+def create_intersections(engine, conn, params, workers=INTERSECTION_WORKERS):
+    if workers > 1:
+        run_tiled(engine, params, SQL_INTERSECTIONS_TABLE, SQL_TILE_INTERSECTIONS, 'Intersections', workers)
+        execute_statements(conn.cursor(), SQL_INTERSECTIONS_INDEX)
+    else:
+        execute_statements(conn.cursor(), sql_intersections(params) + SQL_INTERSECTIONS_INDEX)
+
+
+def sql_sector_targets(params):
+    return f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['SECTOR_TARGETS']} CASCADE;
+
+CREATE TABLE {TABLE_NAMES['SECTOR_TARGETS']} AS
+SELECT
+    sector_source_vertex_id AS vertex_id,
+    azimuth,
+    array_agg(intersecting_vertex_id ORDER BY intersecting_vertex_id) AS targets
+FROM {TABLE_NAMES['INTERSECTIONS']}
+GROUP BY sector_source_vertex_id, azimuth;
+
+ALTER TABLE {TABLE_NAMES['SECTOR_TARGETS']} ADD PRIMARY KEY (vertex_id, azimuth);
+CREATE INDEX idx_sector_targets_targets ON {TABLE_NAMES['SECTOR_TARGETS']} USING GIN (targets);
+"""
+
+
+# V. PER-VERTEX COVERAGE COUNTS
+# З'єднання секторів і вершин виконується один раз. MATERIALIZE_INTERSECTIONS=True: покриття - групування
+# вже збереженої таблиці трійок sector_intersections_full. False: трійки й sector_targets не будуються,
+# покриття агрегується прямо з з'єднання (HashAggregate); тайли ділять цільові вершини без перекриття,
+# тож кожна група (vertex_id, azimuth) обчислюється рівно одним тайлом.
+def sql_vertex_coverage_from_intersections(params):
+    return f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['VERTEX_COVERAGE']} CASCADE;
+
+CREATE TABLE {TABLE_NAMES['VERTEX_COVERAGE']} AS
+SELECT
+    intersecting_vertex_id AS vertex_id,
+    azimuth::smallint AS azimuth,
+    count(*)::int AS sectors
+FROM {TABLE_NAMES['INTERSECTIONS']}
+GROUP BY intersecting_vertex_id, azimuth;
+
+ALTER TABLE {TABLE_NAMES['VERTEX_COVERAGE']} ADD PRIMARY KEY (vertex_id, azimuth);
+"""
+
+
+def sql_vertex_coverage(params):
+    return f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['VERTEX_COVERAGE']} CASCADE;
+
+CREATE TABLE {TABLE_NAMES['VERTEX_COVERAGE']} AS
+SELECT
+    v.id AS vertex_id,
+    s.azimuth::smallint AS azimuth,
+    count(*)::int AS sectors
+FROM {TABLE_NAMES['VERTICES']} v
+JOIN {TABLE_NAMES['SECTORS']} s ON ST_Intersects(s.sector_geom, v.vertex_point)
+GROUP BY v.id, s.azimuth;
+"""
+
+
+SQL_VERTEX_COVERAGE_TABLE = f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['VERTEX_COVERAGE']} CASCADE;
+
+CREATE TABLE {TABLE_NAMES['VERTEX_COVERAGE']} (
+    vertex_id INTEGER,
+    azimuth SMALLINT,
+    sectors INTEGER
+);
+"""
+
+SQL_TILE_VERTEX_COVERAGE = f"""
+INSERT INTO {TABLE_NAMES['VERTEX_COVERAGE']} (vertex_id, azimuth, sectors)
+SELECT
+    v.id,
+    s.azimuth,
+    count(*)
+FROM {TABLE_NAMES['VERTICES']} v
+JOIN {TABLE_NAMES['SECTORS']} s ON ST_Intersects(s.sector_geom, v.vertex_point)
+WHERE v.vertex_i BETWEEN %(i_min)s AND %(i_max)s
+  AND v.vertex_j BETWEEN %(j_min)s AND %(j_max)s
+GROUP BY v.id, s.azimuth
+"""
+
+SQL_VERTEX_COVERAGE_INDEX = f"""
+ALTER TABLE {TABLE_NAMES['VERTEX_COVERAGE']} ADD PRIMARY KEY (vertex_id, azimuth);
+"""
+
+
+def create_vertex_coverage(engine, conn, params, workers=INTERSECTION_WORKERS):
+    if workers > 1:
+        run_tiled(engine, params, SQL_VERTEX_COVERAGE_TABLE, SQL_TILE_VERTEX_COVERAGE, 'Vertex coverage', workers)
+        execute_statements(conn.cursor(), SQL_VERTEX_COVERAGE_INDEX)
+    else:
+        execute_statements(conn.cursor(), sql_vertex_coverage(params) + SQL_VERTEX_COVERAGE_INDEX)
+
+
+# VI. ON-DEMAND COVERAGE FUNCTIONS
+# Ті самі відповіді, що й sector_targets, без матеріалізації all_sectors: сектор будується
+# ST_Sector_Fixed, а кандидати обмежуються індексами grid_vertices (GIST по точці або решітка).
+def sql_coverage_functions(params):
+    radius = params['SECTOR_RADIUS_M']
+    width = params['SECTOR_WIDTH_DEG']
+    return f"""
+CREATE OR REPLACE FUNCTION sector_coverage(source_id INTEGER, sector_azimuth NUMERIC)
+RETURNS TABLE(vertex_id INTEGER) AS $$
+    SELECT v.id
+    FROM {TABLE_NAMES['VERTICES']} src
+    CROSS JOIN LATERAL (
+        SELECT ST_Sector_Fixed(src.vertex_point, {radius}, sector_azimuth, {width}) AS sector_geom
+    ) s
+    JOIN {TABLE_NAMES['VERTICES']} v ON ST_Intersects(s.sector_geom, v.vertex_point)
+    WHERE src.id = source_id
+    ORDER BY v.id
+$$ LANGUAGE sql STABLE PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION covering_sectors(target_id INTEGER)
+RETURNS TABLE(vertex_id INTEGER, azimuth INTEGER) AS $$
+    SELECT src.id, a.azimuth
+    FROM {TABLE_NAMES['VERTICES']} tgt
+    CROSS JOIN LATERAL (
+        SELECT ceil({radius} * 1.05 / cos(radians(abs(ST_Y(tgt.vertex_point)))) / {params['SQUARE_SIZE_M']})::int + 1 AS reach
+    ) h
+    JOIN {TABLE_NAMES['VERTICES']} src
+    ON src.vertex_i BETWEEN tgt.vertex_i - h.reach AND tgt.vertex_i + h.reach
+   AND src.vertex_j BETWEEN tgt.vertex_j - h.reach AND tgt.vertex_j + h.reach
+    CROSS JOIN unnest(ARRAY[{sql_azimuths(params)}]) AS a(azimuth)
+    WHERE tgt.id = target_id
+      AND ST_Intersects(ST_Sector_Fixed(src.vertex_point, {radius}, a.azimuth, {width}), tgt.vertex_point)
+    ORDER BY src.id, a.azimuth
+$$ LANGUAGE sql STABLE PARALLEL SAFE;
 """
 
+
+def create_coverage_functions(engine, conn, params):
+    # Тіла функцій містять ';', тому кожен блок виконується цілим.
+    cursor = conn.cursor()
+    sql_trace.execute(cursor, sql_sector_function(params))
+    sql_trace.execute(cursor, sql_coverage_functions(params))
+
+
+# --- ЕТАПИ ПАЙПЛАЙНА ---
+
+def build_stages(workers=INTERSECTION_WORKERS, params=GEOM_PARAMS, materialize=MATERIALIZE_INTERSECTIONS):
+    # materialize=False - лише покриття вершин: етапи intersections і sector_targets пропускаються.
+    quadtree = params.get('GRID_MODE', 'uniform') == 'quadtree'
+    intersection_stages = [
+        {
+            'name': 'intersections',
+            'upstream': ['sectors', 'vertices'],
+            'outputs': [TABLE_NAMES['INTERSECTIONS']],
+            'sql': sql_intersections,
+            'run': partial(create_intersections, workers=workers)
+        },
+        {
+            'name': 'sector_targets',
+            'upstream': ['intersections'],
+            'outputs': [TABLE_NAMES['SECTOR_TARGETS']],
+            'sql': sql_sector_targets,
+            'run': partial(run_sql_stage, sql_sector_targets)
+        },
+        {
+            'name': 'vertex_coverage',
+            'upstream': ['intersections'],
+            'outputs': [TABLE_NAMES['VERTEX_COVERAGE']],
+            'sql': sql_vertex_coverage_from_intersections,
+            'run': partial(run_sql_stage, sql_vertex_coverage_from_intersections)
+        }
+    ]
+    coverage_stages = [
+        {
+            'name': 'vertex_coverage',
+            'upstream': ['sectors', 'vertices'],
+            'outputs': [TABLE_NAMES['VERTEX_COVERAGE']],
+            'sql': sql_vertex_coverage,
+            'run': partial(create_vertex_coverage, workers=workers)
+        }
+    ]
+    return [
+        {
+            'name': 'import',
+            'files': [FILE_PATH],
+            'outputs': [TABLE_NAMES['BORDER']],
+            'run': import_border
+        },
+        {
+            'name': 'border',
+            'upstream': ['import'],
+            'params': BORDER_PARAMS,
+            'outputs': [TABLE_NAMES['RAW_UNION_SAFE'], TABLE_NAMES['CENTER'], TABLE_NAMES['CLEAN_BORDER']],
+            'sql': sql_border,
+            'run': create_border
+        },
+        {
+            'name': 'border_lod',
+            'upstream': ['border'],
+            'params': ['BORDER_LOD_TOLERANCES_DEG'],
+            'outputs': [TABLE_NAMES['BORDER_LOD']],
+            'sql': sql_border_lod,
+            'run': partial(run_sql_stage, sql_border_lod)
+        },
+        {
+            'name': 'grid',
+            'upstream': ['border'],
+            'params': ['SQUARE_SIZE_M', 'GRID_MODE', 'GRID_CLIP', 'QUADTREE_LEVELS'],
+            'outputs': (
+                [TABLE_NAMES['GRID_QUADTREE'], 'quadtree_cells(geometry)'] if quadtree else [TABLE_NAMES['GRID']]
+            ),
+            'sql': sql_grid,
+            'run': create_grid
+        },
+        {
+            'name': 'vertices',
+            'upstream': ['grid'],
+            'params': ['SQUARE_SIZE_M', 'GRID_MODE', 'QUADTREE_LEVELS'],
+            'outputs': [TABLE_NAMES['VERTICES'], TABLE_NAMES['VERTEX_CELLS']],
+            'sql': sql_vertices,
+            'run': partial(run_sql_stage, sql_vertices)
+        },
+        {
+            'name': 'coverage_functions',
+            'upstream': ['vertices'],
+            'params': ['SQUARE_SIZE_M', 'SECTOR_RADIUS_M', 'SECTOR_AZIMUTHS', 'SECTOR_WIDTH_DEG', 'SECTOR_ARC_POINTS'],
+            'outputs': ['sector_coverage(integer,numeric)', 'covering_sectors(integer)'],
+            'sql': sql_coverage_functions,
+            'run': create_coverage_functions
+        },
+        {
+            'name': 'sectors',
+            'upstream': ['vertices'],
+            'params': [
+                'SECTOR_RADIUS_M', 'SECTOR_AZIMUTHS', 'SECTOR_WIDTH_DEG', 'SECTOR_ARC_POINTS', 'SECTOR_GEODESIC_MODE',
+                'SECTOR_BUILDER'
+            ],
+            'outputs': [TABLE_NAMES['SECTORS']],
+            'sql': sql_sector_stage,
+            'run': create_sectors
+        }
+    ] + (intersection_stages if materialize else coverage_stages)
+
+
 # --- EXECUTION FUNCTION ---
 
-def run_analysis_pipeline():
-    
+def create_db_engine(pool_size=5):
+    engine_string = (
+        f"postgresql://{DB_CONFIG['USER']}:{DB_CONFIG['PASSWORD']}@"
+        f"{DB_CONFIG['HOST']}:{DB_CONFIG['PORT']}/{DB_CONFIG['NAME']}"
+    )
+    return create_engine(engine_string, pool_size=pool_size)
+
+
+def run_analysis_pipeline(workers=INTERSECTION_WORKERS, force=False, params=GEOM_PARAMS, report=None,
+                          trace=False, explain=False):
+    # trace=True пише JSON-трасу запитів (sql_trace.py), explain=True додає плани EXPLAIN ANALYZE.
+
     if not FILE_PATH.exists():
         print(f"Error: GeoJSON file {os.path.basename(FILE_PATH)} not found in 'data/' directory.")
         return
 
     try:
-        engine_string = (
-            f"postgresql://{DB_CONFIG['USER']}:{DB_CONFIG['PASSWORD']}@"
-            f"{DB_CONFIG['HOST']}:{DB_CONFIG['PORT']}/{DB_CONFIG['NAME']}"
-        )
-        engine = create_engine(engine_string)
+        engine = create_db_engine(pool_size=max(workers, 1))
     except Exception as e:
         print(f"Critical Error: Could not establish DB connection. Check config.py. Error: {e}")
         return
 
-    # 1. Import GeoJSON 
-    try:
-        print(f"1. Importing GeoJSON ({os.path.basename(FILE_PATH)}) to PostGIS...")
-        gdf = gpd.read_file(FILE_PATH)
-        gdf.to_postgis(TABLE_NAMES['BORDER'], engine, if_exists='replace', index=False)
-        print("   Import successful.")
-    except Exception as e:
-        print(f"Critical Error: Failed to import GeoJSON. Error: {e}")
-        return
-
-    # 2. Execute all SQL commands
-    print("\n2. Starting full SQL analysis pipeline (This step takes time)...")
+    print("Starting staged SQL analysis pipeline (up-to-date stages are skipped)...")
     start_time = time.time()
-    
-    conn = engine.raw_connection()
-    try:
-        cursor = conn.cursor()
-        
-        # --- A. ВИКОНАННЯ ФУНКЦІЇ PL/pgSQL (один блок) ---
-        print("   Executing PL/pgSQL function...")
-        cursor.execute(SQL_FUNCTION)
-        conn.commit()
-        
-        # --- B. ВИКОНАННЯ ОСНОВНИХ ЗАПИТІВ ---
-        statements = [stmt.strip() for stmt in SQL_COMMANDS.split(';') if stmt.strip()]
-        
-        for i, stmt in enumerate(statements):
-            cursor.execute(stmt)
-            if not stmt.startswith("CREATE OR REPLACE FUNCTION"):
-                 print(f"   Executed query {i+1}/{len(statements)}")
-            
-        conn.commit()
-        
-        end_time = time.time()
-        print(f"\nAnalysis completed successfully in {end_time - start_time:.2f} seconds.")
 
-    except ProgrammingError as e:
-        print(f"\nCritical SQL Error. Analysis stopped. Error: {e}")
-        conn.rollback()
+    stages = build_stages(workers, params)
+    params = dict(params, SECTOR_BUILDER=SECTOR_BUILDER)
+    if trace or explain:
+        statement_trace = sql_trace.start_trace(explain)
+        stages = [dict(stage, run=statement_trace.wrap(stage['name'], stage['run'])) for stage in stages]
+        stats_conn = engine.raw_connection()
+        stats_before = statement_trace.snapshot(stats_conn)
+
+    try:
+        completed = run_stages(engine, stages, params, force=force, report=report)
     finally:
-        conn.close()
+        if trace or explain:
+            sql_trace.stop_trace()
+            statement_trace.finish(stats_before, statement_trace.snapshot(stats_conn))
+            stats_conn.close()
+            trace_file = statement_trace.write()
+            print("\n" + "\n".join(statement_trace.summary_lines()))
+            print(f"SQL trace saved: {os.path.abspath(trace_file)}")
+
+    end_time = time.time()
+    if completed:
+        print(f"\nAnalysis completed successfully in {end_time - start_time:.2f} seconds.")
+    else:
+        print(f"\nAnalysis stopped after {end_time - start_time:.2f} seconds. Rerun to resume.")
+    return completed
 
 
 if __name__ == "__main__":
-    run_analysis_pipeline()
\ No newline at end of file
+    run_analysis_pipeline(trace='--trace' in sys.argv, explain='--explain' in sys.argv)
@@ -0,0 +1,107 @@
+from pathlib import Path
+import numpy as np
+import sys
+
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(CURRENT_DIR))
+
+from config import TABLE_NAMES
+from streaming_import import COPY_SIGNATURE, COPY_TRAILER, CopyStream
+import lattice
+import sql_trace
+
+# --- ПОБУДОВА СЕКТОРІВ У PYTHON ТА ЗАВАНТАЖЕННЯ ЧЕРЕЗ BINARY COPY ---
+#
+# Центри читаються з grid_vertices (ті самі vertex_point, що й у SQL-варіанті, тож власна вершина
+# сектора лежить точно на його межі). Кільця - lattice.sector_rings (одна пряма геодезична задача
+# на рядок решітки). Усі кільця мають однакову кількість точок, тому EWKB полігона і весь рядок COPY
+# мають сталу довжину: вони збираються структурованими масивами NumPy порціями, без об'єктів
+# Shapely (байти ті самі, що дає shapely.to_wkb(..., include_srid=True)).
+
+COPY_BATCH = 100_000
+COPY_BLOCK = 1 << 16
+SRID = 4326
+
+SQL_SECTOR_SOURCES = f"SELECT id, ST_X(vertex_point), ST_Y(vertex_point) FROM {TABLE_NAMES['VERTICES']} ORDER BY id"
+
+SQL_SECTORS_COPY_TABLE = f"""
+DROP TABLE IF EXISTS {TABLE_NAMES['SECTORS']} CASCADE;
+
+CREATE TABLE {TABLE_NAMES['SECTORS']} (
+    vertex_id INTEGER,
+    azimuth INTEGER,
+    sector_geom GEOMETRY(Polygon, {SRID})
+);
+"""
+
+EWKB_POLYGON_SRID = 0x20000003
+
+
+def copy_row_dtype(n_points):
+    # Рядок COPY: кількість полів, два int4 і EWKB полігона (little-endian) з одним кільцем.
+    return np.dtype([
+        ('fields', '>i2'),
+        ('vertex_id_len', '>i4'), ('vertex_id', '>i4'),
+        ('azimuth_len', '>i4'), ('azimuth', '>i4'),
+        ('geom_len', '>i4'),
+        ('byte_order', 'u1'), ('geom_type', '<u4'), ('srid', '<u4'), ('rings', '<u4'), ('points', '<u4'),
+        ('coords', '<f8', (n_points, 2))
+    ])
+
+
+def sector_copy_rows(vertex_id, azimuths, rings, batch=COPY_BATCH):
+    # Бінарний потік COPY (vertex_id, azimuth, sector_geom) порціями по batch секторів.
+    n_az = len(azimuths)
+    row_dtype = copy_row_dtype(rings.shape[1])
+    geom_len = row_dtype.itemsize - row_dtype.fields['byte_order'][1]
+    yield COPY_SIGNATURE
+    for start in range(0, len(rings), batch):
+        chunk = rings[start:start + batch]
+        sector = np.arange(start, start + len(chunk))
+        rows = np.empty(len(chunk), dtype=row_dtype)
+        rows['fields'] = 3
+        rows['vertex_id_len'] = rows['azimuth_len'] = 4
+        rows['vertex_id'] = vertex_id[sector // n_az]
+        rows['azimuth'] = np.asarray(azimuths)[sector % n_az]
+        rows['geom_len'] = geom_len
+        rows['byte_order'] = 1
+        rows['geom_type'] = EWKB_POLYGON_SRID
+        rows['srid'] = SRID
+        rows['rings'] = 1
+        rows['points'] = rings.shape[1]
+        rows['coords'] = chunk
+        data = rows.tobytes()
+        # Блоками по COPY_BLOCK: CopyStream тримає в буфері лише невеликий залишок.
+        for offset in range(0, len(data), COPY_BLOCK):
+            yield data[offset:offset + COPY_BLOCK]
+    yield COPY_TRAILER
+
+
+def upload_sectors(conn, params):
+    # Повертає (кількість секторів, макс. похибка режиму 'planar' у метрах або None).
+    cursor = conn.cursor()
+    sql_trace.execute(cursor, SQL_SECTOR_SOURCES)
+    sources = np.asarray(cursor.fetchall(), dtype=float).reshape(-1, 3)
+    vertex_id = sources[:, 0].astype(np.int64)
+    lon, lat = sources[:, 1], sources[:, 2]
+
+    mode = params['SECTOR_GEODESIC_MODE']
+    azimuths = params['SECTOR_AZIMUTHS']
+    rings = lattice.sector_rings(
+        lon, lat, params['SECTOR_RADIUS_M'], azimuths, params['SECTOR_WIDTH_DEG'], params['SECTOR_ARC_POINTS'], mode
+    )
+    max_error = None
+    if mode == 'planar':
+        max_error = lattice.planar_error_m(
+            lat, params['SECTOR_RADIUS_M'], azimuths, params['SECTOR_WIDTH_DEG'], params['SECTOR_ARC_POINTS']
+        )
+
+    for stmt in SQL_SECTORS_COPY_TABLE.split(';'):
+        if stmt.strip():
+            sql_trace.execute(cursor, stmt.strip())
+    stream = CopyStream(sector_copy_rows(vertex_id, azimuths, rings))
+    cursor.copy_expert(
+        f"COPY {TABLE_NAMES['SECTORS']} (vertex_id, azimuth, sector_geom) FROM STDIN WITH (FORMAT binary)",
+        stream, size=COPY_BLOCK
+    )
+    return len(rings), max_error
@@ -0,0 +1,128 @@
+import numpy as np
+from pathlib import Path
+import sys
+
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(CURRENT_DIR))
+
+from config import TABLE_NAMES
+
+# --- КОМПАКТНЕ ЗБЕРІГАННЯ ПЕРЕТИНІВ (CSR) ---
+#
+# Сектор k = (vertex_id[k], azimuth[k]), сектори впорядковані за (vertex_id, azimuth).
+# targets[offsets[k]:offsets[k + 1]] - відсортовані id вершин, які перетинає сектор k.
+# У БД той самий зміст зберігає таблиця SECTOR_TARGETS: один рядок на сектор з масивом int[].
+# Функції пошуку приймають або словник CSR (load_csr), або з'єднання з БД.
+
+TARGETS_TABLE = TABLE_NAMES['SECTOR_TARGETS']
+INDEX_DTYPE = np.int32
+OFFSET_DTYPE = np.int64
+EXPORT_BATCH = 50_000
+
+SQL_SECTOR_TARGETS = f"SELECT targets FROM {TARGETS_TABLE} WHERE vertex_id = %s AND azimuth = %s"
+
+SQL_COVERING_SECTORS = f"""
+SELECT vertex_id, azimuth FROM {TARGETS_TABLE}
+WHERE targets @> ARRAY[%s]::int[]
+ORDER BY vertex_id, azimuth
+"""
+
+SQL_EXPORT_TARGETS = f"SELECT vertex_id, azimuth, targets FROM {TARGETS_TABLE} ORDER BY vertex_id, azimuth"
+
+
+def build_csr(sector_vertex_id, sector_azimuth, sector_idx, target_vertex_id):
+    # sector_idx - індекси в масивах sector_*, відсортовані (як повертають рушії перетинів).
+    # Якщо id вершин не зростають разом з позицією (після інкрементного оновлення кордону),
+    # сектори й цілі пересортовуються за id.
+    sector_vertex_id = np.asarray(sector_vertex_id)
+    if np.any(np.diff(sector_vertex_id) < 0):
+        order = np.argsort(sector_vertex_id, kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        sector_vertex_id, sector_azimuth = sector_vertex_id[order], np.asarray(sector_azimuth)[order]
+        sector_idx = rank[sector_idx]
+        pairs = np.lexsort((target_vertex_id, sector_idx))
+        sector_idx, target_vertex_id = sector_idx[pairs], np.asarray(target_vertex_id)[pairs]
+    counts = np.bincount(sector_idx, minlength=len(sector_vertex_id))
+    offsets = np.zeros(len(sector_vertex_id) + 1, dtype=OFFSET_DTYPE)
+    np.cumsum(counts, out=offsets[1:])
+    return {
+        'vertex_id': np.asarray(sector_vertex_id, dtype=INDEX_DTYPE),
+        'azimuth': np.asarray(sector_azimuth, dtype=INDEX_DTYPE),
+        'offsets': offsets,
+        'targets': np.asarray(target_vertex_id, dtype=INDEX_DTYPE)
+    }
+
+
+def vertex_coverage(sector_idx, vertex_idx, n_vertices, n_az):
+    # Кількість секторів кожного азимуту, що покривають вершину: матриця (вершина, азимут).
+    counts = np.bincount(vertex_idx * n_az + sector_idx % n_az, minlength=n_vertices * n_az)
+    return counts.reshape(n_vertices, n_az).astype(np.int32)
+
+
+def save_csr(path, csr):
+    np.savez(path, **csr)
+    return path
+
+
+def load_csr(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in ('vertex_id', 'azimuth', 'offsets', 'targets')}
+
+
+def export_csr(conn, path, batch=EXPORT_BATCH):
+    # Потокове читання SECTOR_TARGETS (серверний курсор) у файл CSR.
+    vertex_ids, azimuths, counts, chunks = [], [], [], []
+    cursor = conn.cursor(name='sector_targets_export')
+    cursor.itersize = batch
+    cursor.execute(SQL_EXPORT_TARGETS)
+    for vertex_id, azimuth, targets in cursor:
+        vertex_ids.append(vertex_id)
+        azimuths.append(azimuth)
+        counts.append(len(targets))
+        chunks.append(np.asarray(targets, dtype=INDEX_DTYPE))
+    cursor.close()
+    conn.commit()
+
+    offsets = np.zeros(len(counts) + 1, dtype=OFFSET_DTYPE)
+    np.cumsum(counts, out=offsets[1:])
+    csr = {
+        'vertex_id': np.asarray(vertex_ids, dtype=INDEX_DTYPE),
+        'azimuth': np.asarray(azimuths, dtype=INDEX_DTYPE),
+        'offsets': offsets,
+        'targets': np.concatenate(chunks) if chunks else np.zeros(0, dtype=INDEX_DTYPE)
+    }
+    return save_csr(path, csr)
+
+
+def sector_index(csr, vertex_id, azimuth):
+    start, end = np.searchsorted(csr['vertex_id'], [vertex_id, vertex_id + 1])
+    match = np.flatnonzero(csr['azimuth'][start:end] == azimuth)
+    return start + match[0] if len(match) else -1
+
+
+def sector_targets(source, vertex_id, azimuth):
+    # id вершин, які перетинає сектор (vertex_id, azimuth).
+    if isinstance(source, dict):
+        k = sector_index(source, vertex_id, azimuth)
+        if k < 0:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        return source['targets'][source['offsets'][k]:source['offsets'][k + 1]]
+
+    cursor = source.cursor()
+    cursor.execute(SQL_SECTOR_TARGETS, (int(vertex_id), int(azimuth)))
+    row = cursor.fetchone()
+    return np.asarray(row[0] if row else [], dtype=INDEX_DTYPE)
+
+
+def covering_sectors(source, vertex_id):
+    # Сектори (vertex_id, azimuth), що покривають вершину vertex_id.
+    if isinstance(source, dict):
+        positions = np.flatnonzero(source['targets'] == vertex_id)
+        sectors = np.searchsorted(source['offsets'], positions, side='right') - 1
+        return np.column_stack([source['vertex_id'][sectors], source['azimuth'][sectors]])
+
+    cursor = source.cursor()
+    cursor.execute(SQL_COVERING_SECTORS, (int(vertex_id),))
+    return np.asarray(cursor.fetchall(), dtype=INDEX_DTYPE).reshape(-1, 2)
+
@@ -0,0 +1,85 @@
+from pathlib import Path
+import json
+import numpy as np
+import os
+import sys
+import time
+
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(CURRENT_DIR))
+
+from config import SECTOR_SCENARIOS
+import sector_csr
+import sector_stencil
+
+# --- ОЦІНКА КІЛЬКОХ КОНФІГУРАЦІЙ СЕКТОРІВ ЗА ОДИН ПРОХІД ---
+#
+# Вершини беруться з уже побудованої решітки (output/local/grid_vertices.npz), сектори всіх
+# сценаріїв рахуються sector_stencil.stencil_scenarios зі спільним набором кандидатів-сусідів.
+# Для кожного сценарію - окремий каталог output/scenarios/<NAME> з CSR перетинів
+# (sector_targets_csr.npz), покриттям вершин (vertex_coverage.npz) і параметрами (scenario.json).
+
+LOCAL_DIR = CURRENT_DIR / "output" / "local"
+OUTPUT_DIR = CURRENT_DIR / "output" / "scenarios"
+
+
+def create_output_path(name, filename):
+    path = OUTPUT_DIR / name
+    path.mkdir(parents=True, exist_ok=True)
+    return path / filename
+
+
+def load_vertices(path=LOCAL_DIR / "grid_vertices.npz", grid_path=LOCAL_DIR / "ukraine_grid.npz"):
+    with np.load(grid_path) as grid:
+        size = float(grid['size'])
+    with np.load(path) as data:
+        return {key: data[key] for key in ('id', 'vertex_i', 'vertex_j', 'lon', 'lat')}, size
+
+
+def write_scenario(scenario, vertex_id, sector_idx, vertex_idx):
+    azimuths = np.asarray(scenario['SECTOR_AZIMUTHS'])
+    n_az = len(azimuths)
+    name = scenario['NAME']
+    sector_csr.save_csr(
+        create_output_path(name, "sector_targets_csr.npz"),
+        sector_csr.build_csr(
+            np.repeat(vertex_id, n_az), np.tile(azimuths, len(vertex_id)), sector_idx, vertex_id[vertex_idx]
+        )
+    )
+    np.savez(
+        create_output_path(name, "vertex_coverage.npz"),
+        vertex_id=vertex_id, azimuth=azimuths,
+        sectors=sector_csr.vertex_coverage(sector_idx, vertex_idx, len(vertex_id), n_az)
+    )
+    create_output_path(name, "scenario.json").write_text(json.dumps(scenario, indent=2))
+
+
+def run_scenarios(scenarios=SECTOR_SCENARIOS):
+    names = [scenario['NAME'] for scenario in scenarios]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Scenario names must be unique: {names}")
+
+    vertices, size = load_vertices()
+    print(f"Evaluating {len(scenarios)} sector scenarios on {len(vertices['id'])} vertices ({size:.0f} m grid)...")
+    start_time = time.time()
+    results = sector_stencil.stencil_scenarios(
+        vertices['vertex_i'], vertices['vertex_j'], vertices['lon'], vertices['lat'], size, scenarios
+    )
+    print(f"   Shared candidate pass and classification: {time.time() - start_time:.2f} s")
+
+    summary = {}
+    for scenario, (sector_idx, vertex_idx) in zip(scenarios, results):
+        write_scenario(scenario, vertices['id'], sector_idx, vertex_idx)
+        covered = np.count_nonzero(np.bincount(vertex_idx, minlength=len(vertices['id'])))
+        summary[scenario['NAME']] = {'intersections': len(sector_idx), 'covered_vertices': covered}
+        print(f"   {scenario['NAME']}: R={scenario['SECTOR_RADIUS_M']} m, azimuths={scenario['SECTOR_AZIMUTHS']}, "
+              f"width={scenario['SECTOR_WIDTH_DEG']}: {len(sector_idx)} intersections, {covered} vertices covered")
+
+    print(f"\nScenarios completed in {time.time() - start_time:.2f} seconds.")
+    print(f"Results saved: {os.path.abspath(OUTPUT_DIR)}")
+    return summary
+
+
+if __name__ == "__main__":
+    selected = sys.argv[1:]
+    run_scenarios([scenario for scenario in SECTOR_SCENARIOS if not selected or scenario['NAME'] in selected])
@@ -0,0 +1,181 @@
+import numpy as np
+import shapely
+
+import lattice
+
+# --- СТЕНСИЛЬНИЙ ДВИГУН ПЕРЕТИНІВ СЕКТОР-ВЕРШИНА ---
+#
+# Вершини лежать на регулярній решітці EPSG:3857: у вершин одного рядка однакова широта, а довготи
+# відрізняються лише зсувом, тож геодезичні відстань і азимут до сусіда (di, dj), як і форма сектора,
+# однакові для всіх джерел рядка. Стенсиль рахується один раз на рядок: зсуви діляться на "точно
+# всередині", "точно зовні" та "біля краю", крайові перевіряються полігоном сектора першого джерела
+# рядка (як ST_Intersects), і результат застосовується до всіх джерел рядка.
+
+STENCIL_EDGE_MARGIN_M = 25.0
+
+
+def lookup_vertices(sorted_keys, vertex_i, vertex_j):
+    # Індекси вершин (i, j) у відсортованому масиві ключів, або -1, якщо вершини немає.
+    keys = lattice.lattice_cell_keys(vertex_i, vertex_j)
+    pos = np.searchsorted(sorted_keys, keys)
+    pos_clipped = np.minimum(pos, len(sorted_keys) - 1)
+    found = sorted_keys[pos_clipped] == keys
+    return np.where(found, pos_clipped, -1)
+
+
+def stencil_offsets(size, radius, lat_ref):
+    # Усі зсуви решітки, що можуть бути в межах radius від джерела на широті lat_ref.
+    scale = 1.0 / np.cos(np.radians(lat_ref))
+    reach = int(np.ceil(radius * scale * 1.05 / size)) + 1
+    di, dj = np.meshgrid(np.arange(-reach, reach + 1), np.arange(-reach, reach + 1))
+    return di.ravel(), dj.ravel()
+
+
+def offset_geometry(size, radius, ref_i, ref_j):
+    # Зсуви решітки в межах radius від опорної вершини з геодезичними азимутом і відстанню до них.
+    di, dj = stencil_offsets(size, radius, lattice.vertex_lonlat(ref_i, ref_j, size)[1])
+    ref_lon, ref_lat = lattice.vertex_lonlat(np.array([ref_i]), np.array([ref_j]), size)
+    tgt_lon, tgt_lat = lattice.vertex_lonlat(ref_i + di, ref_j + dj, size)
+    bearing, _, dist = lattice.GEOD.inv(
+        np.full(di.size, ref_lon[0]), np.full(di.size, ref_lat[0]), tgt_lon, tgt_lat
+    )
+    return di, dj, bearing, dist
+
+
+def classify_stencil(di, dj, bearing, dist, radius, azimuths, width, num_points):
+    # Маски зсувів (всередині, біля краю) для кожного азимуту. STENCIL_EDGE_MARGIN_M покриває
+    # розбіжність між геодезичним сектором і його полігоном у lon/lat.
+    chord_radius = radius * np.cos(np.radians(width / num_points / 2))
+    tol = STENCIL_EDGE_MARGIN_M
+    half = width / 2
+
+    masks = []
+    for azimuth in azimuths:
+        delta = np.abs((bearing - azimuth + 180.0) % 360.0 - 180.0)
+        side_gap = np.radians(half - delta)
+        side_dist = np.where(np.abs(side_gap) < np.pi / 2, dist * np.sin(np.abs(side_gap)), dist)
+
+        inside = (dist + tol <= chord_radius) & (delta < half) & (side_dist >= tol)
+        outside = (dist - tol > radius) | ((delta > half) & (side_dist >= tol))
+        inside[(di == 0) & (dj == 0)] = True
+        outside[(di == 0) & (dj == 0)] = False
+        masks.append((inside, ~inside & ~outside))
+    return masks
+
+
+def row_hits(di, dj, bearing, dist, tgt_lon, tgt_lat, sectors, radius, azimuths, width, num_points):
+    # Маска попадань (азимут, зсув) для всіх джерел рядка; sectors - полігони опорного джерела.
+    hits = np.zeros((len(azimuths), di.size), dtype=bool)
+    masks = classify_stencil(di, dj, bearing, dist, radius, azimuths, width, num_points)
+    for az_index, (inside, edge) in enumerate(masks):
+        hits[az_index] = inside
+        if edge.any():
+            hits[az_index, edge] = shapely.intersects_xy(sectors[az_index], tgt_lon[edge], tgt_lat[edge])
+    return hits
+
+
+def lattice_index(vertex_i, vertex_j, pad):
+    # Щільна таблиця (j, i) -> індекс вершини (-1 - вершини немає) у межах bbox решітки з полями
+    # pad, тож зсуви до pad від будь-якої вершини не виходять за межі таблиці.
+    i0, j0 = vertex_i.min() - pad, vertex_j.min() - pad
+    index = np.full((vertex_j.max() + pad - j0 + 1, vertex_i.max() + pad - i0 + 1), -1, dtype=np.int64)
+    index[vertex_j - j0, vertex_i - i0] = np.arange(len(vertex_i))
+    return index, i0, j0
+
+
+def stencil_intersections(vertex_i, vertex_j, lon, lat, size, radius, rings=None,
+                          azimuths=lattice.SECTOR_AZIMUTHS, width=lattice.SECTOR_WIDTH_DEG,
+                          num_points=lattice.SECTOR_ARC_POINTS, source_rows=None, source_mask=None):
+    # Пари (індекс сектора, індекс вершини) у тому ж форматі, що й
+    # lattice.sector_vertex_intersections. Вершини мають бути впорядковані за (vertex_j, vertex_i).
+    scenario = {'SECTOR_RADIUS_M': radius, 'SECTOR_AZIMUTHS': azimuths, 'SECTOR_WIDTH_DEG': width}
+    return stencil_scenarios(
+        vertex_i, vertex_j, lon, lat, size, [scenario], num_points, [rings], source_rows, source_mask
+    )[0]
+
+
+def stencil_scenarios(vertex_i, vertex_j, lon, lat, size, scenarios, num_points=lattice.SECTOR_ARC_POINTS,
+                      rings=None, source_rows=None, source_mask=None):
+    # Кілька конфігурацій секторів (SECTOR_RADIUS_M, SECTOR_AZIMUTHS, SECTOR_WIDTH_DEG) за один прохід:
+    # зсуви в межах найбільшого радіуса, їх азимут і відстань, а також сусіди джерел рядка шукаються
+    # один раз на рядок; для кожного сценарію - лише класифікація зсувів рядка і вибірка пар.
+    # source_rows=(j_start, j_end) та/або source_mask (bool по вершинах) - сектори лише від цих вершин,
+    # решта вершин - тільки цілі.
+    # Повертає список пар (індекс сектора, індекс вершини) - по одній на сценарій, відсортованих
+    # за (сектор, вершина).
+    vertex_i = np.asarray(vertex_i, dtype=np.int64)
+    vertex_j = np.asarray(vertex_j, dtype=np.int64)
+    max_radius = max(scenario['SECTOR_RADIUS_M'] for scenario in scenarios)
+    reach = stencil_offsets(size, max_radius, np.abs(lat).max())[0].max()
+    index, i0, j0 = lattice_index(vertex_i, vertex_j, reach)
+    rings = rings or [None] * len(scenarios)
+
+    # Рядки з джерелами та перше джерело кожного - опорне для геометрії рядка.
+    rows = lattice.sorted_unique(vertex_j)
+    if source_rows is not None:
+        rows = rows[(rows >= source_rows[0]) & (rows < source_rows[1])]
+    row_sources = []
+    for row in rows:
+        lo, hi = np.searchsorted(vertex_j, [row, row + 1])
+        src = np.arange(lo, hi)
+        if source_mask is not None:
+            src = src[source_mask[lo:hi]]
+        if src.size:
+            row_sources.append((row, src))
+    if not row_sources:
+        empty = np.zeros(0, dtype=np.int64)
+        return [(empty, empty) for _ in scenarios]
+    refs = np.array([src[0] for _, src in row_sources], dtype=np.int64)
+
+    # Полігони секторів опорних джерел: (рядок, азимут) для кожного сценарію.
+    ref_sectors = []
+    for scenario, scenario_rings in zip(scenarios, rings):
+        n_az = len(scenario['SECTOR_AZIMUTHS'])
+        if scenario_rings is not None:
+            ref_rings = scenario_rings.reshape(-1, n_az, *scenario_rings.shape[1:])[refs]
+        else:
+            ref_rings = lattice.sector_rings(
+                lon[refs], lat[refs], scenario['SECTOR_RADIUS_M'], scenario['SECTOR_AZIMUTHS'],
+                scenario['SECTOR_WIDTH_DEG'], num_points
+            )
+        ref_sectors.append(lattice.sector_polygons(ref_rings.reshape(-1, *ref_rings.shape[-2:])).reshape(len(refs), n_az))
+
+    parts = [([], []) for _ in scenarios]
+    for row_index, (row, src) in enumerate(row_sources):
+        # Спільна геометрія рядка від опорного джерела: зсуви, азимут і відстань до них.
+        ref = refs[row_index]
+        di, dj, bearing, dist = offset_geometry(size, max_radius, vertex_i[ref], row)
+        near = dist - STENCIL_EDGE_MARGIN_M <= max_radius
+        di, dj, bearing, dist = di[near], dj[near], bearing[near], dist[near]
+        tgt_lon, tgt_lat = lattice.vertex_lonlat(vertex_i[ref] + di, row + dj, size)
+
+        row_masks = [
+            row_hits(
+                di, dj, bearing, dist, tgt_lon, tgt_lat, sectors[row_index], scenario['SECTOR_RADIUS_M'],
+                scenario['SECTOR_AZIMUTHS'], scenario['SECTOR_WIDTH_DEG'], num_points
+            )
+            for scenario, sectors in zip(scenarios, ref_sectors)
+        ]
+
+        # Сусіди всіх джерел рядка за зсувами, що влучають хоча б в один сценарій.
+        used = np.flatnonzero(np.any([hits.any(axis=0) for hits in row_masks], axis=0))
+        tgt = index[row + dj[used] - j0, vertex_i[src][:, None] + (di[used] - i0)]
+        found = tgt >= 0
+
+        # Вибірка маскою (джерело, азимут, зсув) дає вже порядок (сектор, вершина): зсуви
+        # впорядковані за (dj, di), як і вершини.
+        for hits, (sector_parts, vertex_parts) in zip(row_masks, parts):
+            hits = hits[:, used]
+            own = hits.any(axis=0)
+            n_az = hits.shape[0]
+            pair = found[:, None, own] & hits[None, :, own]
+            sectors = src[:, None] * n_az + np.arange(n_az)
+            sector_parts.append(np.broadcast_to(sectors[:, :, None], pair.shape)[pair])
+            vertex_parts.append(np.broadcast_to(tgt[:, None, own], pair.shape)[pair])
+
+    results = []
+    for sector_parts, vertex_parts in parts:
+        sector_idx = np.concatenate(sector_parts) if sector_parts else np.zeros(0, dtype=np.int64)
+        vertex_idx = np.concatenate(vertex_parts) if vertex_parts else np.zeros(0, dtype=np.int64)
+        results.append((sector_idx, vertex_idx))
+    return results
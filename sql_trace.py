@@ -0,0 +1,215 @@
+from pathlib import Path
+import json
+import re
+import threading
+import time
+
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# --- ТРАСУВАННЯ SQL-ЗАПИТІВ ПАЙПЛАЙНА ---
+#
+# Усі запити run_sql.py проходять через execute(): без активного трасування це звичайний
+# cursor.execute, з активним (ACTIVE) кожен запит записується з міткою, етапом, часом,
+# кількістю рядків і приростами pg_stat_xact_user_tables (статистика поточної транзакції).
+# З explain=True запити, що це підтримують, виконуються як EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+# і план зберігається в записі. На рівні всього запуску знімаються прирости pg_stat_user_tables
+# та pg_stat_statements (якщо розширення встановлене).
+
+OUTPUT_DIR = CURRENT_DIR / "output" / "traces"
+SLOWEST_COUNT = 10
+SQL_PREVIEW_CHARS = 300
+
+ACTIVE = None
+
+LABEL_PATTERNS = [
+    r'^(CREATE\s+OR\s+REPLACE\s+FUNCTION)\s+([\w.]+)',
+    r'^(CREATE\s+(?:UNIQUE\s+)?INDEX)\s+(\w+)',
+    r'^(CREATE\s+TABLE)\s+([\w.]+)',
+    r'^(DROP\s+\w+\s+IF\s+EXISTS)\s+([\w.]+)',
+    r'^(ALTER\s+TABLE)\s+([\w.]+)',
+    r'^(INSERT\s+INTO)\s+([\w.]+)',
+    r'^(UPDATE)\s+([\w.]+)',
+    r'^(DELETE\s+FROM)\s+([\w.]+)',
+    r'^(ANALYZE|VACUUM)\s+([\w.]+)'
+]
+
+EXPLAINABLE = re.compile(r'^(SELECT|INSERT|UPDATE|DELETE|WITH)\b|^CREATE\s+TABLE\s+[\w.]+\s+AS\b', re.IGNORECASE)
+
+SQL_XACT_TABLE_STATS = """
+SELECT relname, n_tup_ins, n_tup_upd, n_tup_del, seq_scan, COALESCE(idx_scan, 0)
+FROM pg_stat_xact_user_tables
+"""
+
+SQL_TABLE_STATS = """
+SELECT relname, n_tup_ins, n_tup_upd, n_tup_del, seq_scan, COALESCE(idx_scan, 0), n_live_tup
+FROM pg_stat_user_tables
+"""
+
+SQL_STATEMENT_STATS = """
+SELECT queryid, left(query, 300), calls, total_exec_time, rows, shared_blks_hit, shared_blks_read
+FROM pg_stat_statements
+WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+"""
+
+XACT_FIELDS = ['n_tup_ins', 'n_tup_upd', 'n_tup_del', 'seq_scan', 'idx_scan']
+TABLE_FIELDS = XACT_FIELDS + ['n_live_tup']
+STATEMENT_FIELDS = ['calls', 'total_exec_time', 'rows', 'shared_blks_hit', 'shared_blks_read']
+
+
+def statement_label(stmt):
+    text = ' '.join(stmt.split())
+    for pattern in LABEL_PATTERNS:
+        match = re.match(pattern, text, re.IGNORECASE)
+        if match:
+            return f"{' '.join(match.group(1).upper().split())} {match.group(2)}"
+    return text[:60]
+
+
+def plan_rows(plan):
+    # Рядки результату: для ModifyTable (INSERT/UPDATE/DELETE) - з дочірнього вузла.
+    node = plan[0]['Plan']
+    if node.get('Node Type') == 'ModifyTable' and node.get('Plans'):
+        node = node['Plans'][0]
+    return int(node.get('Actual Rows', 0) * node.get('Actual Loops', 1))
+
+
+def stats_delta(before, after, fields):
+    deltas = {}
+    for key, values in after.items():
+        old = before.get(key, [0] * len(fields))
+        changed = {field: new - prev for field, new, prev in zip(fields, values, old) if new != prev}
+        if changed:
+            deltas[key] = changed
+    return deltas
+
+
+def fetch_stats(cursor, sql):
+    cursor.execute(sql)
+    return {row[0]: list(row[1:]) for row in cursor.fetchall()}
+
+
+class StatementTrace:
+
+    def __init__(self, explain=False):
+        self.explain = explain
+        self.stage = None
+        self.records = []
+        self.lock = threading.Lock()
+        self.started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.run_stats = {}
+
+    def execute(self, cursor, stmt, params=None):
+        label = statement_label(stmt)
+        xact_before = fetch_stats(cursor, SQL_XACT_TABLE_STATS)
+        plan = None
+        start = time.time()
+        if self.explain and EXPLAINABLE.match(stmt.strip()):
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {stmt}", params)
+            plan = cursor.fetchone()[0]
+            rowcount = plan_rows(plan)
+        else:
+            cursor.execute(stmt, params)
+            rowcount = cursor.rowcount
+        seconds = time.time() - start
+        xact_after = fetch_stats(cursor, SQL_XACT_TABLE_STATS)
+
+        record = {
+            'stage': self.stage,
+            'label': label,
+            'seconds': seconds,
+            'rows': rowcount,
+            'params': params,
+            'sql': ' '.join(stmt.split())[:SQL_PREVIEW_CHARS],
+            'table_deltas': stats_delta(xact_before, xact_after, XACT_FIELDS)
+        }
+        if plan is not None:
+            record['plan'] = plan
+        with self.lock:
+            self.records.append(record)
+        return rowcount
+
+    def wrap(self, stage_name, run):
+        def traced_run(engine, conn, params):
+            self.stage = stage_name
+            try:
+                return run(engine, conn, params)
+            finally:
+                self.stage = None
+        return traced_run
+
+    def snapshot(self, conn):
+        cursor = conn.cursor()
+        snapshot = {'tables': fetch_stats(cursor, SQL_TABLE_STATS), 'statements': None}
+        conn.commit()
+        try:
+            cursor.execute(SQL_STATEMENT_STATS)
+            snapshot['statements'] = {row[0]: list(row[1:]) for row in cursor.fetchall()}
+            conn.commit()
+        except Exception as e:
+            # pg_stat_statements не встановлене або не в shared_preload_libraries.
+            conn.rollback()
+            snapshot['statements_error'] = str(e).strip()
+        return snapshot
+
+    def finish(self, before, after):
+        self.run_stats['table_deltas'] = stats_delta(before['tables'], after['tables'], TABLE_FIELDS)
+        if before['statements'] is None or after['statements'] is None:
+            self.run_stats['pg_stat_statements'] = before.get('statements_error') or after.get('statements_error')
+            return
+        statements = []
+        for queryid, (query, *values) in after['statements'].items():
+            old = before['statements'].get(queryid, [query] + [0] * len(STATEMENT_FIELDS))[1:]
+            delta = {field: new - prev for field, new, prev in zip(STATEMENT_FIELDS, values, old)}
+            if delta['calls']:
+                statements.append(dict(delta, queryid=queryid, query=query))
+        statements.sort(key=lambda item: item['total_exec_time'], reverse=True)
+        self.run_stats['pg_stat_statements'] = statements
+
+    def summary_lines(self, count=SLOWEST_COUNT):
+        lines = [f"Slowest statements (top {count}):"]
+        for record in sorted(self.records, key=lambda item: item['seconds'], reverse=True)[:count]:
+            lines.append(f"   {record['seconds']:>9.3f} s  {str(record['rows']):>10} rows  "
+                         f"[{record['stage']}] {record['label']}")
+
+        totals = {}
+        for record in self.records:
+            key = (record['stage'], record['label'])
+            calls, seconds = totals.get(key, (0, 0.0))
+            totals[key] = (calls + 1, seconds + record['seconds'])
+        lines.append("Total by statement label:")
+        for (stage, label), (calls, seconds) in sorted(totals.items(), key=lambda item: item[1][1], reverse=True)[:count]:
+            lines.append(f"   {seconds:>9.3f} s  {calls:>6} calls  [{stage}] {label}")
+        return lines
+
+    def write(self, path=None):
+        if path is None:
+            OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+            path = OUTPUT_DIR / f"trace_{self.started_at.replace(':', '').replace('-', '')}.json"
+        trace = {
+            'started_at': self.started_at,
+            'explain': self.explain,
+            'statements': self.records,
+            'run': self.run_stats
+        }
+        Path(path).write_text(json.dumps(trace, indent=2, default=str))
+        return path
+
+
+def execute(cursor, stmt, params=None):
+    # Повертає кількість рядків (cursor.rowcount або з плану EXPLAIN ANALYZE).
+    if ACTIVE is None:
+        cursor.execute(stmt, params)
+        return cursor.rowcount
+    return ACTIVE.execute(cursor, stmt, params)
+
+
+def start_trace(explain=False):
+    global ACTIVE
+    ACTIVE = StatementTrace(explain)
+    return ACTIVE
+
+
+def stop_trace():
+    global ACTIVE
+    trace, ACTIVE = ACTIVE, None
+    return trace
@@ -0,0 +1,152 @@
+from shapely.geometry import shape
+import shapely
+import json
+import struct
+
+# --- ПОТОКОВИЙ ІМПОРТ GEOJSON ЧЕРЕЗ COPY ---
+#
+# Фічі читаються з FeatureCollection по одній (без завантаження всього файлу), геометрія
+# передається як EWKB, атрибути - як jsonb. Дані йдуть у PostgreSQL через COPY ... FROM STDIN
+# (бінарний формат за замовчуванням), тому в пам'яті одночасно тримається лише одна фіча.
+
+READ_CHUNK = 1 << 16
+SRID = 4326
+
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+COPY_TRAILER = struct.pack('!h', -1)
+JSONB_VERSION = b'\x01'
+
+
+def iter_features(path, chunk_size=READ_CHUNK):
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        eof = False
+
+        def read_more():
+            nonlocal buffer, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+
+        # Пропуск заголовка колекції до початку масиву "features".
+        while True:
+            key_pos = buffer.find('"features"')
+            bracket_pos = buffer.find('[', key_pos) if key_pos >= 0 else -1
+            if bracket_pos >= 0:
+                buffer = buffer[bracket_pos + 1:]
+                break
+            if eof:
+                return
+            read_more()
+
+        pos = 0
+        read_size = chunk_size
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    return
+                buffer, pos = buffer[pos:], 0
+                read_more()
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                feature, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Фіча ще не дочитана: догружаємо файл більшими порціями.
+                buffer, pos = buffer[pos:], 0
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer += chunk
+                read_size *= 2
+                continue
+            read_size = chunk_size
+            yield feature
+            buffer, pos = buffer[end:], 0
+
+
+def feature_row(feature):
+    geom = shapely.set_srid(shape(feature['geometry']), SRID)
+    properties = json.dumps(feature.get('properties') or {}, ensure_ascii=False)
+    return shapely.to_wkb(geom, include_srid=True), properties
+
+
+def binary_rows(features):
+    yield COPY_SIGNATURE
+    for feature in features:
+        ewkb, properties = feature_row(feature)
+        properties = JSONB_VERSION + properties.encode('utf-8')
+        yield (
+            struct.pack('!h', 2)
+            + struct.pack('!i', len(properties)) + properties
+            + struct.pack('!i', len(ewkb)) + ewkb
+        )
+    yield COPY_TRAILER
+
+
+def text_rows(features):
+    for feature in features:
+        ewkb, properties = feature_row(feature)
+        properties = (
+            properties.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+        )
+        yield f"{properties}\t{ewkb.hex()}\n".encode('utf-8')
+
+
+class CopyStream:
+    # Файлоподібний об'єкт для cursor.copy_expert: віддає рядки COPY з генератора по запиту.
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.pending = bytearray()
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            chunk = next(self.rows, None)
+            if chunk is None:
+                break
+            self.pending += chunk
+        if size < 0:
+            size = len(self.pending)
+        data = bytes(self.pending[:size])
+        del self.pending[:size]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def import_geojson_copy(conn, path, table, binary=True):
+    # Повертає кількість імпортованих фіч; виклик commit() залишається за викликачем.
+    count = 0
+
+    def counted(features):
+        nonlocal count
+        for feature in features:
+            count += 1
+            yield feature
+
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+    cursor.execute(f"""
+        CREATE TABLE {table} (
+            properties JSONB,
+            geometry GEOMETRY(Geometry, {SRID})
+        )
+    """)
+
+    features = counted(iter_features(path))
+    if binary:
+        stream = CopyStream(binary_rows(features))
+        cursor.copy_expert(f"COPY {table} (properties, geometry) FROM STDIN WITH (FORMAT binary)", stream)
+    else:
+        stream = CopyStream(text_rows(features))
+        cursor.copy_expert(f"COPY {table} (properties, geometry) FROM STDIN WITH (FORMAT text)", stream)
+
+    cursor.execute(f"CREATE INDEX idx_{table}_geometry ON {table} USING GIST (geometry)")
+    return count
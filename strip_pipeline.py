@@ -0,0 +1,175 @@
+from pathlib import Path
+import numpy as np
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+import sys
+import time
+
+CURRENT_DIR = Path(__file__).resolve().parent
+sys.path.append(str(CURRENT_DIR))
+
+from config import PIPELINE_PARAMS
+from local_pipeline import (
+    AZIMUTHS, FILE_PATH, GRID_SIZE, SECTOR_MODE, SECTOR_RADIUS, build_border, create_output_path, dataset_exists
+)
+from memory_usage import peak_rss_mb
+from parquet_export import COMPRESSION, EXPORT_TABLES, export_schema
+import lattice
+import sector_stencil
+
+# --- ПОТОКОВИЙ РЕЖИМ: ШИРОТНІ СМУГИ З ОРЕОЛОМ РАДІУСА ---
+#
+# Країна обходиться смугами по STRIP_SIZE_CELLS рядків комірок (j). Смуга сітки - растеризація
+# межі, обрізаної прямокутником смуги (з запасом у рядок, який потім відкидається), тож результат
+# збігається з повною сіткою. Кожна смуга одразу дописується окремою row group у Parquet.
+#
+# Прохід 1: комірки та вершини смуги (вершина рядка v - кут комірок рядків v-1 та v), кількість
+# вершин у кожному рядку -> глобальні id у порядку (vertex_j, vertex_i), як у повному запуску.
+# Прохід 2: сектори від вершин смуги; цілі - вершини смуги, розширеної на ореол у рядках
+# ceil(SECTOR_RADIUS_M * масштаб / size) + 1, тож сектори, що перетинають край смуги, не губляться.
+# У пам'яті одночасно лише одна смуга з ореолом.
+
+OUTPUT_DIR = CURRENT_DIR / "output" / "strips"
+STRIP_SIZE = PIPELINE_PARAMS['STRIP_SIZE_CELLS']
+
+
+def strip_cells(border_3857, size, j_start, j_end):
+    # Комірки рядків [j_start, j_end): комірка в межах прямокутника смуги перетинає межу тоді й
+    # лише тоді, коли перетинає обрізану межу.
+    minx, _, maxx, _ = shapely.bounds(border_3857)
+    part = shapely.clip_by_rect(border_3857, minx - size, (j_start - 1) * size, maxx + size, (j_end + 1) * size)
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    if shapely.is_empty(part):
+        return empty
+    polygons = shapely.get_parts(part)
+    polygons = polygons[shapely.get_type_id(polygons) == shapely.GeometryType.POLYGON]
+    if len(polygons) == 0:
+        return empty
+    cell_i, cell_j = lattice.rasterize_cells(shapely.multipolygons(polygons), size)
+    keep = (cell_j >= j_start) & (cell_j < j_end)
+    return cell_i[keep], cell_j[keep]
+
+
+def strip_vertices(cell_i, cell_j, j_start, j_end):
+    # Повні рядки вершин [j_start, j_end) з комірок рядків [j_start - 1, j_end).
+    if len(cell_i) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    vertex_i, vertex_j, _ = lattice.unique_vertices(cell_i, cell_j)
+    keep = (vertex_j >= j_start) & (vertex_j < j_end)
+    return vertex_i[keep], vertex_j[keep]
+
+
+def global_ids(vertex_j, row_offsets, j_first):
+    # id = вершини всіх нижчих рядків + номер у рядку + 1 (рядки у вікні повні).
+    # row_offsets[k] - кількість вершин у рядках нижче j_first + k.
+    row_start = np.searchsorted(vertex_j, vertex_j, side='left')
+    return row_offsets[vertex_j - j_first] + (np.arange(len(vertex_j)) - row_start) + 1
+
+
+class StripWriter:
+
+    def __init__(self, names):
+        self.writers = {}
+        self.schemas = {}
+        for name in names:
+            spec = EXPORT_TABLES[name]
+            self.schemas[name] = export_schema(spec)
+            self.writers[name] = pq.ParquetWriter(
+                create_output_path(f"{spec['table']}.parquet", OUTPUT_DIR), self.schemas[name], compression=COMPRESSION
+            )
+
+    def write(self, name, columns):
+        schema = self.schemas[name]
+        arrays = [pa.array(column, type=field.type) for field, column in zip(schema, columns)]
+        self.writers[name].write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+def run_strip_pipeline(file_path=FILE_PATH, size=GRID_SIZE, radius=SECTOR_RADIUS, strip_size=STRIP_SIZE,
+                       write_sectors=True):
+    if not dataset_exists(file_path):
+        return
+
+    print(f"Starting strip pipeline ({strip_size} rows per strip, {size} m grid)...")
+    start_time = time.time()
+    _, clean_border, _ = build_border(file_path)
+    border_3857 = lattice.border_to_mercator(clean_border)
+    _, miny, _, maxy = shapely.bounds(border_3857)
+    j_first, j_last = int(np.floor(miny / size)), int(np.floor(maxy / size))
+    strips = [(j, min(j + strip_size, j_last + 1)) for j in range(j_first, j_last + 1, strip_size)]
+    halo = lattice.sector_halo(radius, size, shapely.bounds(clean_border)[3])
+
+    # Прохід 1: сітка та вершини. Рядок вершин v належить смузі з рядком комірок v;
+    # верхній рядок вершин (j_last + 1) - останній смузі.
+    writer = StripWriter(['grid', 'vertices'] + (['sectors'] if write_sectors else []) + ['intersections'])
+    row_counts = np.zeros(j_last - j_first + 2, dtype=np.int64)
+    total_cells = total_vertices = 0
+    try:
+        for index, (j_start, j_end) in enumerate(strips):
+            strip_start = time.time()
+            cell_i, cell_j = strip_cells(border_3857, size, j_start - 1, j_end)
+            own = cell_j >= j_start
+            writer.write('grid', [
+                cell_i[own], cell_j[own], shapely.to_wkb(lattice.cell_polygons(cell_i[own], cell_j[own], size))
+            ])
+            vertex_end = j_end + 1 if j_end == j_last + 1 else j_end
+            vertex_i, vertex_j = strip_vertices(cell_i, cell_j, j_start, vertex_end)
+            row_counts += np.bincount(vertex_j - j_first, minlength=len(row_counts))
+            total_cells += int(own.sum())
+            total_vertices += len(vertex_i)
+            print(f"   Strip {index + 1}/{len(strips)} rows [{j_start}, {j_end}): {int(own.sum())} cells, "
+                  f"{len(vertex_i)} vertices, {time.time() - strip_start:.2f} s")
+
+        row_offsets = np.concatenate([[0], np.cumsum(row_counts)])
+        # Прохід 2: вершини з id, сектори та перетини.
+        total_hits = 0
+        for index, (j_start, j_end) in enumerate(strips):
+            strip_start = time.time()
+            vertex_end = j_end + 1 if j_end == j_last + 1 else j_end
+            window_start, window_end = j_start - halo, vertex_end + halo
+            cell_i, cell_j = strip_cells(border_3857, size, window_start - 1, window_end)
+            vertex_i, vertex_j = strip_vertices(cell_i, cell_j, window_start, window_end)
+            if len(vertex_i) == 0:
+                continue
+            vertex_id = global_ids(vertex_j, row_offsets, j_first)
+            lon, lat = lattice.vertex_lonlat(vertex_i, vertex_j, size)
+
+            src = np.flatnonzero((vertex_j >= j_start) & (vertex_j < vertex_end))
+            writer.write('vertices', [
+                vertex_id[src], vertex_i[src], vertex_j[src], shapely.to_wkb(shapely.points(lon[src], lat[src]))
+            ])
+
+            sector_idx, vertex_idx = sector_stencil.stencil_intersections(
+                vertex_i, vertex_j, lon, lat, size, radius, source_rows=(j_start, vertex_end)
+            )
+            n_az = len(AZIMUTHS)
+            if write_sectors:
+                rings = lattice.sector_rings(lon[src], lat[src], radius, mode=SECTOR_MODE)
+                writer.write('sectors', [
+                    np.repeat(vertex_id[src], n_az), np.tile(AZIMUTHS, len(src)),
+                    shapely.to_wkb(lattice.sector_polygons(rings))
+                ])
+            writer.write('intersections', [
+                vertex_id[sector_idx // n_az], AZIMUTHS[sector_idx % n_az], vertex_id[vertex_idx]
+            ])
+            total_hits += len(sector_idx)
+            print(f"   Strip {index + 1}/{len(strips)} sectors: {len(src) * n_az}, intersections: {len(sector_idx)} "
+                  f"(window {len(vertex_i)} vertices), {time.time() - strip_start:.2f} s")
+    finally:
+        writer.close()
+
+    rss = peak_rss_mb()
+    print(f"\nStrip pipeline completed in {time.time() - start_time:.2f} seconds: {total_cells} cells, "
+          f"{total_vertices} vertices, {total_hits} intersections, halo {halo} rows"
+          + (f", peak RSS {rss:.0f} MB" if rss is not None else ""))
+    print(f"Results saved: {os.path.abspath(OUTPUT_DIR)}")
+    return {'cells': total_cells, 'vertices': total_vertices, 'intersections': total_hits}
+
+
+if __name__ == "__main__":
+    run_strip_pipeline()
@@ -0,0 +1,5 @@
+from pathlib import Path
+import sys
+
+# Модулі пайплайнів імпортуються як файли з кореня репозиторію.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,107 @@
+import json
+
+import numpy as np
+import pytest
+import shapely
+
+import border_update
+import local_pipeline
+import sector_csr
+
+# --- ІНКРЕМЕНТНЕ ОНОВЛЕННЯ ПРОТИ ПОВНОЇ ПЕРЕБУДОВИ ---
+#
+# Малий синтетичний кордон (прямокутник ~35 x 30 км) і його версія з виступом та вирізом:
+# оновлення має дати ті самі комірки, вершини й пари, що й повний запуск на новому кордоні,
+# при цьому id вершин, що лишилися, не змінюються.
+
+BASE = shapely.box(30.8, 48.9, 31.3, 49.2)
+PERTURBED = shapely.difference(
+    shapely.union(BASE, shapely.box(31.3, 49.0, 31.36, 49.08)), shapely.box(30.8, 48.9, 30.86, 48.97)
+)
+
+
+def write_dataset(path, geom):
+    path.write_text(json.dumps({
+        'type': 'FeatureCollection',
+        'features': [{'type': 'Feature', 'properties': {}, 'geometry': json.loads(shapely.to_geojson(geom))}]
+    }))
+    return path
+
+
+def run_full(monkeypatch, output_dir, dataset):
+    monkeypatch.setattr(local_pipeline, 'OUTPUT_DIR', output_dir)
+    local_pipeline.run_local_pipeline(dataset, engine='stencil')
+
+
+def lattice_results(output_dir):
+    # Результати в координатах решітки: id замінюються на (vertex_i, vertex_j).
+    with np.load(output_dir / "grid_vertices.npz") as data:
+        vertices = {key: data[key] for key in data.files}
+    position = np.full(vertices['id'].max() + 1, -1)
+    position[vertices['id']] = np.arange(len(vertices['id']))
+
+    def cells(ids):
+        return vertices['vertex_i'][position[ids]], vertices['vertex_j'][position[ids]]
+
+    with np.load(output_dir / "sector_intersections_full.npz") as data:
+        pairs = np.unique(np.rec.fromarrays([
+            *cells(data['sector_source_vertex_id']), data['azimuth'], *cells(data['intersecting_vertex_id'])
+        ]))
+    csr = sector_csr.load_csr(output_dir / "sector_targets_csr.npz")
+    sector = np.repeat(np.arange(len(csr['vertex_id'])), np.diff(csr['offsets']))
+    csr_pairs = np.unique(np.rec.fromarrays([
+        *cells(csr['vertex_id'][sector]), csr['azimuth'][sector], *cells(csr['targets'])
+    ]))
+    with np.load(output_dir / "ukraine_grid.npz") as grid:
+        grid_cells = np.unique(np.rec.fromarrays([grid['i'], grid['j']]))
+    with np.load(output_dir / "vertex_coverage.npz") as data:
+        order = np.lexsort((vertices['vertex_i'], vertices['vertex_j']))
+        coverage = data['sectors'][position[data['vertex_id']]][order]
+    return vertices, grid_cells, pairs, csr_pairs, coverage
+
+
+@pytest.fixture
+def datasets(tmp_path):
+    return write_dataset(tmp_path / "base.geojson", BASE), write_dataset(tmp_path / "perturbed.geojson", PERTURBED)
+
+
+def test_border_update_matches_full_rebuild(tmp_path, monkeypatch, datasets):
+    base, perturbed = datasets
+    updated, rebuilt = tmp_path / "updated", tmp_path / "rebuilt"
+    run_full(monkeypatch, rebuilt, perturbed)
+    run_full(monkeypatch, updated, base)
+    before, *_ = lattice_results(updated)
+
+    monkeypatch.setattr(border_update, 'OUTPUT_DIR', updated)
+    stats = border_update.run_border_update(perturbed)
+    assert stats['cells_added'] > 0 and stats['cells_removed'] > 0
+    assert stats['vertices_added'] > 0 and stats['vertices_removed'] > 0
+
+    vertices, grid_cells, pairs, csr_pairs, coverage = lattice_results(updated)
+    expected_vertices, expected_cells, expected_pairs, _, expected_coverage = lattice_results(rebuilt)
+    np.testing.assert_array_equal(vertices['vertex_i'], expected_vertices['vertex_i'])
+    np.testing.assert_array_equal(vertices['vertex_j'], expected_vertices['vertex_j'])
+    np.testing.assert_array_equal(grid_cells, expected_cells)
+    np.testing.assert_array_equal(pairs, expected_pairs)
+    np.testing.assert_array_equal(csr_pairs, expected_pairs)
+    np.testing.assert_array_equal(coverage, expected_coverage)
+
+    # Вершини, що лишилися, зберігають id; нові отримують max(id) + 1, ... у порядку (vertex_j, vertex_i).
+    old_keys = dict(zip(zip(before['vertex_i'], before['vertex_j']), before['id']))
+    keys = list(zip(vertices['vertex_i'], vertices['vertex_j']))
+    survived = np.array([key in old_keys for key in keys])
+    np.testing.assert_array_equal(
+        vertices['id'][survived], [old_keys[key] for key, keep in zip(keys, survived) if keep]
+    )
+    np.testing.assert_array_equal(
+        vertices['id'][~survived], before['id'].max() + np.arange(1, int((~survived).sum()) + 1)
+    )
+
+
+def test_border_update_unchanged(tmp_path, monkeypatch, datasets):
+    base, _ = datasets
+    run_full(monkeypatch, tmp_path / "local", base)
+    monkeypatch.setattr(border_update, 'OUTPUT_DIR', tmp_path / "local")
+    assert border_update.run_border_update(base) == {
+        'cells_added': 0, 'cells_removed': 0, 'vertices_added': 0, 'vertices_removed': 0
+    }
@@ -0,0 +1,31 @@
+import numpy as np
+import shapely
+
+import lattice
+from sector_copy import SRID, copy_row_dtype, sector_copy_rows
+from streaming_import import COPY_SIGNATURE, COPY_TRAILER
+
+# --- BINARY COPY СЕКТОРІВ ПРОТИ SHAPELY EWKB ---
+
+
+def test_copy_payload_matches_shapely_ewkb():
+    lon = np.array([30.5, 31.0, 36.2])
+    lat = np.array([46.4, 49.0, 50.1])
+    vertex_id = np.array([7, 8, 11])
+    azimuths = lattice.SECTOR_AZIMUTHS
+    rings = lattice.sector_rings(lon, lat, 5000)
+
+    # Порція менша за кількість секторів: рядки з кількох порцій склеюються без розривів.
+    data = b''.join(sector_copy_rows(vertex_id, azimuths, rings, batch=4))
+    assert data.startswith(COPY_SIGNATURE) and data.endswith(COPY_TRAILER)
+    rows = np.frombuffer(data[len(COPY_SIGNATURE):-len(COPY_TRAILER)], dtype=copy_row_dtype(rings.shape[1]))
+
+    np.testing.assert_array_equal(rows['fields'], 3)
+    np.testing.assert_array_equal(rows['vertex_id'], np.repeat(vertex_id, len(azimuths)))
+    np.testing.assert_array_equal(rows['azimuth'], np.tile(azimuths, len(vertex_id)))
+
+    expected = shapely.to_wkb(shapely.set_srid(lattice.sector_polygons(rings), SRID), include_srid=True)
+    geom_offset = rows.dtype.fields['byte_order'][1]
+    for row, ewkb in zip(rows, expected):
+        assert row['geom_len'] == len(ewkb)
+        assert row.tobytes()[geom_offset:] == ewkb
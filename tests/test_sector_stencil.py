@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import shapely
+
+import lattice
+import sector_stencil
+
+# --- СТЕНСИЛЬ ПРОТИ STRTREE НА МАЛІЙ РЕШІТЦІ ---
+#
+# Решітка 2 км - коло з ~25 комірок навколо (31°E, 49°N); сектори рахуються обома рушіями.
+
+SIZE = 2000.0
+RADIUS = 5000
+
+
+def small_lattice(size=SIZE, cells=12):
+    x, y = lattice.TO_MERCATOR.transform(31.0, 49.0)
+    ci, cj = int(x // size), int(y // size)
+    offsets = np.arange(-cells, cells + 1)
+    di, dj = np.meshgrid(offsets, offsets)
+    inside = di ** 2 + dj ** 2 <= cells ** 2
+    cell_i, cell_j = ci + di[inside], cj + dj[inside]
+    order = np.lexsort((cell_i, cell_j))
+    vertex_i, vertex_j, _ = lattice.unique_vertices(cell_i[order], cell_j[order])
+    lon, lat = lattice.vertex_lonlat(vertex_i, vertex_j, size)
+    return vertex_i, vertex_j, lon, lat
+
+
+@pytest.mark.parametrize('mode', ['geodesic', 'planar'])
+def test_stencil_matches_strtree(mode):
+    vertex_i, vertex_j, lon, lat = small_lattice()
+    rings = lattice.sector_rings(lon, lat, RADIUS, mode=mode)
+    expected = lattice.sector_vertex_intersections(lattice.sector_polygons(rings), shapely.points(lon, lat))
+    sector_idx, vertex_idx = sector_stencil.stencil_intersections(
+        vertex_i, vertex_j, lon, lat, SIZE, RADIUS, rings=rings
+    )
+    assert len(sector_idx) > 0
+    np.testing.assert_array_equal(sector_idx, expected[0])
+    np.testing.assert_array_equal(vertex_idx, expected[1])
+
+
+def test_stencil_source_mask():
+    vertex_i, vertex_j, lon, lat = small_lattice()
+    rings = lattice.sector_rings(lon, lat, RADIUS)
+    full = sector_stencil.stencil_intersections(vertex_i, vertex_j, lon, lat, SIZE, RADIUS, rings=rings)
+    source_mask = vertex_i % 3 == 0
+    masked = sector_stencil.stencil_intersections(
+        vertex_i, vertex_j, lon, lat, SIZE, RADIUS, rings=rings, source_mask=source_mask
+    )
+    keep = source_mask[full[0] // len(lattice.SECTOR_AZIMUTHS)]
+    np.testing.assert_array_equal(masked[0], full[0][keep])
+    np.testing.assert_array_equal(masked[1], full[1][keep])
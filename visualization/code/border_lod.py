@@ -0,0 +1,48 @@
+from pathlib import Path
+import sys
+
+CURRENT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config import TABLE_NAMES, GEOM_PARAMS
+from data_access import cached_query
+
+# Рівні деталізації кордону (таблиця BORDER_LOD): source = 'clean' | 'raw', tolerance у градусах.
+# Рендерер обирає найгрубший рівень, допуск якого не перевищує розміру пікселя.
+
+LOD_TABLE = TABLE_NAMES['BORDER_LOD']
+LOD_TOLERANCES = [0.0] + sorted(GEOM_PARAMS['BORDER_LOD_TOLERANCES_DEG'])
+TILE_SIZE_PX = 256
+
+
+def pixel_size_for_zoom(zoom):
+    # Розмір пікселя веб-карти (градуси довготи) на заданому масштабі.
+    return 360.0 / (TILE_SIZE_PX * 2 ** zoom)
+
+
+def pixel_size_for_figure(bounds, figsize_in, dpi):
+    minx, miny, maxx, maxy = bounds
+    return max(maxx - minx, maxy - miny) / (figsize_in * dpi)
+
+
+def pick_tolerance(pixel_size):
+    return max(tolerance for tolerance in LOD_TOLERANCES if tolerance <= pixel_size)
+
+
+def load_border_lod(source, pixel_size):
+    tolerance = pick_tolerance(pixel_size)
+    gdf = cached_query(
+        f"border_lod_{source}_{tolerance}",
+        f"SELECT geom FROM {LOD_TABLE} WHERE source = %(source)s AND tolerance = %(tolerance)s",
+        [LOD_TABLE],
+        geom_col='geom',
+        params={'source': source, 'tolerance': tolerance}
+    )
+    return gdf, tolerance
+
+
+def load_border_extent(source):
+    # Межі кордону за найгрубшим рівнем (мінімум байтів з БД).
+    gdf, _ = load_border_lod(source, LOD_TOLERANCES[-1])
+    return gdf.total_bounds
@@ -0,0 +1,112 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from functools import lru_cache
+from pathlib import Path
+import geopandas as gpd
+import hashlib
+import json
+import os
+import pandas as pd
+import sys
+
+CURRENT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config import DB_CONFIG, TABLE_NAMES
+
+# --- СПІЛЬНИЙ ДОСТУП ДО ДАНИХ ДЛЯ ВІЗУАЛІЗАЦІЇ ---
+#
+# Один пул з'єднань на процес і локальний кеш знімків запитів (Parquet/GeoParquet у CACHE_DIR).
+# Знімок дійсний, поки не змінилась версія джерела: oid таблиць та лічильники змін з
+# pg_stat_user_tables, плюс відбитки етапів з pipeline_stages (ідентифікатор запуску пайплайна).
+# Перевірка версії - один легкий запит до каталогу. VIS_OFFLINE=1 вимикає БД повністю: дані
+# беруться лише зі знімків, тож повторний рендер після зміни стилів не звертається до бази.
+
+CACHE_DIR = PROJECT_ROOT.joinpath('visualization', 'output', 'cache')
+STAGES_TABLE = TABLE_NAMES['STAGES']
+POOL_SIZE = 5
+OFFLINE = os.environ.get('VIS_OFFLINE') == '1'
+
+SQL_TABLE_VERSION = """
+SELECT c.oid::bigint, s.n_tup_ins, s.n_tup_upd, s.n_tup_del
+FROM pg_class c
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE c.oid = to_regclass(:table)
+"""
+
+SQL_RUN_VERSION = f"SELECT stage, fingerprint, status, updated_at::text FROM {STAGES_TABLE} ORDER BY stage"
+
+
+@lru_cache(maxsize=None)
+def get_engine(pool_size=POOL_SIZE):
+    engine_string = (
+        f"postgresql://{DB_CONFIG['USER']}:{DB_CONFIG['PASSWORD']}@"
+        f"{DB_CONFIG['HOST']}:{DB_CONFIG['PORT']}/{DB_CONFIG['NAME']}"
+    )
+    return create_engine(engine_string, pool_size=pool_size, pool_pre_ping=True)
+
+
+def source_version(conn, tables):
+    versions = {}
+    for table in tables:
+        row = conn.execute(text(SQL_TABLE_VERSION), {'table': table}).fetchone()
+        versions[table] = list(row) if row else None
+    if conn.execute(text("SELECT to_regclass(:table)"), {'table': STAGES_TABLE}).scalar() is not None:
+        versions[STAGES_TABLE] = [list(row) for row in conn.execute(text(SQL_RUN_VERSION))]
+    return hashlib.sha256(json.dumps(versions, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def query_hash(sql, params):
+    return hashlib.sha256(json.dumps([sql, params], sort_keys=True, default=str).encode()).hexdigest()
+
+
+def read_snapshot(data_path, geom_col):
+    return gpd.read_parquet(data_path) if geom_col else pd.read_parquet(data_path)
+
+
+def write_snapshot(df, data_path, meta_path, meta):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = data_path.with_suffix('.tmp')
+    df.to_parquet(tmp_path)
+    os.replace(tmp_path, data_path)
+    meta_path.write_text(json.dumps(meta))
+
+
+def cached_query(name, sql, tables, geom_col=None, crs=None, params=None):
+    # tables - таблиці, від яких залежить результат (для перевірки версії знімка).
+    data_path = CACHE_DIR / f"{name}.parquet"
+    meta_path = CACHE_DIR / f"{name}.json"
+    meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+    sql_hash = query_hash(sql, params)
+    cached = meta.get('query') == sql_hash and data_path.exists()
+
+    if OFFLINE:
+        if not cached:
+            raise FileNotFoundError(f"Offline mode: no snapshot '{name}' in {CACHE_DIR}")
+        return read_snapshot(data_path, geom_col)
+
+    try:
+        with get_engine().connect() as conn:
+            version = source_version(conn, tables)
+            if cached and meta.get('version') == version:
+                return read_snapshot(data_path, geom_col)
+            if geom_col:
+                df = gpd.read_postgis(sql, conn, geom_col=geom_col, crs=crs, params=params)
+            else:
+                df = pd.read_sql(sql, conn, params=params)
+    except OperationalError as e:
+        if not cached:
+            raise
+        print(f"Database unavailable, using snapshot '{name}': {e.orig}")
+        return read_snapshot(data_path, geom_col)
+
+    write_snapshot(df, data_path, meta_path, {'query': sql_hash, 'version': version})
+    return df
+
+
+def load_center():
+    df_center = cached_query(
+        'center', f"SELECT center_lon, center_lat FROM {TABLE_NAMES['CENTER']}", [TABLE_NAMES['CENTER']]
+    )
+    return df_center.iloc[0]['center_lat'], df_center.iloc[0]['center_lon']
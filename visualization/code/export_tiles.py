@@ -0,0 +1,217 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from string import Template
+import math
+import os
+import pandas as pd
+import sys
+import threading
+
+CURRENT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config import TABLE_NAMES, GEOM_PARAMS
+from data_access import get_engine
+
+CENTER_TABLE = TABLE_NAMES['CENTER']
+CLEAN_BORDER_TABLE = TABLE_NAMES['CLEAN_BORDER']
+
+OUTPUT_SUBDIR = PROJECT_ROOT.joinpath('visualization', 'output', 'tiles')
+TILE_DIR_NAME = 'pbf'
+
+MIN_ZOOM = 5
+MAX_ZOOM = 12
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+TILE_WORKERS = 4
+WEB_MERCATOR_HALF = 20037508.342789244
+
+# Шари пірамиди: SQL-джерело (геометрія в EPSG:3857 або 4326), атрибути та діапазон масштабів.
+LAYERS = [
+    {
+        'name': 'border',
+        'table': CLEAN_BORDER_TABLE,
+        'geom': 'geom',
+        'srid': 4326,
+        'columns': [],
+        'minzoom': MIN_ZOOM
+    },
+    {
+        'name': 'grid',
+        'table': TABLE_NAMES['GRID'],
+        'geom': 'geom',
+        'srid': 3857,
+        'columns': ['i', 'j'],
+        'minzoom': 8
+    },
+    {
+        'name': 'vertices',
+        'table': TABLE_NAMES['VERTICES'],
+        'geom': 'vertex_point',
+        'srid': 4326,
+        'columns': ['id', 'vertex_i', 'vertex_j'],
+        'minzoom': 11
+    },
+    {
+        'name': 'sectors',
+        'table': TABLE_NAMES['SECTORS'],
+        'geom': 'sector_geom',
+        'srid': 4326,
+        'columns': ['vertex_id', 'azimuth'],
+        'minzoom': 12
+    }
+]
+
+LEAFLET_PAGE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Ukraine grid and sectors (vector tiles)</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<script src="https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.js"></script>
+<style>html, body, #map { height: 100%; margin: 0; }</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var map = L.map('map').setView([$center_lat, $center_lon], 6);
+L.tileLayer('https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png', {
+    attribution: '&copy; OpenStreetMap &copy; CARTO'
+}).addTo(map);
+
+var tiles = L.vectorGrid.protobuf('$tile_dir/{z}/{x}/{y}.pbf', {
+    minZoom: $min_zoom,
+    maxNativeZoom: $max_zoom,
+    maxZoom: 18,
+    vectorTileLayerStyles: {
+        border: {color: 'black', weight: 3, fill: false},
+        grid: {color: '#777777', weight: 0.5, fill: false},
+        vertices: {radius: 1.5, color: '#1A73E8', fill: true, fillOpacity: 1, weight: 0},
+        sectors: {color: 'darkred', weight: 0.3, fill: true, fillColor: 'red', fillOpacity: 0.1}
+    }
+}).addTo(map);
+</script>
+</body>
+</html>
+""")
+
+
+def create_output_path(filename):
+    OUTPUT_SUBDIR.mkdir(parents=True, exist_ok=True)
+    return OUTPUT_SUBDIR / filename
+
+
+def layer_sql(layer):
+    columns = ''.join(f", t.{column}" for column in layer['columns'])
+    if layer['srid'] == 3857:
+        geom = f"t.{layer['geom']}"
+        bbox_filter = f"t.{layer['geom']} && b.geom"
+    else:
+        geom = f"ST_Transform(t.{layer['geom']}, 3857)"
+        bbox_filter = f"t.{layer['geom']} && ST_Transform(b.geom, {layer['srid']})"
+    return f"""
+    COALESCE((
+        SELECT ST_AsMVT(mvt, '{layer['name']}', {TILE_EXTENT}, 'geom')
+        FROM (
+            SELECT ST_AsMVTGeom({geom}, b.geom, {TILE_EXTENT}, {TILE_BUFFER}, true) AS geom{columns}
+            FROM {layer['table']} t, bounds b
+            WHERE {bbox_filter}
+        ) AS mvt
+        WHERE mvt.geom IS NOT NULL
+    ), ''::bytea)"""
+
+
+def tile_sql(zoom):
+    layers = [layer_sql(layer) for layer in LAYERS if layer['minzoom'] <= zoom]
+    return f"""
+WITH bounds AS (SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom)
+SELECT {' || '.join(layers)}
+"""
+
+
+def tile_range(bounds_3857, zoom):
+    minx, miny, maxx, maxy = bounds_3857
+    tile_size = 2 * WEB_MERCATOR_HALF / 2 ** zoom
+    x_min = int(math.floor((minx + WEB_MERCATOR_HALF) / tile_size))
+    x_max = int(math.floor((maxx + WEB_MERCATOR_HALF) / tile_size))
+    y_min = int(math.floor((WEB_MERCATOR_HALF - maxy) / tile_size))
+    y_max = int(math.floor((WEB_MERCATOR_HALF - miny) / tile_size))
+    return [(x, y) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)]
+
+
+def load_extent(engine):
+    df_extent = pd.read_sql(
+        f"""
+        SELECT ST_XMin(e) AS minx, ST_YMin(e) AS miny, ST_XMax(e) AS maxx, ST_YMax(e) AS maxy
+        FROM (SELECT ST_Extent(ST_Transform(geom, 3857)) AS e FROM {CLEAN_BORDER_TABLE}) AS extent
+        """,
+        engine
+    )
+    df_center = pd.read_sql(f"SELECT center_lon, center_lat FROM {CENTER_TABLE}", engine)
+    bounds = tuple(df_extent.iloc[0][['minx', 'miny', 'maxx', 'maxy']])
+    return bounds, df_center.iloc[0]['center_lat'], df_center.iloc[0]['center_lon']
+
+
+def export_zoom(engine, zoom, bounds):
+    sql = tile_sql(zoom)
+    tiles = tile_range(bounds, zoom)
+    local = threading.local()
+    connections = []
+    lock = threading.Lock()
+
+    def write_tile(tile):
+        if not hasattr(local, 'conn'):
+            local.conn = engine.raw_connection()
+            with lock:
+                connections.append(local.conn)
+        x, y = tile
+        cursor = local.conn.cursor()
+        cursor.execute(sql, {'z': zoom, 'x': x, 'y': y})
+        data = bytes(cursor.fetchone()[0])
+        local.conn.commit()
+        if not data:
+            return 0
+        tile_path = OUTPUT_SUBDIR / TILE_DIR_NAME / str(zoom) / str(x) / f"{y}.pbf"
+        tile_path.parent.mkdir(parents=True, exist_ok=True)
+        tile_path.write_bytes(data)
+        return 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=TILE_WORKERS) as pool:
+            written = sum(pool.map(write_tile, tiles))
+    finally:
+        for conn in connections:
+            conn.close()
+    print(f"   Zoom {zoom}: {written}/{len(tiles)} non-empty tiles")
+
+
+def write_viewer(center_lat, center_lon):
+    page = LEAFLET_PAGE.substitute(
+        center_lat=center_lat,
+        center_lon=center_lon,
+        tile_dir=TILE_DIR_NAME,
+        min_zoom=MIN_ZOOM,
+        max_zoom=MAX_ZOOM
+    )
+    page_file = create_output_path("index.html")
+    page_file.write_text(page, encoding='utf-8')
+    return page_file
+
+
+def export_vector_tiles():
+    engine = get_engine(TILE_WORKERS)
+    bounds, center_lat, center_lon = load_extent(engine)
+
+    print(f"Exporting MVT pyramid z{MIN_ZOOM}-z{MAX_ZOOM} (grid {GEOM_PARAMS['SQUARE_SIZE_M']} m)...")
+    for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+        export_zoom(engine, zoom, bounds)
+
+    page_file = write_viewer(center_lat, center_lon)
+    print(f"Leaflet viewer saved: {os.path.abspath(page_file)}")
+    print(f"Serve it over HTTP, e.g.: python -m http.server --directory {os.path.abspath(OUTPUT_SUBDIR)}")
+
+
+if __name__ == "__main__":
+    export_vector_tiles()
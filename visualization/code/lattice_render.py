@@ -0,0 +1,118 @@
+from matplotlib.collections import LineCollection
+from matplotlib.colors import ListedColormap, Normalize
+import matplotlib
+from pathlib import Path
+import numpy as np
+import sys
+
+CURRENT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config import TABLE_NAMES
+from lattice import TO_LONLAT
+from data_access import cached_query
+
+# --- ШВИДКИЙ РЕНДЕР РЕГУЛЯРНОЇ РЕШІТКИ ---
+#
+# Замість окремого Patch на кожну комірку:
+#   'lines' - сітка як LineCollection з довгих відрізків (суцільні ряди ребер уздовж ліній i/j),
+#   'mask'  - сітка як растр-маска комірок (pcolormesh, одна QuadMesh на всю карту),
+#   сектори - растр щільності: кількість секторів, що покривають кожну вершину.
+# Лінії решітки EPSG:3857 у WGS84 лишаються лініями сталої довготи/широти, тому відрізки точні.
+
+RENDER_MODES = ('lines', 'mask', 'patches')
+
+SQL_SECTOR_DENSITY = f"""
+SELECT v.vertex_i, v.vertex_j, c.sectors
+FROM (
+    SELECT vertex_id, sum(sectors) AS sectors
+    FROM {TABLE_NAMES['VERTEX_COVERAGE']}
+    WHERE %(azimuth)s IS NULL OR azimuth = %(azimuth)s
+    GROUP BY vertex_id
+) AS c
+JOIN {TABLE_NAMES['VERTICES']} v ON v.id = c.vertex_id
+"""
+
+
+def load_sector_density(azimuth=None):
+    # Покриття з вузької таблиці vertex_coverage: усі азимути разом або один азимут.
+    name = 'sector_density' if azimuth is None else f'sector_density_{azimuth}'
+    df_density = cached_query(
+        name, SQL_SECTOR_DENSITY, [TABLE_NAMES['VERTEX_COVERAGE'], TABLE_NAMES['VERTICES']],
+        params={'azimuth': azimuth}
+    )
+    return (
+        df_density['vertex_i'].to_numpy(np.int64),
+        df_density['vertex_j'].to_numpy(np.int64),
+        df_density['sectors'].to_numpy(np.int64)
+    )
+
+
+def edge_runs(line, position):
+    # Одиничні ребра (лінія, позиція) -> суцільні відрізки (лінія, початок, кінець).
+    edges = np.unique(np.column_stack([line, position]), axis=0)
+    breaks = np.flatnonzero((np.diff(edges[:, 0]) != 0) | (np.diff(edges[:, 1]) != 1)) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(edges)]]) - 1
+    return edges[starts, 0], edges[starts, 1], edges[ends, 1] + 1
+
+
+def grid_segments(cell_i, cell_j, size):
+    # Горизонтальні ребра лежать на лініях j та j+1, вертикальні - на i та i+1.
+    h_line, h_start, h_end = edge_runs(np.concatenate([cell_j, cell_j + 1]), np.concatenate([cell_i, cell_i]))
+    v_line, v_start, v_end = edge_runs(np.concatenate([cell_i, cell_i + 1]), np.concatenate([cell_j, cell_j]))
+
+    x0 = np.concatenate([h_start, v_line]) * float(size)
+    y0 = np.concatenate([h_line, v_start]) * float(size)
+    x1 = np.concatenate([h_end, v_line]) * float(size)
+    y1 = np.concatenate([h_line, v_end]) * float(size)
+
+    lon0, lat0 = TO_LONLAT.transform(x0, y0)
+    lon1, lat1 = TO_LONLAT.transform(x1, y1)
+    return np.stack([np.column_stack([lon0, lat0]), np.column_stack([lon1, lat1])], axis=1)
+
+
+def lattice_edges(index_min, index_max, size, offset=0.0):
+    # Межі растра вздовж осей: довготи для i, широти для j (нерівномірні в WGS84).
+    steps = (np.arange(index_min, index_max + 2) + offset) * float(size)
+    lon, _ = TO_LONLAT.transform(steps, np.zeros_like(steps))
+    _, lat = TO_LONLAT.transform(np.zeros_like(steps), steps)
+    return lon, lat
+
+
+def lattice_raster(index_i, index_j, values, size, offset=0.0):
+    i_min, j_min = index_i.min(), index_j.min()
+    raster = np.zeros((index_j.max() - j_min + 1, index_i.max() - i_min + 1), dtype=np.float64)
+    raster[index_j - j_min, index_i - i_min] = values
+    lon, _ = lattice_edges(i_min, index_i.max(), size, offset)
+    _, lat = lattice_edges(j_min, index_j.max(), size, offset)
+    return lon, lat, np.ma.masked_equal(raster, 0)
+
+
+def draw_grid_lines(ax, cell_i, cell_j, size, color='#777777', linewidth=0.5, alpha=1.0, zorder=2):
+    segments = grid_segments(cell_i, cell_j, size)
+    ax.add_collection(LineCollection(segments, colors=color, linewidths=linewidth, alpha=alpha, zorder=zorder))
+    ax.autoscale_view()
+    return len(segments)
+
+
+def draw_cell_mask(ax, cell_i, cell_j, size, color='#FFA07A', alpha=0.3, zorder=1):
+    lon, lat, raster = lattice_raster(cell_i, cell_j, np.ones(len(cell_i)), size)
+    ax.pcolormesh(lon, lat, raster, cmap=ListedColormap([color]), alpha=alpha, zorder=zorder, rasterized=True)
+
+
+def draw_sector_density(ax, vertex_i, vertex_j, counts, size, cmap='Reds', alpha=0.6, zorder=1):
+    # Піксель растра центрований на вершині: межі на (vertex - 0.5) * size.
+    lon, lat, raster = lattice_raster(vertex_i, vertex_j, counts, size, offset=-0.5)
+    return ax.pcolormesh(lon, lat, raster, cmap=cmap, alpha=alpha, zorder=zorder, rasterized=True)
+
+
+def sector_density_image(vertex_i, vertex_j, counts, size, cmap='Reds', alpha=0.6, vmax=None):
+    # RGBA-растр для folium.raster_layers.ImageOverlay. Решітка регулярна в EPSG:3857 - проєкції
+    # Leaflet, тож зображення розтягується точно; рядок 0 - північ. Повертає (image, bounds).
+    lon, lat, raster = lattice_raster(vertex_i, vertex_j, counts, size, offset=-0.5)
+    norm = Normalize(vmin=0, vmax=vmax or raster.max())
+    image = matplotlib.colormaps[cmap](norm(raster[::-1]))
+    image[..., 3] = np.where(np.ma.getmaskarray(raster[::-1]), 0.0, alpha)
+    return image, [[float(lat[0]), float(lon[0])], [float(lat[-1]), float(lon[-1])]]
@@ -1,9 +1,6 @@
-import geopandas as gpd
-from sqlalchemy import create_engine
 from pathlib import Path
 import folium
 import os
-import pandas as pd
 import matplotlib.pyplot as plt
 import sys
 
@@ -11,21 +8,19 @@ CURRENT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = CURRENT_DIR.parent.parent 
 sys.path.append(str(PROJECT_ROOT))
 
-from config import DB_CONFIG, TABLE_NAMES
+from config import TABLE_NAMES
+from data_access import load_center
+from border_lod import load_border_lod, load_border_extent, pixel_size_for_zoom, pixel_size_for_figure
 
 CLEAN_BORDER_TABLE = TABLE_NAMES['CLEAN_BORDER']
 CENTER_TABLE = TABLE_NAMES['CENTER']
 GEOM_COLUMN = 'geom'
 
-OUTPUT_DIR_FINAL = PROJECT_ROOT.joinpath('visualization', 'output', 'border')
-
+FOLIUM_TARGET_ZOOM = 8
+MPL_FIGSIZE_IN = 10
+MPL_DPI = 300
 
-def setup_db_engine():
-    engine_string = (
-        f"postgresql://{DB_CONFIG['USER']}:{DB_CONFIG['PASSWORD']}@"
-        f"{DB_CONFIG['HOST']}:{DB_CONFIG['PORT']}/{DB_CONFIG['NAME']}"
-    )
-    return create_engine(engine_string)
+OUTPUT_DIR_FINAL = PROJECT_ROOT.joinpath('visualization', 'output', 'border')
 
 
 def create_output_path(filename):
@@ -33,19 +28,16 @@ def create_output_path(filename):
     return OUTPUT_DIR_FINAL / filename
 
 
-def load_data(engine): 
+def load_data(): 
     
-    gdf_clean_border = gpd.read_postgis(
-        f"SELECT {GEOM_COLUMN} FROM {CLEAN_BORDER_TABLE}", 
-        engine, 
-        geom_col=GEOM_COLUMN
-    )
+    # Рівень деталізації під цільовий масштаб карти та під розмір/DPI зображення.
+    gdf_clean_border_map, _ = load_border_lod('clean', pixel_size_for_zoom(FOLIUM_TARGET_ZOOM))
+    bounds = load_border_extent('clean')
+    gdf_clean_border_image, _ = load_border_lod('clean', pixel_size_for_figure(bounds, MPL_FIGSIZE_IN, MPL_DPI))
     
-    df_center = pd.read_sql(f"SELECT center_lon, center_lat FROM {CENTER_TABLE}", engine)
-    center_lat = df_center.iloc[0]['center_lat']
-    center_lon = df_center.iloc[0]['center_lon']
+    center_lat, center_lon = load_center()
 
-    return gdf_clean_border, center_lat, center_lon
+    return gdf_clean_border_map, gdf_clean_border_image, center_lat, center_lon
 
 
 def visualize_with_folium(gdf_clean_border, center_lat, center_lon):
@@ -74,7 +66,7 @@ def visualize_with_folium(gdf_clean_border, center_lat, center_lon):
 
 def visualize_with_matplotlib(gdf_clean_border):
     
-    fig, ax = plt.subplots(1, 1, figsize=(10, 10))
+    fig, ax = plt.subplots(1, 1, figsize=(MPL_FIGSIZE_IN, MPL_FIGSIZE_IN))
     
     gdf_clean_border.plot(
         ax=ax, 
@@ -88,17 +80,16 @@ def visualize_with_matplotlib(gdf_clean_border):
     ax.set_aspect('equal')
     
     image_file = create_output_path("ukraine_clean_border_matplotlib.png")
-    plt.savefig(image_file, dpi=300)
+    plt.savefig(image_file, dpi=MPL_DPI)
     plt.close(fig)
     print(f"MPL png saved: {os.path.abspath(image_file)}")
 
 
 def visualize_clean_border():
-    engine = setup_db_engine()
-    gdf_clean_border, center_lat, center_lon = load_data(engine)
+    gdf_clean_border_map, gdf_clean_border_image, center_lat, center_lon = load_data()
 
-    visualize_with_folium(gdf_clean_border, center_lat, center_lon)
-    visualize_with_matplotlib(gdf_clean_border)
+    visualize_with_folium(gdf_clean_border_map, center_lat, center_lon)
+    visualize_with_matplotlib(gdf_clean_border_image)
     
     print("\nVisualization completed successfully.")
 
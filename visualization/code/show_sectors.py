@@ -1,9 +1,7 @@
-import geopandas as gpd
-from sqlalchemy import create_engine
 from pathlib import Path
 import os
-import pandas as pd
 import folium
+from folium.raster_layers import ImageOverlay
 import matplotlib.pyplot as plt
 import sys
 
@@ -11,55 +9,52 @@ CURRENT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = CURRENT_DIR.parent.parent 
 sys.path.append(str(PROJECT_ROOT))
 
-from config import DB_CONFIG, TABLE_NAMES
+from config import TABLE_NAMES, GEOM_PARAMS
+from data_access import cached_query
+from lattice_render import draw_grid_lines, draw_sector_density, load_sector_density, sector_density_image
 
 CLEAN_BORDER_TABLE = TABLE_NAMES['CLEAN_BORDER']
 GRID_TABLE = TABLE_NAMES['GRID']
-SECTORS_TABLE = TABLE_NAMES['SECTORS']
 
 GEOM_COLUMN = 'geom'
 OUTPUT_SUBDIR = PROJECT_ROOT.joinpath('visualization', 'output', 'squares_sectors')
-TARGET_SECTOR_PERCENT = 5 
+HEATMAP_CMAP = 'Reds'
 
-def setup_db_engine():
-    engine_string = (
-        f"postgresql://{DB_CONFIG['USER']}:{DB_CONFIG['PASSWORD']}@"
-        f"{DB_CONFIG['HOST']}:{DB_CONFIG['PORT']}/{DB_CONFIG['NAME']}"
-    )
-    return create_engine(engine_string)
+# Сектори - теплокарта покриття вершин (vertex_coverage); сітка в статичному рендері -
+# 'lines' (відрізками) або 'patches' (полігонами).
+MPL_RENDER_MODE = 'lines'
 
 def create_output_path(filename):
     OUTPUT_SUBDIR.mkdir(parents=True, exist_ok=True)
     return OUTPUT_SUBDIR / filename
 
-def load_data(engine):
-    
-    sectors_query = f"SELECT * FROM {SECTORS_TABLE} TABLESAMPLE SYSTEM ({TARGET_SECTOR_PERCENT})"
-    gdf_sectors = gpd.read_postgis(
-        sectors_query, 
-        engine, 
-        geom_col='sector_geom'
-    ).to_crs(epsg=4326)
+def load_data():
     
     grid_query = f"SELECT * FROM {GRID_TABLE}"
-    gdf_grid = gpd.read_postgis(
+    gdf_grid = cached_query(
+        'grid',
         grid_query, 
-        engine, 
+        [GRID_TABLE],
         geom_col='geom', 
         crs=3857
     ).to_crs(epsg=4326)
     
-    gdf_border = gpd.read_postgis(f"SELECT {GEOM_COLUMN} FROM {CLEAN_BORDER_TABLE}", engine, geom_col=GEOM_COLUMN).to_crs(epsg=4326)
+    gdf_border = cached_query(
+        'clean_border',
+        f"SELECT {GEOM_COLUMN} FROM {CLEAN_BORDER_TABLE}",
+        [CLEAN_BORDER_TABLE],
+        geom_col=GEOM_COLUMN
+    ).to_crs(epsg=4326)
     
     if gdf_grid.empty:
-        return None, None, None, None, None
+        return None, None, None, None
 
     center_lon = (gdf_grid.total_bounds[0] + gdf_grid.total_bounds[2]) / 2
     center_lat = (gdf_grid.total_bounds[1] + gdf_grid.total_bounds[3]) / 2
 
-    return gdf_border, gdf_grid, gdf_sectors, center_lat, center_lon
+    return gdf_border, gdf_grid, center_lat, center_lon
 
-def visualize_with_folium(gdf_border, gdf_grid, gdf_sectors, center_lat, center_lon):
+def visualize_with_folium(gdf_border, gdf_grid, coverage, center_lat, center_lon):
     
     m = folium.Map(
         location=[center_lat, center_lon],
@@ -79,11 +74,13 @@ def visualize_with_folium(gdf_border, gdf_grid, gdf_sectors, center_lat, center_
         style_function=lambda x: {'fillColor': 'none', 'color': '#777777', 'weight': 0.5, 'fillOpacity': 0.0}
     ).add_to(m)
 
-    folium.GeoJson(
-        gdf_sectors.to_json(),
-        name=f'3. Сектори ({len(gdf_sectors)} шт.)',
-        style_function=lambda x: {'fillColor': 'red', 'color': 'darkred', 'weight': 0.1, 'fillOpacity': 0.15}
-    ).add_to(m)
+    for index, (azimuth, (vertex_i, vertex_j, counts)) in enumerate(coverage.items()):
+        image, bounds = sector_density_image(
+            vertex_i, vertex_j, counts, GEOM_PARAMS['SQUARE_SIZE_M'], cmap=HEATMAP_CMAP,
+            vmax=None if azimuth is None else counts.max()
+        )
+        label = f'3. Покриття секторами (max {counts.max()})' if azimuth is None else f'3.{index}. Азимут {azimuth}°'
+        ImageOverlay(image, bounds, name=label, show=azimuth is None, interactive=False).add_to(m)
     
     folium.LayerControl().add_to(m)
 
@@ -91,28 +88,31 @@ def visualize_with_folium(gdf_border, gdf_grid, gdf_sectors, center_lat, center_
     m.save(map_file)
     print(f"Folium HTML map saved successfully: {os.path.abspath(map_file)}")
 
-def visualize_with_matplotlib(gdf_border, gdf_grid, gdf_sectors):
+def visualize_with_matplotlib(gdf_border, gdf_grid, sector_density):
     
     minx, miny, maxx, maxy = gdf_border.total_bounds
     fig, ax = plt.subplots(1, 1, figsize=(15, 15))
     
-    gdf_sectors.plot(
-        ax=ax,
-        edgecolor='#7D0000',
-        facecolor='red',
-        linewidth=0.1,
-        alpha=0.15, 
-        zorder=1
-    )
-
-    gdf_grid.plot(
-        ax=ax, 
-        edgecolor='#777777', 
-        facecolor='none', 
-        linewidth=0.5,
-        alpha=1.0, 
-        zorder=2 
+    vertex_i, vertex_j, counts = sector_density
+    mesh = draw_sector_density(
+        ax, vertex_i, vertex_j, counts, GEOM_PARAMS['SQUARE_SIZE_M'], cmap=HEATMAP_CMAP, zorder=1
     )
+    fig.colorbar(mesh, ax=ax, shrink=0.5, label='Sectors per vertex')
+
+    if MPL_RENDER_MODE == 'patches':
+        gdf_grid.plot(
+            ax=ax, 
+            edgecolor='#777777', 
+            facecolor='none', 
+            linewidth=0.5,
+            alpha=1.0, 
+            zorder=2 
+        )
+    else:
+        draw_grid_lines(
+            ax, gdf_grid['i'].to_numpy(), gdf_grid['j'].to_numpy(), GEOM_PARAMS['SQUARE_SIZE_M'],
+            color='#777777', linewidth=0.5, zorder=2
+        )
     
     gdf_border.plot(
         ax=ax, 
@@ -136,15 +136,16 @@ def visualize_with_matplotlib(gdf_border, gdf_grid, gdf_sectors):
     print(f"Matplotlib PNG saved: {os.path.abspath(image_file)}")
 
 def visualize_final_map():
-    engine = setup_db_engine()
-    
-    gdf_border, gdf_grid, gdf_sectors, center_lat, center_lon = load_data(engine)
+    gdf_border, gdf_grid, center_lat, center_lon = load_data()
 
     if gdf_border is None:
         return
 
-    visualize_with_folium(gdf_border, gdf_grid, gdf_sectors, center_lat, center_lon)
-    visualize_with_matplotlib(gdf_border, gdf_grid, gdf_sectors)
+    coverage = {None: load_sector_density()}
+    for azimuth in GEOM_PARAMS['SECTOR_AZIMUTHS']:
+        coverage[azimuth] = load_sector_density(azimuth)
+    visualize_with_folium(gdf_border, gdf_grid, coverage, center_lat, center_lon)
+    visualize_with_matplotlib(gdf_border, gdf_grid, coverage[None])
 
 
 if __name__ == "__main__":
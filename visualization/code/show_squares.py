@@ -1,9 +1,6 @@
-import geopandas as gpd
-from sqlalchemy import create_engine
 from pathlib import Path
 import folium
 import os
-import pandas as pd
 import matplotlib.pyplot as plt
 import sys
 
@@ -11,7 +8,9 @@ CURRENT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = CURRENT_DIR.parent.parent 
 sys.path.append(str(PROJECT_ROOT))
 
-from config import DB_CONFIG, TABLE_NAMES, GEOM_PARAMS
+from config import TABLE_NAMES, GEOM_PARAMS
+from data_access import cached_query, load_center
+from lattice_render import draw_grid_lines, draw_cell_mask
 
 CLEAN_BORDER_TABLE = TABLE_NAMES['CLEAN_BORDER']
 GRID_TABLE = TABLE_NAMES['GRID']
@@ -20,15 +19,10 @@ SQUARE_SIZE_KM = GEOM_PARAMS['SQUARE_SIZE_M'] / 1000
 
 GEOM_COLUMN = 'geom'
 
-OUTPUT_SUBDIR = PROJECT_ROOT.joinpath('visualization', 'output', 'squares')
-
+# Статичний рендер: 'lines' | 'mask' (решітка, секунди) або 'patches' (Patch на комірку, хвилини).
+MPL_RENDER_MODE = 'lines'
 
-def setup_db_engine():
-    engine_string = (
-        f"postgresql://{DB_CONFIG['USER']}:{DB_CONFIG['PASSWORD']}@"
-        f"{DB_CONFIG['HOST']}:{DB_CONFIG['PORT']}/{DB_CONFIG['NAME']}"
-    )
-    return create_engine(engine_string)
+OUTPUT_SUBDIR = PROJECT_ROOT.joinpath('visualization', 'output', 'squares')
 
 
 def create_output_path(filename):
@@ -36,24 +30,24 @@ def create_output_path(filename):
     return OUTPUT_SUBDIR / filename
 
 
-def load_data(engine):
+def load_data():
     
-    gdf_single_border = gpd.read_postgis(
+    gdf_single_border = cached_query(
+        'clean_border',
         f"SELECT {GEOM_COLUMN} FROM {CLEAN_BORDER_TABLE}", 
-        engine, 
+        [CLEAN_BORDER_TABLE],
         geom_col=GEOM_COLUMN
     )
     
-    gdf_grid = gpd.read_postgis(
+    gdf_grid = cached_query(
+        'grid',
         f"SELECT * FROM {GRID_TABLE}", 
-        engine, 
+        [GRID_TABLE],
         geom_col='geom', 
         crs=3857
     ).to_crs(epsg=4326)
 
-    df_center = pd.read_sql(f"SELECT center_lon, center_lat FROM {CENTER_TABLE}", engine)
-    center_lat = df_center.iloc[0]['center_lat']
-    center_lon = df_center.iloc[0]['center_lon']
+    center_lat, center_lon = load_center()
 
     return gdf_single_border, gdf_grid, center_lat, center_lon
 
@@ -93,13 +87,20 @@ def visualize_with_matplotlib(gdf_single_border, gdf_grid):
     
     fig, ax = plt.subplots(1, 1, figsize=(12, 12))
     
-    gdf_grid.plot(
-        ax=ax, 
-        edgecolor='#FF6347', 
-        facecolor='#FFA07A', 
-        linewidth=0.5,
-        alpha=0.3
-    )
+    if MPL_RENDER_MODE == 'patches':
+        gdf_grid.plot(
+            ax=ax, 
+            edgecolor='#FF6347', 
+            facecolor='#FFA07A', 
+            linewidth=0.5,
+            alpha=0.3
+        )
+    else:
+        cell_i = gdf_grid['i'].to_numpy()
+        cell_j = gdf_grid['j'].to_numpy()
+        if MPL_RENDER_MODE == 'mask':
+            draw_cell_mask(ax, cell_i, cell_j, GEOM_PARAMS['SQUARE_SIZE_M'], color='#FFA07A', alpha=0.3)
+        draw_grid_lines(ax, cell_i, cell_j, GEOM_PARAMS['SQUARE_SIZE_M'], color='#FF6347', linewidth=0.5)
     
     gdf_single_border.plot(
         ax=ax, 
@@ -118,8 +119,7 @@ def visualize_with_matplotlib(gdf_single_border, gdf_grid):
 
 
 def visualize_ukraine_grid():
-    engine = setup_db_engine()
-    gdf_single_border, gdf_grid, center_lat, center_lon = load_data(engine)
+    gdf_single_border, gdf_grid, center_lat, center_lon = load_data()
 
     visualize_with_folium(gdf_single_border, gdf_grid, center_lat, center_lon)
 